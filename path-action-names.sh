@@ -1,5 +1,5 @@
-N_BENCHMARK_LINES=4
-./planner gbfs > planner-output
+N_BENCHMARK_LINES=7
+${PLANNER:-./planner gbfs} > planner-output
 if grep -q Success planner-output; then
     mapfile -t action_id < <(tail -n +$((N_BENCHMARK_LINES+2))  planner-output)
     mapfile -t action_names < <(grep -A 1 'begin_operator' $1 | grep -v 'begin_operator' | grep -v '\-\-')
@@ -0,0 +1,6 @@
+echo "Building the table-driven planner"
+make -C src/planner -j"$(nproc)" MODE=table BIN="$PWD/planner-table"
+echo "Writing the task file"
+bash run-generator.sh "$@" --mode table --task-file task.bin
+echo "Start running planner"
+PLANNER="./planner-table gbfs --task task.bin" bash path-action-names.sh $1
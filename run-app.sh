@@ -1,7 +1,5 @@
-echo "Generating code"
-bash run-generator.sh $1
-echo "Compiling"
-g++ -g -o planner -O2 src/planner/*.cpp src/planner/xxHash/xxhash.c
+echo "Generating and compiling code"
+bash run-generator.sh "$@" --build "$PWD/planner"
 echo "Start running planner"
 bash path-action-names.sh $1
 
@@ -1,2 +1,2 @@
-./venv/bin/python -mgenerate.app $1
+./venv/bin/python -mgenerate.app "$@"
 
@@ -2,14 +2,24 @@
 #define ACTION_H
 
 #include <stdint.h>
-#include <unordered_map>
-#include <utility>
 #include "config.h"
 #include "storage.h"
 #include "h_pqueue.h"
 
-void actions(uint64_t* state_bitrep, PlannerQueue& pq, PathInfoMap& path_info);
+void actions(uint64_t* state_bitrep, PlannerQueue& pq);
 bool is_goal(uint64_t* state_bitrep);
-extern uint64_t INITIAL_STATE[STATE_LENGTH_HEU];
+extern uint64_t* INITIAL_STATE;
+// the id in the sas file of every operator, the plans are printed with these ids since the generator may prune
+// operators (generate/pruning.py)
+extern const int* ORIGINAL_OPERATOR_ID;
+
+// The mutex check of a state word (representations.MutexChecks): true if none of the variables in the fields of
+// mask has its forbidden value in values. A field of diff is 0 iff its variable has the forbidden value; if all
+// fields are nonzero, subtracting the lowest bit of every field does not borrow across fields and never sets a
+// highest bit that was 0, otherwise the lowest field that is 0 sets its highest bit.
+inline bool no_mutex_fact(uint64_t word, uint64_t mask, uint64_t values, uint64_t low_bits, uint64_t high_bits) {
+    uint64_t diff = (word ^ values) & mask;
+    return ((diff - low_bits) & ~diff & high_bits) == 0;
+}
 
 #endif
\ No newline at end of file
@@ -0,0 +1,107 @@
+// Microbenchmark of the visited set: the registry of visited_set.cpp against the set of state hashes it replaced.
+// Both see the same stream of random states, with duplicates, and handle them as the search does: a state that
+// was not seen yet is marked as visited, a duplicate is dropped.
+//   make MODE=table visited-set-bench && ./visited-set-bench [state length] [states] [distinct states]
+// In the generated mode the state length is the one of the generated task.
+#include <stdint.h>
+#include <stdio.h>
+#include <stdlib.h>
+
+#include <chrono>
+#include <random>
+#include <unordered_set>
+#include <vector>
+
+#include "../storage.h"
+#include "../visited_set.h"
+#include "../xxHash/xxhash.h"
+
+#ifdef TABLE_DRIVEN
+int STATE_LENGTH = 0;
+int STATE_LENGTH_HEU = 0;
+#endif
+
+static uint64_t splitmix64(uint64_t x) {
+    x += 0x9e3779b97f4a7c15ULL;
+    x = (x ^ (x >> 30)) * 0xbf58476d1ce4e5b9ULL;
+    x = (x ^ (x >> 27)) * 0x94d049bb133111ebULL;
+    return x ^ (x >> 31);
+}
+
+// the words of the k-th distinct state
+static void make_state(uint64_t* state_bitrep, uint64_t k) {
+    for (int i = 0; i < STATE_LENGTH; i++) {
+        state_bitrep[i] = splitmix64(k * STATE_LENGTH + i);
+    }
+}
+
+// the visited set before the registry: only the hashes are stored, and the state is hashed by both calls
+std::unordered_set<uint64_t> hash_set;
+
+static bool hash_set_contain(const uint64_t* state_bitrep) {
+    XXH64_hash_t hash = XXH3_64bits(state_bitrep, STATE_LENGTH * sizeof(uint64_t));
+    return hash_set.count(hash) == 1;
+}
+
+static void hash_set_insert(const uint64_t* state_bitrep) {
+    XXH64_hash_t hash = XXH3_64bits(state_bitrep, STATE_LENGTH * sizeof(uint64_t));
+    hash_set.insert(hash);
+}
+
+static double get_seconds_since(std::chrono::steady_clock::time_point start) {
+    return std::chrono::duration<double>(std::chrono::steady_clock::now() - start).count();
+}
+
+int main(int argc, char* argv[]) {
+#ifdef TABLE_DRIVEN
+    STATE_LENGTH = argc > 1 ? atoi(argv[1]) : 4;
+    STATE_LENGTH_HEU = STATE_LENGTH + 1;
+#endif
+    int n_states = argc > 2 ? atoi(argv[2]) : 2000000;
+    int n_distinct = argc > 3 ? atoi(argv[3]) : n_states / 4;
+    if (STATE_LENGTH <= 0 || n_states <= 0 || n_distinct <= 0) {
+        printf("usage: %s [state length] [states] [distinct states]\n", argv[0]);
+        return 1;
+    }
+
+    std::mt19937_64 rng(0);
+    std::uniform_int_distribution<uint64_t> distribution(0, n_distinct - 1);
+    std::vector<uint64_t> stream(n_states);
+    for (uint64_t& k : stream) {
+        k = distribution(rng);
+    }
+
+    std::vector<uint64_t> buffer(STATE_LENGTH_HEU);
+    int hash_set_new = 0;
+    auto start = std::chrono::steady_clock::now();
+    for (uint64_t k : stream) {
+        make_state(buffer.data(), k);
+        if (!hash_set_contain(buffer.data())) {
+            hash_set_insert(buffer.data());
+            hash_set_new++;
+        }
+    }
+    double hash_set_time = get_seconds_since(start);
+
+    storage_init();
+    int registry_new = 0;
+    start = std::chrono::steady_clock::now();
+    for (uint64_t k : stream) {
+        uint64_t* state_bitrep = allocate_state();
+        make_state(state_bitrep, k);
+        int state_id = get_state_id(state_bitrep);
+        if (contain_visited(state_id)) {
+            remove_last();
+        } else {
+            insert_visited(state_id);
+            registry_new++;
+        }
+    }
+    double registry_time = get_seconds_since(start);
+    free_storage();
+
+    printf("state length: %d words, states: %d, distinct states: %d\n", STATE_LENGTH, n_states, n_distinct);
+    printf("hash set: %.1f ns per state, %d new states\n", hash_set_time * 1e9 / n_states, hash_set_new);
+    printf("registry: %.1f ns per state, %d new states\n", registry_time * 1e9 / n_states, registry_new);
+    return 0;
+}
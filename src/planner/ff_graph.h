@@ -4,10 +4,30 @@
 #include <stdint.h>
 #include <vector>
 
+// sets the facts of the state in the one-hot state and in layer 0 of fact_membership, from the tables below
 void convert_state_to_multi_valued(uint64_t* state, uint64_t* ff_state, std::vector<int>& fact_membership);
 bool is_ff_goal(uint64_t* ff_state);
-void build_next_layer(uint64_t* next_state, const uint64_t* state, std::vector<int>& fact_membership, std::vector<int>& action_membership, std::vector<int>& achieving_action, int layer, std::vector<std::vector<int>>& G);
-std::vector<int> get_preconds_for_action(int action_idx);
-std::vector<int> get_effects_for_action(int action_idx);
+// applies the actions of the layer that were not applied yet, gi collects the goal facts reached in the layer;
+// not generated with the counter-based exploration (FF_COUNTER_EXPLORATION in ff_config.h)
+void build_next_layer(uint64_t* next_state, const uint64_t* state, std::vector<int>& fact_membership, std::vector<int>& action_membership, std::vector<int>& achieving_action, int layer, std::vector<int>& gi);
 
-#endif
\ No newline at end of file
+// the fact indices of the preconditions and effects of the actions in compressed sparse rows: the preconditions of
+// action i are PRECOND_FACTS[PRECOND_OFFSETS[i]], ..., PRECOND_FACTS[PRECOND_OFFSETS[i + 1] - 1]
+extern const int* PRECOND_OFFSETS;
+extern const int* PRECOND_FACTS;
+extern const int* EFFECT_OFFSETS;
+extern const int* EFFECT_FACTS;
+// GOAL_FACT_NUM fact indices
+extern const int* GOAL_FACTS;
+
+// the tables of convert_state_to_multi_valued: the chunks of one-hot word w are the rows CONVERSION_OFFSETS[w], ...,
+// CONVERSION_OFFSETS[w + 1] - 1 of CONVERSION_CHUNKS, of 4 ints (word, shift, mask, first entry), and the one-hot
+// bits of a chunk are CONVERSION_BITS[first entry + ((state[word] >> shift) & mask)]. CONVERSION_FACTS has the fact
+// of each one-hot bit. The rows from CONVERSION_OFFSETS[FF_STATE_LENGTH] on are the variables with more than 64
+// values, which take several words, the last int is their first one-hot bit counted from bit 0 of word 0.
+extern const int* CONVERSION_OFFSETS;
+extern const int* CONVERSION_CHUNKS;
+extern const uint64_t* CONVERSION_BITS;
+extern const int* CONVERSION_FACTS;
+
+#endif
@@ -1,18 +1,90 @@
 #include "ff_heuristic.h"
 #include <stdio.h>
 
+#include <algorithm>
+
+#include "heuristics.h"
+
 using std::vector;
 
 #define STATUS_DONE 0
 #define STATUS_FIXPOINT 1
 
-bool is_fixpoint(const uint64_t* ff_state, const uint64_t* prev_state) {
-    static bool first_call = true;
-    if (first_call) {
-        first_call = false;
-        return false;
+// The generated code has the relaxed exploration selected by generate.app --ff-exploration, build_next_layer
+// only exists with the layered one. The table-driven planner has both.
+#ifdef TABLE_DRIVEN
+#define LAYER_EXPLORATION
+#define COUNTER_EXPLORATION
+bool use_counter_exploration = false;
+#elif defined(FF_COUNTER_EXPLORATION)
+#define COUNTER_EXPLORATION
+#else
+#define LAYER_EXPLORATION
+#endif
+
+// The buffers of the heuristic are allocated by the first call of each thread and reset by the next ones, since the
+// heuristic is computed for every generated state.
+typedef struct {
+    vector<int> fact_membership;
+    vector<int> action_membership;
+    vector<int> achieving_action;
+    vector<uint8_t> marked_fact;
+    // G[l] holds the goal facts of layer l + 1, the layers after the last one of the current call are stale
+    vector<vector<int>> G;
+    vector<uint64_t> ff_state;
+    vector<uint64_t> prev_state;
+    // the actions of the relaxed plan in the first layer
+    vector<int> preferred_actions;
+} FFBuffers;
+
+static thread_local FFBuffers buffers;
+
+static void reset_buffers() {
+    if (buffers.fact_membership.empty()) {
+        buffers.fact_membership.resize(FACT_NUM);
+        buffers.action_membership.resize(ACTION_NUM);
+        buffers.achieving_action.resize(FACT_NUM);
+        buffers.marked_fact.resize(FACT_NUM);
+        // the state lengths are only known at runtime in the table-driven build
+        buffers.ff_state.resize(FF_STATE_LENGTH);
+        buffers.prev_state.resize(FF_STATE_LENGTH);
     }
+    std::fill(buffers.fact_membership.begin(), buffers.fact_membership.end(), -1);
+    std::fill(buffers.action_membership.begin(), buffers.action_membership.end(), -1);
+    std::fill(buffers.achieving_action.begin(), buffers.achieving_action.end(), -1);
+    std::fill(buffers.marked_fact.begin(), buffers.marked_fact.end(), 0);
+    std::fill(buffers.ff_state.begin(), buffers.ff_state.end(), 0);
+    buffers.preferred_actions.clear();
+}
+
+const vector<int>& get_preferred_actions() {
+    return buffers.preferred_actions;
+}
 
+void convert_state_to_multi_valued(uint64_t* state, uint64_t* ff_state, vector<int>& fact_membership) {
+    int* facts = fact_membership.data();
+    for (int w = 0; w < FF_STATE_LENGTH; w++) {
+        // a lookup per chunk of variables, the bits of a word are collected before it is written
+        uint64_t bits = 0;
+        const int* end = &CONVERSION_CHUNKS[4 * CONVERSION_OFFSETS[w + 1]];
+        for (const int* chunk = &CONVERSION_CHUNKS[4 * CONVERSION_OFFSETS[w]]; chunk < end; chunk += 4) {
+            bits |= CONVERSION_BITS[chunk[3] + ((state[chunk[0]] >> chunk[1]) & chunk[2])];
+        }
+        ff_state[w] |= bits;
+        // a bit and a fact per variable
+        for (const int* bit_facts = &CONVERSION_FACTS[64 * w]; bits != 0; bits &= bits - 1) {
+            facts[bit_facts[__builtin_ctzll(bits)]] = 0;
+        }
+    }
+    const int* end = &CONVERSION_CHUNKS[4 * CONVERSION_OFFSETS[FF_STATE_LENGTH + 1]];
+    for (const int* var = &CONVERSION_CHUNKS[4 * CONVERSION_OFFSETS[FF_STATE_LENGTH]]; var < end; var += 4) {
+        int bit = var[3] + (int) ((state[var[0]] >> var[1]) & var[2]);
+        ff_state[bit / 64] |= 1ULL << (bit % 64);
+        facts[CONVERSION_FACTS[bit]] = 0;
+    }
+}
+
+bool is_fixpoint(const uint64_t* ff_state, const uint64_t* prev_state) {
     for (int i = 0; i < FF_STATE_LENGTH; i++) {
         if (ff_state[i] != prev_state[i]) {
             return false;
@@ -32,9 +104,8 @@ void check_preconds_layer(vector<int>& fact_membership, vector<int>& action_memb
         if (action_membership[action_idx] == -1) {
             continue;
         }
-        auto preconds = get_preconds_for_action(action_idx);
-        for (int precond : preconds) {
-            assert(fact_membership[precond] <= action_membership[action_idx]);
+        for (int i = PRECOND_OFFSETS[action_idx]; i < PRECOND_OFFSETS[action_idx + 1]; i++) {
+            assert(fact_membership[PRECOND_FACTS[i]] <= action_membership[action_idx]);
         }
     }
 }
@@ -52,33 +123,152 @@ void check_achieving_action_layer(vector<int>& fact_membership, vector<int>& act
     }
 }
 
-int build_relaxed_graph(uint64_t* ff_state, vector<int>& fact_membership, vector<int>& action_membership, vector<int>& achieving_action, vector<vector<int>>& G) {
-    uint64_t prev_state[FF_STATE_LENGTH] = {0};
-    int layer = 0;
-    while (true) {
+static void clear_goal_layer(int layer) {
+    if (layer == buffers.G.size()) {
+        buffers.G.emplace_back();
+    }
+    buffers.G[layer].clear();
+}
+
+#ifdef LAYER_EXPLORATION
+// Builds the layers of the relaxed planning graph until the goal or a fixpoint is reached, layer_num is the number
+// of layers that were built, whose goal facts are in the first layer_num vectors of G.
+int build_relaxed_graph(uint64_t* ff_state, int& layer_num) {
+    uint64_t* prev_state = buffers.prev_state.data();
+    for (layer_num = 0;; layer_num++) {
         if (is_ff_goal(ff_state)) {
             return STATUS_DONE;
         }
-        if (is_fixpoint(ff_state, prev_state)) {
+        // the initial layer is never a fixpoint
+        if (layer_num > 0 && is_fixpoint(ff_state, prev_state)) {
             return STATUS_FIXPOINT;
         }
         copy_state(ff_state, prev_state);
-        build_next_layer(ff_state, prev_state, fact_membership, action_membership, achieving_action, layer, G);
-        layer++;
+        clear_goal_layer(layer_num);
+        build_next_layer(ff_state, prev_state, buffers.fact_membership, buffers.action_membership, buffers.achieving_action, layer_num, buffers.G[layer_num]);
+    }
+}
+#endif
+
+#ifdef COUNTER_EXPLORATION
+// The counter-based exploration builds the same graph without testing every action in every layer: an action
+// counts its preconditions that were not reached yet and is applied in the layer in which the last of them was
+// reached. The actions of a layer are applied in increasing order like build_next_layer does, so the facts get
+// the same achieving actions and the goal facts of the layers are in the same order, which gives the same h.
+typedef struct {
+    // the actions with a precondition on each fact, CSR by fact
+    vector<int> precond_action_offsets;
+    vector<int> precond_actions;
+    vector<int> precond_nums;
+    vector<int> actions_without_preconds;
+    vector<uint8_t> is_goal_fact;
+    // the buffers of a call
+    vector<int> unsatisfied_nums;
+    vector<int> layer_actions;
+    vector<int> next_layer_actions;
+    vector<int> new_facts;
+} CounterExploration;
+
+static thread_local CounterExploration counters;
+
+static void init_counter_exploration() {
+    get_actions_by_precond(counters.precond_action_offsets, counters.precond_actions);
+    counters.precond_nums.resize(ACTION_NUM);
+    for (int action_idx = 0; action_idx < ACTION_NUM; action_idx++) {
+        counters.precond_nums[action_idx] = PRECOND_OFFSETS[action_idx + 1] - PRECOND_OFFSETS[action_idx];
+        if (counters.precond_nums[action_idx] == 0) {
+            counters.actions_without_preconds.push_back(action_idx);
+        }
+    }
+    counters.is_goal_fact.assign(FACT_NUM, 0);
+    for (int i = 0; i < GOAL_FACT_NUM; i++) {
+        counters.is_goal_fact[GOAL_FACTS[i]] = 1;
     }
 }
 
+// the actions whose last unsatisfied precondition is the fact are added to actions
+static void reach_fact(int fact, vector<int>& actions) {
+    for (int i = counters.precond_action_offsets[fact]; i < counters.precond_action_offsets[fact + 1]; i++) {
+        int action_idx = counters.precond_actions[i];
+        if (--counters.unsatisfied_nums[action_idx] == 0) {
+            actions.push_back(action_idx);
+        }
+    }
+}
+
+// Same result as build_relaxed_graph, from the facts of layer 0 in fact_membership.
+int explore_with_counters(int& layer_num) {
+    if (counters.precond_action_offsets.empty()) {
+        init_counter_exploration();
+    }
+    vector<int>& fact_membership = buffers.fact_membership;
+    counters.unsatisfied_nums = counters.precond_nums;
+    counters.layer_actions = counters.actions_without_preconds;
+    for (int fact = 0; fact < FACT_NUM; fact++) {
+        if (fact_membership[fact] == 0) {
+            reach_fact(fact, counters.layer_actions);
+        }
+    }
+    int unreached_goal_num = 0;
+    for (int i = 0; i < GOAL_FACT_NUM; i++) {
+        unreached_goal_num += fact_membership[GOAL_FACTS[i]] == -1;
+    }
+
+    for (layer_num = 0;; layer_num++) {
+        if (unreached_goal_num == 0) {
+            return STATUS_DONE;
+        }
+        // no action is applied in this layer, so no fact is reached
+        if (counters.layer_actions.empty()) {
+            return STATUS_FIXPOINT;
+        }
+        clear_goal_layer(layer_num);
+        std::sort(counters.layer_actions.begin(), counters.layer_actions.end());
+        counters.new_facts.clear();
+        for (int action_idx : counters.layer_actions) {
+            buffers.action_membership[action_idx] = layer_num;
+            for (int i = EFFECT_OFFSETS[action_idx]; i < EFFECT_OFFSETS[action_idx + 1]; i++) {
+                int fact = EFFECT_FACTS[i];
+                if (fact_membership[fact] != -1) {
+                    continue;
+                }
+                fact_membership[fact] = layer_num + 1;
+                buffers.achieving_action[fact] = action_idx;
+                counters.new_facts.push_back(fact);
+                if (counters.is_goal_fact[fact]) {
+                    buffers.G[layer_num].push_back(fact);
+                    unreached_goal_num--;
+                }
+            }
+        }
+        counters.next_layer_actions.clear();
+        for (int fact : counters.new_facts) {
+            reach_fact(fact, counters.next_layer_actions);
+        }
+        counters.layer_actions.swap(counters.next_layer_actions);
+    }
+}
+#endif
+
 void ff_heuristic(uint64_t* state) {
-    vector<int> fact_membership(FACT_NUM, -1);
-    vector<int> action_membership(ACTION_NUM, -1);
-    vector<int> achieving_action(FACT_NUM, -1);
-    vector<vector<int>> G;
-    vector<bool> marked_fact(FACT_NUM, false);
-    
-    uint64_t ff_state[FF_STATE_LENGTH] = {0};
+    reset_buffers();
+    vector<int>& fact_membership = buffers.fact_membership;
+    vector<int>& action_membership = buffers.action_membership;
+    vector<int>& achieving_action = buffers.achieving_action;
+    vector<vector<int>>& G = buffers.G;
+    vector<uint8_t>& marked_fact = buffers.marked_fact;
+
+    uint64_t* ff_state = buffers.ff_state.data();
     convert_state_to_multi_valued(state, ff_state, fact_membership);
 
-    int status_code = build_relaxed_graph(ff_state, fact_membership, action_membership, achieving_action, G);
+    int layer_num;
+#if defined(LAYER_EXPLORATION) && defined(COUNTER_EXPLORATION)
+    int status_code = use_counter_exploration ? explore_with_counters(layer_num) : build_relaxed_graph(ff_state, layer_num);
+#elif defined(COUNTER_EXPLORATION)
+    int status_code = explore_with_counters(layer_num);
+#else
+    int status_code = build_relaxed_graph(ff_state, layer_num);
+#endif
     // check_preconds_layer(fact_membership, action_membership);
     // check_achieving_action_layer(fact_membership, action_membership, achieving_action);
 
@@ -89,9 +279,9 @@ void ff_heuristic(uint64_t* state) {
         return;
     }
 
+    // the number of actions of the relaxed plan, an action is selected once since it marks all the facts it achieves
     uint64_t h = 0;
-    vector<int> sol;
-    for (int l = G.size() - 1; l >= 0; l--) {
+    for (int l = layer_num - 1; l >= 0; l--) {
         for (int goal_fact_index : G[l]) {
             assert(fact_membership[goal_fact_index] == l + 1);
             if (marked_fact[goal_fact_index]) {
@@ -99,9 +289,12 @@ void ff_heuristic(uint64_t* state) {
             }
             int achieving_action_index = achieving_action[goal_fact_index];
             assert(action_membership[achieving_action_index] < l + 1);
-            sol.push_back(achieving_action_index);
-            vector<int> preconds = get_preconds_for_action(achieving_action_index);
-            for (int precond_idx : preconds) {
+            h++;
+            if (action_membership[achieving_action_index] == 0) {
+                buffers.preferred_actions.push_back(achieving_action_index);
+            }
+            for (int i = PRECOND_OFFSETS[achieving_action_index]; i < PRECOND_OFFSETS[achieving_action_index + 1]; i++) {
+                int precond_idx = PRECOND_FACTS[i];
                 int fact_layer = fact_membership[precond_idx];
                 if (fact_layer > action_membership[achieving_action_index]) {
                     printf("goal: %d-%d, action: %d-%d, precond: %d-%d\n", goal_fact_index, fact_membership[goal_fact_index], achieving_action_index, action_membership[achieving_action_index], precond_idx, fact_membership[precond_idx]);
@@ -115,8 +308,8 @@ void ff_heuristic(uint64_t* state) {
                 G[fact_layer - 1].push_back(precond_idx);
             }
 
-            vector<int> effects = get_effects_for_action(achieving_action_index);
-            for (int effect_idx : effects) {
+            for (int i = EFFECT_OFFSETS[achieving_action_index]; i < EFFECT_OFFSETS[achieving_action_index + 1]; i++) {
+                int effect_idx = EFFECT_FACTS[i];
                 if (fact_membership[effect_idx] == l + 1) {
                     marked_fact[effect_idx] = true;
                 }
@@ -124,7 +317,5 @@ void ff_heuristic(uint64_t* state) {
         }
     }
 
-    h = sol.size();
-
     state[STATE_LENGTH] = h;
 }
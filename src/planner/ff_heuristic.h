@@ -14,5 +14,14 @@
 
 
 void ff_heuristic(uint64_t* state);
+// The actions of the relaxed plan of the last call that are applicable in its state, the preferred operators
+// (helpful actions) of the state. Empty for a dead end.
+const std::vector<int>& get_preferred_actions();
+
+#ifdef TABLE_DRIVEN
+// the table-driven planner has both relaxed explorations, the layered one is used unless this is set,
+// see ff_heuristic.cpp
+extern bool use_counter_exploration;
+#endif
 
 #endif
\ No newline at end of file
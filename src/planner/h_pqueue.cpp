@@ -1,10 +1,139 @@
 #include "h_pqueue.h"
 
-void add_to_queue(uint64_t* state, uint64_t* prev_state, int action_idx, PlannerQueue& pq, PathInfoMap& path_info) {
-    if (!contain_visited(state)) {
-        ff_heuristic(state);
-        path_info.insert({state, std::make_pair(prev_state, action_idx)});
-        pq.push(state);
+OpenList::OpenList(OpenListKind kind) : kind(kind) {}
+
+void OpenList::push(uint64_t* state) {
+    if (kind == OPEN_LIST_HEAP) {
+        heap.push(state);
+        return;
+    }
+    size_t h = state[STATE_LENGTH];
+    if (h >= buckets.size()) {
+        buckets.resize(h + 1, OpenListBucket{{}, 0});
+    }
+    buckets[h].states.push_back(state);
+    if (size == 0 || h < min_h) {
+        min_h = h;
+    }
+    size++;
+}
+
+OpenListBucket& OpenList::get_min_bucket() {
+    while (buckets[min_h].head == buckets[min_h].states.size()) {
+        min_h++;
+    }
+    return buckets[min_h];
+}
+
+uint64_t* OpenList::top() {
+    if (kind == OPEN_LIST_HEAP) {
+        return heap.top();
+    }
+    OpenListBucket& bucket = get_min_bucket();
+    return kind == OPEN_LIST_BUCKET_FIFO ? bucket.states[bucket.head] : bucket.states.back();
+}
+
+void OpenList::pop() {
+    if (kind == OPEN_LIST_HEAP) {
+        heap.pop();
+        return;
+    }
+    OpenListBucket& bucket = get_min_bucket();
+    if (kind == OPEN_LIST_BUCKET_FIFO) {
+        bucket.head++;
+    } else {
+        bucket.states.pop_back();
+    }
+    // the memory of an empty bucket is kept for the next states with this value
+    if (bucket.head == bucket.states.size()) {
+        bucket.states.clear();
+        bucket.head = 0;
+    }
+    size--;
+}
+
+bool OpenList::empty() const {
+    return kind == OPEN_LIST_HEAP ? heap.empty() : size == 0;
+}
+
+PlannerQueue::PlannerQueue(OpenListKind kind, bool use_preferred)
+    : lists{OpenList(kind), OpenList(kind)}, use_preferred(use_preferred) {}
+
+// top and pop pick the same list, since the priorities only change in pop
+int PlannerQueue::get_list() const {
+    if (!use_preferred || lists[1].empty()) {
+        return 0;
+    }
+    if (lists[0].empty()) {
+        return 1;
+    }
+    return priorities[1] < priorities[0] ? 1 : 0;
+}
+
+void PlannerQueue::push(uint64_t* state, bool preferred) {
+    push_count++;
+    lists[0].push(state);
+    if (use_preferred && preferred) {
+        push_count++;
+        lists[1].push(state);
+    }
+}
+
+uint64_t* PlannerQueue::top() {
+    return lists[get_list()].top();
+}
+
+void PlannerQueue::pop() {
+    pop_count++;
+    int list = get_list();
+    lists[list].pop();
+    priorities[list]++;
+}
+
+bool PlannerQueue::empty() const {
+    return lists[0].empty() && lists[1].empty();
+}
+
+void PlannerQueue::boost() {
+    priorities[1] -= PREFERRED_BOOST;
+}
+
+thread_local bool lazy_evaluation = false;
+
+// the marks of the preferred actions of the expanded state, and the actions to unmark them
+static thread_local std::vector<uint8_t> preferred_marks;
+static thread_local std::vector<int> marked_actions;
+
+void set_preferred_actions(const std::vector<int>& actions) {
+    if (preferred_marks.empty()) {
+        preferred_marks.resize(ACTION_NUM);
+    }
+    for (int action_idx : marked_actions) {
+        preferred_marks[action_idx] = 0;
+    }
+    marked_actions = actions;
+    for (int action_idx : marked_actions) {
+        preferred_marks[action_idx] = 1;
+    }
+}
+
+void add_to_queue(uint64_t* state, uint64_t* prev_state, int action_idx, PlannerQueue& pq) {
+    int state_id = get_state_id(state);
+    if (!contain_visited(state_id)) {
+        if (lazy_evaluation) {
+            // the initial state is the only state in the queue, its value does not matter
+            state[STATE_LENGTH] = prev_state ? prev_state[STATE_LENGTH] : 0;
+        } else {
+            compute_heuristic(state);
+            // the goal can not be reached from a dead end, it is dropped like a duplicate
+            if (state[STATE_LENGTH] == UINT64_MAX) {
+                remove_last();
+                return;
+            }
+        }
+        set_parent(state_id, prev_state ? get_state_id(prev_state) : -1, action_idx);
+        bool preferred = action_idx >= 0 && !preferred_marks.empty() && preferred_marks[action_idx];
+        pq.push(state, preferred);
     } else {
         remove_last();
     }
@@ -3,12 +3,11 @@
 
 #include <stdint.h>
 #include <queue>
-#include <unordered_map>
-#include <utility>
+#include <vector>
 #include "config.h"
 #include "visited_set.h"
 #include "storage.h"
-#include "ff_heuristic.h"
+#include "heuristics.h"
 
  struct CompareState {
      bool operator()(uint64_t* left, uint64_t* right) {
@@ -16,10 +15,79 @@
      }
  }; 
 
-typedef std::priority_queue<uint64_t*, std::vector<uint64_t*>, CompareState> PlannerQueue;
-typedef std::unordered_map<uint64_t*, std::pair<uint64_t*, int>> PathInfoMap;
+// heap: binary heap ordered by h, ties are broken arbitrarily
+// bucket_fifo, bucket_lifo: a bucket of states per value of h, ties are broken by the order in which the states
+// were queued, first in first out or last in first out
+enum OpenListKind {
+    OPEN_LIST_HEAP,
+    OPEN_LIST_BUCKET_FIFO,
+    OPEN_LIST_BUCKET_LIFO,
+};
 
+typedef struct {
+    std::vector<uint64_t*> states;
+    // the first state that was not popped yet, only moves with FIFO tie-breaking
+    size_t head;
+} OpenListBucket;
 
-void add_to_queue(uint64_t* state, uint64_t* prev_state, int action_idx, PlannerQueue& pq, PathInfoMap& path_info);
+// Open list ordered by the heuristic value stored in the states. The heuristic values are small integers, e.g. the
+// FF values are bounded by the number of actions, so the buckets are indexed by h directly.
+class OpenList {
+public:
+    explicit OpenList(OpenListKind kind);
+    void push(uint64_t* state);
+    uint64_t* top();
+    void pop();
+    bool empty() const;
+
+private:
+    OpenListKind kind;
+    std::priority_queue<uint64_t*, std::vector<uint64_t*>, CompareState> heap;
+    std::vector<OpenListBucket> buckets;
+    // no bucket below min_h has states
+    size_t min_h = 0;
+    size_t size = 0;
+
+    OpenListBucket& get_min_bucket();
+};
+
+// the preferred list is picked this many more times when the search makes progress, as in Fast Downward
+const int PREFERRED_BOOST = 1000;
+
+// Open list of the search, dead ends are never queued. With preferred operators the states that were reached by a
+// preferred operator are also queued in a second list, and the lists are alternated: the non-empty list that was
+// picked the fewest times is popped, and boost() lets the preferred list be picked PREFERRED_BOOST times in a row.
+// A state that is in both lists is popped twice.
+class PlannerQueue {
+public:
+    PlannerQueue(OpenListKind kind, bool use_preferred);
+    void push(uint64_t* state, bool preferred);
+    uint64_t* top();
+    void pop();
+    bool empty() const;
+    void boost();
+
+    uint64_t push_count = 0;
+    uint64_t pop_count = 0;
+
+private:
+    // the regular list and the preferred list
+    OpenList lists[2];
+    int priorities[2] = {0, 0};
+    bool use_preferred;
+
+    int get_list() const;
+};
+
+// Lazy evaluation: add_to_queue queues a successor with the heuristic value of its parent instead of evaluating
+// it, the search evaluates the states when it pops them.
+extern thread_local bool lazy_evaluation;
+
+// Marks the actions that are preferred in the state that is expanded, add_to_queue queues the successors reached
+// by them in the preferred list as well. An empty vector clears the marks.
+void set_preferred_actions(const std::vector<int>& actions);
+
+// prev_state is NULL for the initial state
+void add_to_queue(uint64_t* state, uint64_t* prev_state, int action_idx, PlannerQueue& pq);
 
 #endif
@@ -0,0 +1,196 @@
+#include "heuristics.h"
+
+#include <limits.h>
+
+#include <algorithm>
+
+#include "ff_graph.h"
+#include "ff_heuristic.h"
+
+using std::vector;
+
+#ifndef DEFAULT_HEURISTIC
+#define DEFAULT_HEURISTIC HEURISTIC_FF
+#endif
+
+HeuristicKind heuristic_kind = DEFAULT_HEURISTIC;
+thread_local uint64_t evaluation_count = 0;
+
+void compute_heuristic(uint64_t* state) {
+    evaluation_count++;
+    switch (heuristic_kind) {
+    case HEURISTIC_FF:
+        ff_heuristic(state);
+        break;
+    case HEURISTIC_ADD:
+        add_heuristic(state);
+        break;
+    case HEURISTIC_MAX:
+        max_heuristic(state);
+        break;
+    case HEURISTIC_GOAL_COUNT:
+        goal_count_heuristic(state);
+        break;
+    }
+}
+
+void get_actions_by_precond(vector<int>& offsets, vector<int>& actions) {
+    int precond_num = PRECOND_OFFSETS[ACTION_NUM];
+    offsets.assign(FACT_NUM + 1, 0);
+    for (int i = 0; i < precond_num; i++) {
+        offsets[PRECOND_FACTS[i] + 1]++;
+    }
+    for (int fact = 0; fact < FACT_NUM; fact++) {
+        offsets[fact + 1] += offsets[fact];
+    }
+    actions.resize(precond_num);
+    vector<int> next_idx(offsets.begin(), offsets.end() - 1);
+    for (int action_idx = 0; action_idx < ACTION_NUM; action_idx++) {
+        for (int i = PRECOND_OFFSETS[action_idx]; i < PRECOND_OFFSETS[action_idx + 1]; i++) {
+            actions[next_idx[PRECOND_FACTS[i]]++] = action_idx;
+        }
+    }
+}
+
+// The relaxed costs of h^add and h^max are computed like a uniform cost search over the facts: the facts are
+// taken in order of cost from buckets, an action is applied when the last of its preconditions is taken and its
+// effects cost one more than the sum (h^add) or the maximum (h^max) of the costs of its preconditions. The actions
+// have unit costs, so a fact is final when its bucket is reached, and the search stops once all goal facts are.
+typedef struct {
+    vector<int> precond_action_offsets;
+    vector<int> precond_actions;
+    vector<int> precond_nums;
+    vector<int> actions_without_preconds;
+    vector<uint8_t> is_goal_fact;
+    // the buffers of a call, fact_costs is also the fact membership of convert_state_to_multi_valued
+    vector<int> fact_costs;
+    vector<int> action_costs;
+    vector<int> unsatisfied_nums;
+    vector<vector<int>> buckets;
+    vector<uint64_t> ff_state;
+} RelaxedCosts;
+
+static thread_local RelaxedCosts relaxed;
+
+static void init_relaxed_costs() {
+    get_actions_by_precond(relaxed.precond_action_offsets, relaxed.precond_actions);
+    relaxed.precond_nums.resize(ACTION_NUM);
+    for (int action_idx = 0; action_idx < ACTION_NUM; action_idx++) {
+        relaxed.precond_nums[action_idx] = PRECOND_OFFSETS[action_idx + 1] - PRECOND_OFFSETS[action_idx];
+        if (relaxed.precond_nums[action_idx] == 0) {
+            relaxed.actions_without_preconds.push_back(action_idx);
+        }
+    }
+    relaxed.is_goal_fact.assign(FACT_NUM, 0);
+    for (int i = 0; i < GOAL_FACT_NUM; i++) {
+        relaxed.is_goal_fact[GOAL_FACTS[i]] = 1;
+    }
+    relaxed.fact_costs.resize(FACT_NUM);
+    relaxed.action_costs.resize(ACTION_NUM);
+    relaxed.buckets.resize(1);
+    relaxed.ff_state.resize(FF_STATE_LENGTH);
+}
+
+static void apply_relaxed_action(int action_idx, int cost) {
+    for (int i = EFFECT_OFFSETS[action_idx]; i < EFFECT_OFFSETS[action_idx + 1]; i++) {
+        int fact = EFFECT_FACTS[i];
+        if (cost < relaxed.fact_costs[fact]) {
+            relaxed.fact_costs[fact] = cost;
+            if (cost >= relaxed.buckets.size()) {
+                relaxed.buckets.resize(cost + 1);
+            }
+            relaxed.buckets[cost].push_back(fact);
+        }
+    }
+}
+
+// Computes the relaxed costs of the facts until all goal facts are final, returns false if a goal fact is not
+// reachable. The costs of the facts that were not reached are INT_MAX.
+static bool compute_relaxed_costs(uint64_t* state, bool is_additive) {
+    if (relaxed.precond_action_offsets.empty()) {
+        init_relaxed_costs();
+    }
+    std::fill(relaxed.fact_costs.begin(), relaxed.fact_costs.end(), INT_MAX);
+    std::fill(relaxed.action_costs.begin(), relaxed.action_costs.end(), 0);
+    std::fill(relaxed.ff_state.begin(), relaxed.ff_state.end(), 0);
+    relaxed.unsatisfied_nums = relaxed.precond_nums;
+    // the facts of the state get the cost 0
+    convert_state_to_multi_valued(state, relaxed.ff_state.data(), relaxed.fact_costs);
+    for (int fact = 0; fact < FACT_NUM; fact++) {
+        if (relaxed.fact_costs[fact] == 0) {
+            relaxed.buckets[0].push_back(fact);
+        }
+    }
+    for (int action_idx : relaxed.actions_without_preconds) {
+        apply_relaxed_action(action_idx, 1);
+    }
+
+    int unreached_goal_num = GOAL_FACT_NUM;
+    // the buckets are emptied as they are taken, the ones after an early stop are cleared after the loop
+    size_t cost = 0;
+    for (; cost < relaxed.buckets.size() && unreached_goal_num > 0; cost++) {
+        // the bucket is indexed since applying an action can add buckets
+        for (size_t i = 0; i < relaxed.buckets[cost].size() && unreached_goal_num > 0; i++) {
+            int fact = relaxed.buckets[cost][i];
+            // a fact is queued again when its cost decreases, the entries with the larger costs are stale
+            if (relaxed.fact_costs[fact] != (int) cost) {
+                continue;
+            }
+            unreached_goal_num -= relaxed.is_goal_fact[fact];
+            for (int j = relaxed.precond_action_offsets[fact]; j < relaxed.precond_action_offsets[fact + 1]; j++) {
+                int action_idx = relaxed.precond_actions[j];
+                int& action_cost = relaxed.action_costs[action_idx];
+                action_cost = is_additive ? action_cost + (int) cost : std::max(action_cost, (int) cost);
+                if (--relaxed.unsatisfied_nums[action_idx] == 0) {
+                    apply_relaxed_action(action_idx, action_cost + 1);
+                }
+            }
+        }
+        relaxed.buckets[cost].clear();
+    }
+    for (; cost < relaxed.buckets.size(); cost++) {
+        relaxed.buckets[cost].clear();
+    }
+    return unreached_goal_num == 0;
+}
+
+void add_heuristic(uint64_t* state) {
+    if (!compute_relaxed_costs(state, true)) {
+        state[STATE_LENGTH] = UINT64_MAX;
+        return;
+    }
+    uint64_t h = 0;
+    for (int i = 0; i < GOAL_FACT_NUM; i++) {
+        h += relaxed.fact_costs[GOAL_FACTS[i]];
+    }
+    state[STATE_LENGTH] = h;
+}
+
+void max_heuristic(uint64_t* state) {
+    if (!compute_relaxed_costs(state, false)) {
+        state[STATE_LENGTH] = UINT64_MAX;
+        return;
+    }
+    uint64_t h = 0;
+    for (int i = 0; i < GOAL_FACT_NUM; i++) {
+        h = std::max(h, (uint64_t) relaxed.fact_costs[GOAL_FACTS[i]]);
+    }
+    state[STATE_LENGTH] = h;
+}
+
+void goal_count_heuristic(uint64_t* state) {
+    if (relaxed.precond_action_offsets.empty()) {
+        init_relaxed_costs();
+    }
+    // only the goal facts are read, so only they are reset: the other facts of the previous states may stay 0
+    for (int i = 0; i < GOAL_FACT_NUM; i++) {
+        relaxed.fact_costs[GOAL_FACTS[i]] = -1;
+    }
+    std::fill(relaxed.ff_state.begin(), relaxed.ff_state.end(), 0);
+    convert_state_to_multi_valued(state, relaxed.ff_state.data(), relaxed.fact_costs);
+    uint64_t h = 0;
+    for (int i = 0; i < GOAL_FACT_NUM; i++) {
+        h += relaxed.fact_costs[GOAL_FACTS[i]] != 0;
+    }
+    state[STATE_LENGTH] = h;
+}
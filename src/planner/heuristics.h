@@ -0,0 +1,37 @@
+#ifndef HEURISTICS_H
+#define HEURISTICS_H
+
+#include <stdint.h>
+#include <vector>
+
+#include "config.h"
+#include "ff_config.h"
+
+// The heuristics of the search, all computed from the relaxed task of ff_graph.h. Every heuristic stores its value
+// after the state, UINT64_MAX if the goal can not be reached from the state.
+// ff: number of actions of the FF relaxed plan, see ff_heuristic.cpp
+// add: sum of the relaxed costs of the goal facts (h^add)
+// max: largest relaxed cost of a goal fact (h^max)
+// goal_count: number of goal facts that do not hold, never detects a dead end
+enum HeuristicKind {
+    HEURISTIC_FF,
+    HEURISTIC_ADD,
+    HEURISTIC_MAX,
+    HEURISTIC_GOAL_COUNT,
+};
+
+// the heuristic of compute_heuristic, DEFAULT_HEURISTIC of ff_config.h (generate.app --heuristic) or ff
+extern HeuristicKind heuristic_kind;
+// number of calls of compute_heuristic in the thread
+extern thread_local uint64_t evaluation_count;
+
+void compute_heuristic(uint64_t* state);
+void add_heuristic(uint64_t* state);
+void max_heuristic(uint64_t* state);
+void goal_count_heuristic(uint64_t* state);
+
+// The actions with a precondition on each fact, in compressed sparse rows by fact: the actions of fact f are
+// actions[offsets[f]], ..., actions[offsets[f + 1] - 1], in increasing order.
+void get_actions_by_precond(std::vector<int>& offsets, std::vector<int>& actions);
+
+#endif
@@ -1,13 +1,17 @@
 #include <stdint.h>
 #include <stdio.h>
+#include <string.h>
 
+#include <algorithm>
+#include <atomic>
 #include <chrono>
 #include <cstdint>
+#include <mutex>
 #include <queue>
 #include <utility>
-#include <unordered_map>
 #include <stack>
 #include <string>
+#include <thread>
 #include <vector>
 #include <random>
 
@@ -16,10 +20,35 @@
 #include "action.h"
 #include "h_pqueue.h"
 #include "ff_heuristic.h"
+#include "heuristics.h"
 #include "sa_action.h"
-
-void greedy_best_first_search();
-void simulated_annealing();
+#ifdef TABLE_DRIVEN
+#include "table_task.h"
+#endif
+
+// The outcome of a search, printed by its command or summed up by the portfolio.
+typedef struct {
+    bool solved;
+    std::vector<int> plan;
+    uint64_t created_count;
+    uint64_t expanded_count;
+    double seconds;
+    uint64_t push_count;
+    uint64_t pop_count;
+    uint64_t evaluation_count;
+} SearchResult;
+
+// set when a thread of the portfolio finds a plan, the searches of the other threads stop
+std::atomic<bool> stop_search(false);
+
+SearchResult greedy_best_first_search(OpenListKind open_list, bool lazy, bool use_preferred);
+SearchResult simulated_annealing(std::mt19937::result_type seed);
+void print_gbfs_result(const SearchResult& result);
+void print_sa_result(const SearchResult& result);
+void portfolio(int thread_num, OpenListKind open_list, bool lazy, bool use_preferred);
+#ifdef TABLE_DRIVEN
+int check_ff_exploration(int state_num);
+#endif
 
 int main(int argc, char* argv[]) {
     if (argc == 1) {
@@ -28,42 +57,165 @@ int main(int argc, char* argv[]) {
     }
 
     std::vector<std::string> args(argv, argv + argc);
-    if (args[1] == "gbfs") {
-        greedy_best_first_search();
+    // --storage-limit <MB> caps the memory of the states, by default the storage grows as long as there is memory
+    // --open-list heap|bucket-fifo|bucket-lifo selects the open list of gbfs, see h_pqueue.h
+    // --h ff|add|max|goal-count selects the heuristic of gbfs and sa, see heuristics.h
+    // --preferred on|off queues the states reached by the preferred operators of FF in a boosted second open list
+    // --threads N is the number of threads of the portfolio, by default the number of cores
+    OpenListKind open_list = OPEN_LIST_HEAP;
+    bool use_preferred = false;
+    bool lazy = false;
+    int thread_num = std::max(1u, std::thread::hardware_concurrency());
+    for (int i = 2; i + 1 < args.size(); i++) {
+        if (args[i] == "--storage-limit") {
+            set_storage_limit(std::stoull(args[i + 1]) * 1024 * 1024);
+        }
+        if (args[i] == "--open-list") {
+            if (args[i + 1] == "heap") {
+                open_list = OPEN_LIST_HEAP;
+            } else if (args[i + 1] == "bucket-fifo") {
+                open_list = OPEN_LIST_BUCKET_FIFO;
+            } else if (args[i + 1] == "bucket-lifo") {
+                open_list = OPEN_LIST_BUCKET_LIFO;
+            } else {
+                printf("Unknown open list %s.\n", args[i + 1].c_str());
+                return 1;
+            }
+        }
+        if (args[i] == "--h") {
+            if (args[i + 1] == "ff") {
+                heuristic_kind = HEURISTIC_FF;
+            } else if (args[i + 1] == "add") {
+                heuristic_kind = HEURISTIC_ADD;
+            } else if (args[i + 1] == "max") {
+                heuristic_kind = HEURISTIC_MAX;
+            } else if (args[i + 1] == "goal-count") {
+                heuristic_kind = HEURISTIC_GOAL_COUNT;
+            } else {
+                printf("Unknown heuristic %s.\n", args[i + 1].c_str());
+                return 1;
+            }
+        }
+        if (args[i] == "--preferred") {
+            if (args[i + 1] != "on" && args[i + 1] != "off") {
+                printf("Unknown preferred operators option %s.\n", args[i + 1].c_str());
+                return 1;
+            }
+            use_preferred = args[i + 1] == "on";
+        }
+        if (args[i] == "--threads") {
+            thread_num = std::max(1, std::stoi(args[i + 1]));
+        }
+        if (args[i] == "--lazy") {
+            if (args[i + 1] != "on" && args[i + 1] != "off") {
+                printf("Unknown lazy evaluation option %s.\n", args[i + 1].c_str());
+                return 1;
+            }
+            lazy = args[i + 1] == "on";
+        }
+    }
+#ifdef TABLE_DRIVEN
+    // the table-driven planner reads the task at runtime: planner-table gbfs --task task.bin
+    // --ff-exploration layers|counters selects the relaxed exploration of the heuristic, see ff_heuristic.cpp
+    std::string task_file = "task.bin";
+    for (int i = 2; i + 1 < args.size(); i++) {
+        if (args[i] == "--task") {
+            task_file = args[i + 1];
+        }
+        if (args[i] == "--ff-exploration") {
+            if (args[i + 1] != "layers" && args[i + 1] != "counters") {
+                printf("Unknown FF exploration %s.\n", args[i + 1].c_str());
+                return 1;
+            }
+            use_counter_exploration = args[i + 1] == "counters";
+        }
+    }
+    if (!load_task(task_file.c_str())) {
+        return 1;
+    }
+    // planner-table ff-check [--states N] --task task.bin compares the heuristic values of both explorations
+    if (args[1] == "ff-check") {
+        int state_num = 10000;
+        for (int i = 2; i + 1 < args.size(); i++) {
+            if (args[i] == "--states") {
+                state_num = std::stoi(args[i + 1]);
+            }
+        }
+        return check_ff_exploration(state_num);
+    }
+#endif
+    if (use_preferred && heuristic_kind != HEURISTIC_FF) {
+        printf("The preferred operators come from the relaxed plan of FF, they need --h ff.\n");
+        return 1;
+    }
+    // lazy-gbfs evaluates the states when they are expanded instead of when they are generated
+    if (args[1] == "gbfs" || args[1] == "lazy-gbfs") {
+        print_gbfs_result(greedy_best_first_search(open_list, args[1] == "lazy-gbfs", use_preferred));
     }
     if (args[1] == "sa") {
-        simulated_annealing();
+        print_sa_result(simulated_annealing(std::chrono::steady_clock::now().time_since_epoch().count()));
+    }
+    // portfolio runs gbfs, lazy with --lazy on, and restarts of sa on the other threads until one finds a plan
+    if (args[1] == "portfolio") {
+        portfolio(thread_num, open_list, lazy, use_preferred);
     }
     return 0;
 }
 
-void greedy_best_first_search() {
+// With lazy evaluation a state is queued with the value of its parent and evaluated when it is popped, so a state
+// can be popped after an equal state was expanded; such states are skipped, as are dead ends. With preferred
+// operators the expanded state is evaluated again to get its preferred operators, unless it was just evaluated
+// lazily, and the preferred list is boosted whenever a state with a lower value than all expanded states before
+// is expanded.
+SearchResult greedy_best_first_search(OpenListKind open_list, bool lazy, bool use_preferred) {
     storage_init();
+    lazy_evaluation = lazy;
+    uint64_t first_evaluation_count = evaluation_count;
 
-    PathInfoMap path_info;
+    // the initial state is copied to the storage, so that it has an id in the visited set like all states
+    uint64_t* initial_state = allocate_state();
+    memcpy(initial_state, INITIAL_STATE, STATE_LENGTH_HEU * sizeof(uint64_t));
 
-    PlannerQueue pq;
-    add_to_queue(INITIAL_STATE, NULL, -1, pq, path_info);
+    PlannerQueue pq(open_list, use_preferred);
+    add_to_queue(initial_state, NULL, -1, pq);
 
     auto start = std::chrono::steady_clock::now();
     const std::chrono::minutes timeout(20);
     uint64_t state_expanded_count = 0;
+    uint64_t best_h = UINT64_MAX;
 
     bool done = false;
     uint64_t* goal;
-    while (!done && !pq.empty()) {
+    while (!done && !pq.empty() && !stop_search.load(std::memory_order_relaxed)) {
         uint64_t* state = pq.top();
         pq.pop();
-        insert_visited(state);
+        int state_id = get_state_id(state);
+        // a state that is in both lists is popped twice, its hash was kept when it was queued
+        if ((lazy || use_preferred) && contain_visited_hashed(state_id)) {
+            continue;
+        }
+        insert_visited(state_id);
         if (is_goal(state)) {
-            printf("Success.\n");
             goal = state;
             done = true;
             continue;
         }
+        if (lazy || use_preferred) {
+            compute_heuristic(state);
+            if (state[STATE_LENGTH] == UINT64_MAX) {
+                continue;
+            }
+        }
+        if (use_preferred) {
+            if (state[STATE_LENGTH] < best_h) {
+                best_h = state[STATE_LENGTH];
+                pq.boost();
+            }
+            set_preferred_actions(get_preferred_actions());
+        }
 
         //expand node then add to pq
-        actions(state, pq, path_info);
+        actions(state, pq);
 
         state_expanded_count++;
         auto now = std::chrono::steady_clock::now();
@@ -74,59 +226,66 @@ void greedy_best_first_search() {
         }
     }
 
-    if (!done) {
-        printf("No solution found.\n");
-    }
-
     auto now = std::chrono::steady_clock::now();
     std::chrono::duration<double> total = now - start;
-    printf("number of states created: %ld\n", count);
-    printf("time elapsed: %f\n", total.count());
-    printf("number of states created per second: %f\n", count / total.count());
-    printf("number of states expanded per second: %f\n", state_expanded_count / total.count());
-
-    std::stack<int> path;
-    uint64_t* current = goal;
-    while (current != INITIAL_STATE) {
-        auto path_pair = path_info[current];
-        current = path_pair.first;
-        path.push(path_pair.second);
-    }
-    while (!path.empty()) {
-        printf("%d\n", path.top());
-        path.pop();
+    SearchResult result = {done, {}, ::count, state_expanded_count, total.count(), pq.push_count, pq.pop_count,
+        evaluation_count - first_evaluation_count};
+    for (int state_id = done ? get_state_id(goal) : -1; state_id != -1 && get_parent_id(state_id) != -1;
+         state_id = get_parent_id(state_id)) {
+        result.plan.push_back(get_creating_action(state_id));
     }
+    std::reverse(result.plan.begin(), result.plan.end());
 
     free_storage();
+    return result;
+}
+
+void print_gbfs_result(const SearchResult& result) {
+    printf(result.solved ? "Success.\n" : "No solution found.\n");
+    printf("number of states created: %ld\n", result.created_count);
+    printf("time elapsed: %f\n", result.seconds);
+    printf("number of states created per second: %f\n", result.created_count / result.seconds);
+    printf("number of states expanded per second: %f\n", result.expanded_count / result.seconds);
+    printf("number of open list pushes: %lu\n", result.push_count);
+    printf("number of open list pops: %lu\n", result.pop_count);
+    printf("number of heuristic evaluations: %lu\n", result.evaluation_count);
+    for (int action_idx : result.plan) {
+        printf("%d\n", ORIGINAL_OPERATOR_ID[action_idx]);
+    }
 }
 
-void simulated_annealing() {
+SearchResult simulated_annealing(std::mt19937::result_type seed) {
     storage_init();
-    std::vector<uint> actions(STORAGE_LENGTH);
+    uint64_t first_evaluation_count = evaluation_count;
+    // the heuristic value is written after the state, so the threads of the portfolio each have their copy
+    std::vector<uint64_t> initial_state(INITIAL_STATE, INITIAL_STATE + STATE_LENGTH_HEU);
+    std::vector<uint> actions;
     int current_action_idx = -1;
     int current_var_state_idx = -1 * (STATE_LENGTH_HEU);
-    uint64_t* current_var_state = INITIAL_STATE;
-    ff_heuristic(INITIAL_STATE);
-    uint64_t value = INITIAL_STATE[STATE_LENGTH];
+    uint64_t* current_var_state = initial_state.data();
+    compute_heuristic(current_var_state);
+    uint64_t value = current_var_state[STATE_LENGTH];
     int storage_size = 0;
     int actions_size = 0;
 
     double T = 10000;
     double u = 0.995;
     bool done = false;
-    std::mt19937 rng(std::chrono::steady_clock::now().time_since_epoch().count());
+    std::mt19937 rng(seed);
 
     int sa_count = 0;
+    // reused by every step, so that a step does not allocate
+    std::vector<int> applicable_actions;
     auto start = std::chrono::steady_clock::now();
 
-    while (T > 1) {
+    while (T > 1 && !stop_search.load(std::memory_order_relaxed)) {
         bool drop = false;
         int action_num = 0;
         int n_states_to_drop = 0;
         int next_action_idx;
         int next_var_state_idx;
 
-        std::vector<int> applicable_actions = get_applicable_actions(current_var_state);
+        get_applicable_actions(current_var_state, applicable_actions);
 
         if (applicable_actions.size() > 1) {
             // we only consider dropping actions if we have taken at least 1 action
@@ -145,32 +304,27 @@ void simulated_annealing() {
             apply_action_effects(current_var_state, action_idx);
             next_action_idx = current_action_idx + 1;
             next_var_state_idx = current_var_state_idx + STATE_LENGTH_HEU;
-            if (next_action_idx < STORAGE_LENGTH) {
-                actions[next_action_idx] = action_idx;
-            } else {
-                printf("Error. Out of memory for actions.\n");
-                free_storage();
-                abort();
-            }
+            // the actions after the current one are from drafts that were not accepted
+            actions.resize(next_action_idx + 1);
+            actions[next_action_idx] = action_idx;
         }
 
         sa_count++;
 
         uint64_t* next_var_state;
         if (next_var_state_idx < 0) {
-            next_var_state = INITIAL_STATE;
+            next_var_state = initial_state.data();
         } else {
             next_var_state = get_state(next_var_state_idx);
         }
 
         if (is_goal(next_var_state)) {
             current_action_idx = next_action_idx;
-            printf("Success.\n");
             done = true;
             break;
         }
 
-        ff_heuristic(next_var_state);
+        compute_heuristic(next_var_state);
         uint64_t next_value = next_var_state[STATE_LENGTH];
 
         uint64_t prob = exp(-(next_value - value) / T);
@@ -212,18 +366,126 @@ void simulated_annealing() {
 
     auto now = std::chrono::steady_clock::now();
     std::chrono::duration<double> total = now - start;
-    printf("number of states created: %ld\n", sa_count);
-    printf("time elapsed: %f\n", total.count());
-    printf("number of states created per second: %f\n", sa_count / total.count());
+    SearchResult result = {done, {}, (uint64_t) sa_count, 0, total.count(), 0, 0,
+        evaluation_count - first_evaluation_count};
+    if (done) {
+        result.plan.assign(actions.begin(), actions.begin() + current_action_idx + 1);
+    }
+
+    free_storage();
+    return result;
+}
+
+void print_sa_result(const SearchResult& result) {
+    if (result.solved) {
+        printf("Success.\n");
+    }
+    printf("number of states created: %ld\n", result.created_count);
+    printf("time elapsed: %f\n", result.seconds);
+    printf("number of states created per second: %f\n", result.created_count / result.seconds);
     printf("\n");
 
-    if (!done) {
+    if (!result.solved) {
         printf("No solution found.\n");
     } else {
-        for (int i = 0; i <= current_action_idx; i++) {
-            printf("%d\n", actions[i]);
+        for (int action_idx : result.plan) {
+            printf("%d\n", ORIGINAL_OPERATOR_ID[action_idx]);
         }
     }
+}
+
+// Runs gbfs on the first thread and simulated annealing on the others, each restarting with a new seed until a plan
+// is found; the first plan stops all threads. The threads share the task but have their own storage, visited set
+// and heuristic buffers. The statistics are the sums over the threads, the rates are per second of the portfolio,
+// and the line of each thread is printed to stderr.
+void portfolio(int thread_num, OpenListKind open_list, bool lazy, bool use_preferred) {
+    std::vector<SearchResult> results(thread_num);
+    std::mutex plan_mutex;
+    int solver = -1;
+    std::vector<int> plan;
+    auto start = std::chrono::steady_clock::now();
 
+    std::vector<std::thread> threads;
+    for (int t = 0; t < thread_num; t++) {
+        threads.emplace_back([&, t]() {
+            SearchResult& total = results[t];
+            if (t == 0) {
+                total = greedy_best_first_search(open_list, lazy, use_preferred);
+            } else {
+                total = SearchResult{false, {}, 0, 0, 0, 0, 0, 0};
+                for (std::mt19937::result_type seed = t; !total.solved && !stop_search.load(); seed += thread_num) {
+                    SearchResult result = simulated_annealing(seed);
+                    total.solved = result.solved;
+                    total.plan.swap(result.plan);
+                    total.created_count += result.created_count;
+                    total.evaluation_count += result.evaluation_count;
+                }
+            }
+            std::lock_guard<std::mutex> lock(plan_mutex);
+            if (total.solved && solver == -1) {
+                solver = t;
+                plan = total.plan;
+            }
+            // gbfs stops the portfolio even without a plan, it has explored all reachable states or timed out
+            if (total.solved || t == 0) {
+                stop_search = true;
+            }
+        });
+    }
+    for (std::thread& thread : threads) {
+        thread.join();
+    }
+    std::chrono::duration<double> elapsed = std::chrono::steady_clock::now() - start;
+
+    SearchResult sum = {solver != -1, plan, 0, 0, elapsed.count(), results[0].push_count, results[0].pop_count, 0};
+    for (int t = 0; t < thread_num; t++) {
+        sum.created_count += results[t].created_count;
+        sum.expanded_count += results[t].expanded_count;
+        sum.evaluation_count += results[t].evaluation_count;
+        fprintf(stderr, "thread %d (%s): %lu states created%s\n", t, t == 0 ? "gbfs" : "sa",
+            results[t].created_count, t == solver ? ", found the plan" : "");
+    }
+    print_gbfs_result(sum);
+}
+
+#ifdef TABLE_DRIVEN
+// Computes the heuristic of the states of random walks from the initial state with both relaxed explorations.
+// A walk restarts from the initial state at a dead end or after 1000 steps. Returns 1 if a value differs.
+int check_ff_exploration(int state_num) {
+    storage_init();
+    std::mt19937 rng(0);
+    uint64_t* state = INITIAL_STATE;
+    int walk_length = 0;
+    int mismatch_num = 0;
+    std::vector<int> applicable_actions;
+    for (int i = 0; i < state_num; i++) {
+        use_counter_exploration = false;
+        ff_heuristic(state);
+        uint64_t layers_h = state[STATE_LENGTH];
+        use_counter_exploration = true;
+        ff_heuristic(state);
+        uint64_t counters_h = state[STATE_LENGTH];
+        if (layers_h != counters_h) {
+            if (mismatch_num == 0) {
+                printf("h differs in state %d: %lu with layers, %lu with counters\n", i, layers_h, counters_h);
+            }
+            mismatch_num++;
+        }
+
+        get_applicable_actions(state, applicable_actions);
+        if (layers_h == UINT64_MAX || applicable_actions.empty() || walk_length == 1000) {
+            remove_batch(walk_length);
+            state = INITIAL_STATE;
+            walk_length = 0;
+            continue;
+        }
+        std::uniform_int_distribution<> random_action_picker(0, applicable_actions.size() - 1);
+        apply_action_effects(state, applicable_actions[random_action_picker(rng)]);
+        state = get_state_by_id(walk_length);
+        walk_length++;
+    }
     free_storage();
-}
\ No newline at end of file
+    printf("ff-check: %d states, %d with a different h\n", state_num, mismatch_num);
+    return mismatch_num > 0;
+}
+#endif
@@ -0,0 +1,14 @@
+#ifndef SA_ACTION_H
+#define SA_ACTION_H
+
+#include <stdint.h>
+#include <vector>
+#include "storage.h"
+
+using namespace std;
+
+// clears applicable_actions and adds the actions that are applicable in the state, in increasing order
+void get_applicable_actions(uint64_t* state_bitrep, vector<int>& applicable_actions);
+void apply_action_effects(uint64_t* state_bitrep, int action_idx);
+
+#endif
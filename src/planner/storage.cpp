@@ -1,34 +1,103 @@
 #include "storage.h"
 
+#include <vector>
+
+// The states are stored in segments that are allocated when the storage grows, so the storage only takes the
+// memory of the states that were created and a state never moves. A segment starts with a header that holds the
+// id of its first state, followed by its states and their parent ids and creating actions. The size of the
+// segments is a power of two and they are aligned to it, so the segment of a state is found from its address.
+// The number of states of a segment is a power of two as well, so that the segment of an id is found by a shift;
+// the end of a segment that does not fit another state is never touched, so it takes no memory.
+const size_t MIN_SEGMENT_BYTES = 1 << 21;
+// keeps the states of a segment aligned to cache lines
+const int SEGMENT_HEADER_LENGTH = 8;
+
 typedef struct {
-    uint64_t* storage_ptr;
+    std::vector<uint64_t*> segments;
+    size_t segment_bytes;
+    int segment_state_num;
+    int segment_state_shift;
+    // the last state and the end of the states of its segment
     uint64_t* last_ptr;
+    uint64_t* segment_end;
+    // number of states
     size_t size;
 } Storage;
 
-Storage storage;
+// every thread of the portfolio has its own storage, see planner.cpp
+thread_local Storage storage;
+// 0 if the storages can grow until the memory is exhausted, the limit applies to each thread
+static size_t max_bytes = 0;
+
+static uint64_t* get_segment(const uint64_t* state) {
+    return (uint64_t*) ((uintptr_t) state & ~(uintptr_t) (storage.segment_bytes - 1));
+}
+
+static uint64_t* get_first_state(uint64_t* segment) {
+    return segment + SEGMENT_HEADER_LENGTH;
+}
+
+static int* get_parent_ids(uint64_t* segment) {
+    return (int*) (get_first_state(segment) + (size_t) storage.segment_state_num * STATE_LENGTH_HEU);
+}
+
+static int* get_creating_actions(uint64_t* segment) {
+    return get_parent_ids(segment) + storage.segment_state_num;
+}
+
+void set_storage_limit(size_t limit) {
+    max_bytes = limit;
+}
 
 void storage_init() {
-    uint64_t* storage_ptr = (uint64_t*) malloc(sizeof(uint64_t) * STORAGE_LENGTH);
-    if (storage_ptr == NULL) {
-        printf("Error: storage allocation failed.\n");
-        free_storage();
-        abort();
+    // a segment holds at least 64 states
+    size_t state_bytes = STATE_LENGTH_HEU * sizeof(uint64_t) + 2 * sizeof(int);
+    size_t segment_bytes = MIN_SEGMENT_BYTES;
+    while (segment_bytes < SEGMENT_HEADER_LENGTH * sizeof(uint64_t) + 64 * state_bytes) {
+        segment_bytes *= 2;
     }
-    storage.storage_ptr = storage_ptr;
+    int shift = 6;
+    while (SEGMENT_HEADER_LENGTH * sizeof(uint64_t) + (2 << shift) * state_bytes <= segment_bytes) {
+        shift++;
+    }
+    storage.segments.clear();
+    storage.segment_bytes = segment_bytes;
+    storage.segment_state_shift = shift;
+    storage.segment_state_num = 1 << shift;
     storage.last_ptr = NULL;
+    storage.segment_end = NULL;
     storage.size = 0;
 }
 
+// Moves the last state to the first state of the next segment, which is allocated if the storage did not
+// grow that far yet.
+static void next_segment() {
+    size_t segment_idx = storage.size >> storage.segment_state_shift;
+    if (segment_idx == storage.segments.size()) {
+        if (max_bytes > 0 && (segment_idx + 1) * storage.segment_bytes > max_bytes) {
+            printf("Storage is full.\n");
+            exit(EXIT_FAILURE);
+        }
+        uint64_t* segment = (uint64_t*) aligned_alloc(storage.segment_bytes, storage.segment_bytes);
+        if (segment == NULL) {
+            printf("Storage is full, the segment allocation failed.\n");
+            exit(EXIT_FAILURE);
+        }
+        segment[0] = storage.size;
+        storage.segments.push_back(segment);
+    }
+    uint64_t* segment = storage.segments[segment_idx];
+    storage.last_ptr = get_first_state(segment);
+    storage.segment_end = storage.last_ptr + (size_t) storage.segment_state_num * STATE_LENGTH_HEU;
+}
+
 uint64_t* allocate_state() {
-    if (storage.size + STATE_LENGTH_HEU > STORAGE_LENGTH) {
-        printf("Storage is full.\n");
-        exit(EXIT_FAILURE);
+    if (storage.last_ptr == NULL || storage.last_ptr + STATE_LENGTH_HEU == storage.segment_end) {
+        next_segment();
+    } else {
+        storage.last_ptr += STATE_LENGTH_HEU;
     }
-    storage.size += STATE_LENGTH_HEU;
-    // if there is nothing in the storage yet then the last ptr is at the beginning,
-    // otherwise, it is incremented by the state length
-    storage.last_ptr = (storage.last_ptr) ? storage.last_ptr + STATE_LENGTH_HEU : storage.storage_ptr;
+    storage.size++;
 
     count++;
     return storage.last_ptr;
@@ -38,17 +107,57 @@ void remove_last() {
     if (storage.size == 0) {
         return;
     }
-    storage.last_ptr -= STATE_LENGTH_HEU;
-    storage.size -= STATE_LENGTH_HEU;
+    storage.size--;
+    uint64_t* segment = get_segment(storage.last_ptr);
+    if (storage.last_ptr != get_first_state(segment)) {
+        storage.last_ptr -= STATE_LENGTH_HEU;
+        return;
+    }
+    // the last state was the first of its segment, which stays allocated for the next states
+    if (storage.size == 0) {
+        storage.last_ptr = NULL;
+        storage.segment_end = NULL;
+        return;
+    }
+    storage.segment_end = get_first_state(storage.segments[(storage.size - 1) >> storage.segment_state_shift]) +
+        (size_t) storage.segment_state_num * STATE_LENGTH_HEU;
+    storage.last_ptr = storage.segment_end - STATE_LENGTH_HEU;
 }
 
 uint64_t* get_state(int index) {
-    if (index >= storage.size) {
-        printf("Error: storage index %d out of bounds for storage length %d.\n", index, storage.size);
+    if (index / STATE_LENGTH_HEU >= storage.size) {
+        printf("Error: storage index %d out of bounds for storage length %zu.\n", index,
+            storage.size * STATE_LENGTH_HEU);
         free_storage();
         abort();
     }
-    return storage.storage_ptr + index;
+    return get_state_by_id(index / STATE_LENGTH_HEU);
+}
+
+int get_state_id(const uint64_t* state) {
+    uint64_t* segment = get_segment(state);
+    return segment[0] + (state - get_first_state(segment)) / STATE_LENGTH_HEU;
+}
+
+uint64_t* get_state_by_id(int id) {
+    uint64_t* segment = storage.segments[id >> storage.segment_state_shift];
+    return get_first_state(segment) + (size_t) (id & (storage.segment_state_num - 1)) * STATE_LENGTH_HEU;
+}
+
+void set_parent(int state_id, int parent_id, int action_idx) {
+    uint64_t* segment = storage.segments[state_id >> storage.segment_state_shift];
+    get_parent_ids(segment)[state_id & (storage.segment_state_num - 1)] = parent_id;
+    get_creating_actions(segment)[state_id & (storage.segment_state_num - 1)] = action_idx;
+}
+
+int get_parent_id(int state_id) {
+    uint64_t* segment = storage.segments[state_id >> storage.segment_state_shift];
+    return get_parent_ids(segment)[state_id & (storage.segment_state_num - 1)];
+}
+
+int get_creating_action(int state_id) {
+    uint64_t* segment = storage.segments[state_id >> storage.segment_state_shift];
+    return get_creating_actions(segment)[state_id & (storage.segment_state_num - 1)];
 }
 
 void remove_batch(int n) {
@@ -58,7 +167,13 @@ void remove_batch(int n) {
 }
 
 void free_storage() {
-    free(storage.storage_ptr);
+    for (uint64_t* segment : storage.segments) {
+        free(segment);
+    }
+    storage.segments.clear();
+    storage.last_ptr = NULL;
+    storage.segment_end = NULL;
+    storage.size = 0;
 }
 
-uint64_t count = 0;
\ No newline at end of file
+thread_local uint64_t count = 0;
@@ -6,6 +6,9 @@
 #include <stdio.h>
 #include "config.h"
 
+// The storage and count are per thread. The storage grows by segments as states are allocated, up to max_bytes
+// per thread if it is not 0.
+void set_storage_limit(size_t max_bytes);
 void storage_init();
 uint64_t* allocate_state();
 void remove_last();
@@ -14,6 +17,16 @@ void free_storage();
 uint64_t* get_state(int index);
 void remove_batch(int n);
 
-extern uint64_t count;
+// the id of a state is its position in the storage, in states
+int get_state_id(const uint64_t* state);
+uint64_t* get_state_by_id(int id);
+
+// the search path of a state: the id of the state it was created from and the action that created it,
+// kept in arrays next to the states of its segment, -1 for the initial state
+void set_parent(int state_id, int parent_id, int action_idx);
+int get_parent_id(int state_id);
+int get_creating_action(int state_id);
+
+extern thread_local uint64_t count;
 
 #endif
\ No newline at end of file
@@ -0,0 +1,6 @@
+#ifndef CONFIG_H
+#define CONFIG_H
+// in the table-driven build the state lengths are read from the task file, see table_task.cpp
+extern int STATE_LENGTH;
+extern int STATE_LENGTH_HEU;
+#endif
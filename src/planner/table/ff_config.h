@@ -0,0 +1,8 @@
+#ifndef FF_CONFIG_H
+#define FF_CONFIG_H
+// in the table-driven build the sizes are read from the task file, see table_task.cpp
+extern int FF_STATE_LENGTH;
+extern int FACT_NUM;
+extern int ACTION_NUM;
+extern int GOAL_FACT_NUM;
+#endif
@@ -0,0 +1,283 @@
+// Table-driven implementation of the functions that are otherwise generated per task (action.cpp, ff_graph.cpp,
+// sa_action.cpp). The operator masks are read from a task file by load_task, the layout of the file is defined
+// by generate/task_table.py.
+#include <stdint.h>
+#include <stdio.h>
+#include <string.h>
+#include <vector>
+
+#include "action.h"
+#include "ff_graph.h"
+#include "sa_action.h"
+#include "table_task.h"
+#include "config.h"
+#include "ff_config.h"
+
+#define TASK_FILE_MAGIC "PLNRTASK"
+#define TASK_FILE_VERSION 6
+
+int STATE_LENGTH = 0;
+int STATE_LENGTH_HEU = 0;
+int FF_STATE_LENGTH = 0;
+int FACT_NUM = 0;
+int ACTION_NUM = 0;
+int GOAL_FACT_NUM = 0;
+uint64_t* INITIAL_STATE = NULL;
+const int* ORIGINAL_OPERATOR_ID = NULL;
+const int* PRECOND_OFFSETS = NULL;
+const int* PRECOND_FACTS = NULL;
+const int* EFFECT_OFFSETS = NULL;
+const int* EFFECT_FACTS = NULL;
+const int* GOAL_FACTS = NULL;
+const int* CONVERSION_OFFSETS = NULL;
+const int* CONVERSION_CHUNKS = NULL;
+const uint64_t* CONVERSION_BITS = NULL;
+const int* CONVERSION_FACTS = NULL;
+
+typedef struct {
+    int num_variables;
+    std::vector<uint64_t> initial_state;
+    std::vector<uint64_t> goal_mask;
+    std::vector<uint64_t> goal_val;
+    std::vector<uint64_t> ff_goal;
+    // one row of STATE_LENGTH (FF_STATE_LENGTH for ff_pre and ff_eff) words per operator
+    std::vector<uint64_t> pre_mask;
+    std::vector<uint64_t> pre_val;
+    std::vector<uint64_t> eff_mask;
+    std::vector<uint64_t> eff_val;
+    std::vector<uint64_t> ff_pre;
+    std::vector<uint64_t> ff_eff;
+    // the tables of convert_state_to_multi_valued, see CONVERSION_OFFSETS in ff_graph.h
+    std::vector<int32_t> conversion_offsets;
+    std::vector<int32_t> conversion_chunks;
+    std::vector<uint64_t> conversion_bits;
+    std::vector<int32_t> conversion_facts;
+    // fact indices of the preconditions and effects, CSR by operator
+    std::vector<int32_t> pre_offsets;
+    std::vector<int32_t> pre_facts;
+    std::vector<int32_t> eff_offsets;
+    std::vector<int32_t> eff_facts;
+    std::vector<uint8_t> is_goal_fact;
+    std::vector<int32_t> goal_facts;
+    // the mutex checks of the successors by operator, a successor is pruned if no_mutex_fact fails for one of
+    // the checks of its operator, or if its operator always violates a mutex
+    std::vector<int32_t> mutex_offsets;
+    std::vector<int32_t> mutex_words;
+    std::vector<uint64_t> mutex_masks;
+    std::vector<uint64_t> mutex_vals;
+    std::vector<uint64_t> mutex_low_bits;
+    std::vector<uint64_t> mutex_high_bits;
+    std::vector<uint8_t> always_violates_mutex;
+    // the ids of the operators in the sas file, see ORIGINAL_OPERATOR_ID
+    std::vector<int32_t> original_operator_ids;
+    // the words [begin, end) of every operator with a nonzero pre_mask, or ff_pre, the others are not tested
+    std::vector<int32_t> pre_word_begin;
+    std::vector<int32_t> pre_word_end;
+    std::vector<int32_t> ff_pre_word_begin;
+    std::vector<int32_t> ff_pre_word_end;
+} TaskTable;
+
+static TaskTable task;
+
+template <typename T>
+static bool read_array(FILE* file, std::vector<T>& array, size_t n) {
+    array.resize(n);
+    return fread(array.data(), sizeof(T), n, file) == n;
+}
+
+bool load_task(const char* filename) {
+    FILE* file = fopen(filename, "rb");
+    if (file == NULL) {
+        printf("Error: cannot open task file %s.\n", filename);
+        return false;
+    }
+
+    char magic[8];
+    uint32_t header[11];
+    if (fread(magic, 1, 8, file) != 8 || memcmp(magic, TASK_FILE_MAGIC, 8) != 0 ||
+        fread(header, sizeof(uint32_t), 11, file) != 11 || header[0] != TASK_FILE_VERSION) {
+        printf("Error: %s is not a task file of version %d.\n", filename, TASK_FILE_VERSION);
+        fclose(file);
+        return false;
+    }
+    task.num_variables = header[1];
+    STATE_LENGTH = header[2];
+    STATE_LENGTH_HEU = STATE_LENGTH + 1;
+    FF_STATE_LENGTH = header[3];
+    FACT_NUM = header[4];
+    ACTION_NUM = header[5];
+    size_t n_pre_facts = header[6];
+    size_t n_eff_facts = header[7];
+    size_t n_mutex_checks = header[8];
+    size_t n_conversion_chunks = header[9];
+    size_t n_conversion_entries = header[10];
+    size_t n_ops = ACTION_NUM;
+
+    bool ok = read_array(file, task.initial_state, STATE_LENGTH) &&
+        read_array(file, task.goal_mask, STATE_LENGTH) &&
+        read_array(file, task.goal_val, STATE_LENGTH) &&
+        read_array(file, task.ff_goal, FF_STATE_LENGTH) &&
+        read_array(file, task.pre_mask, n_ops * STATE_LENGTH) &&
+        read_array(file, task.pre_val, n_ops * STATE_LENGTH) &&
+        read_array(file, task.eff_mask, n_ops * STATE_LENGTH) &&
+        read_array(file, task.eff_val, n_ops * STATE_LENGTH) &&
+        read_array(file, task.ff_pre, n_ops * FF_STATE_LENGTH) &&
+        read_array(file, task.ff_eff, n_ops * FF_STATE_LENGTH) &&
+        read_array(file, task.conversion_offsets, FF_STATE_LENGTH + 2) &&
+        read_array(file, task.conversion_chunks, 4 * n_conversion_chunks) &&
+        read_array(file, task.conversion_bits, n_conversion_entries) &&
+        read_array(file, task.conversion_facts, 64 * FF_STATE_LENGTH) &&
+        read_array(file, task.pre_offsets, n_ops + 1) &&
+        read_array(file, task.pre_facts, n_pre_facts) &&
+        read_array(file, task.eff_offsets, n_ops + 1) &&
+        read_array(file, task.eff_facts, n_eff_facts) &&
+        read_array(file, task.is_goal_fact, FACT_NUM) &&
+        read_array(file, task.mutex_offsets, n_ops + 1) &&
+        read_array(file, task.mutex_words, n_mutex_checks) &&
+        read_array(file, task.mutex_masks, n_mutex_checks) &&
+        read_array(file, task.mutex_vals, n_mutex_checks) &&
+        read_array(file, task.mutex_low_bits, n_mutex_checks) &&
+        read_array(file, task.mutex_high_bits, n_mutex_checks) &&
+        read_array(file, task.always_violates_mutex, n_ops) &&
+        read_array(file, task.original_operator_ids, n_ops) &&
+        read_array(file, task.pre_word_begin, n_ops) &&
+        read_array(file, task.pre_word_end, n_ops) &&
+        read_array(file, task.ff_pre_word_begin, n_ops) &&
+        read_array(file, task.ff_pre_word_end, n_ops);
+    fclose(file);
+    if (!ok) {
+        printf("Error: task file %s is truncated.\n", filename);
+        return false;
+    }
+
+    // the heuristic word of the initial state is set by the search
+    task.initial_state.push_back(0);
+    INITIAL_STATE = task.initial_state.data();
+    ORIGINAL_OPERATOR_ID = task.original_operator_ids.data();
+    PRECOND_OFFSETS = task.pre_offsets.data();
+    PRECOND_FACTS = task.pre_facts.data();
+    EFFECT_OFFSETS = task.eff_offsets.data();
+    EFFECT_FACTS = task.eff_facts.data();
+    CONVERSION_OFFSETS = task.conversion_offsets.data();
+    CONVERSION_CHUNKS = task.conversion_chunks.data();
+    CONVERSION_BITS = task.conversion_bits.data();
+    CONVERSION_FACTS = task.conversion_facts.data();
+    for (int fact = 0; fact < FACT_NUM; fact++) {
+        if (task.is_goal_fact[fact]) {
+            task.goal_facts.push_back(fact);
+        }
+    }
+    GOAL_FACTS = task.goal_facts.data();
+    GOAL_FACT_NUM = task.goal_facts.size();
+    return true;
+}
+
+static bool is_applicable(const uint64_t* state_bitrep, int action_idx) {
+    const uint64_t* masks = &task.pre_mask[(size_t) action_idx * STATE_LENGTH];
+    const uint64_t* vals = &task.pre_val[(size_t) action_idx * STATE_LENGTH];
+    for (int i = task.pre_word_begin[action_idx]; i < task.pre_word_end[action_idx]; i++) {
+        if ((state_bitrep[i] & masks[i]) != vals[i]) {
+            return false;
+        }
+    }
+    return true;
+}
+
+static void set_new_state(const uint64_t* state_bitrep, uint64_t* newstate_bitrep, int action_idx) {
+    const uint64_t* masks = &task.eff_mask[(size_t) action_idx * STATE_LENGTH];
+    const uint64_t* vals = &task.eff_val[(size_t) action_idx * STATE_LENGTH];
+    for (int i = 0; i < STATE_LENGTH; i++) {
+        newstate_bitrep[i] = (state_bitrep[i] & masks[i]) | vals[i];
+    }
+}
+
+static bool satisfies_mutexes(const uint64_t* newstate_bitrep, int action_idx) {
+    if (task.always_violates_mutex[action_idx]) {
+        return false;
+    }
+    for (int i = task.mutex_offsets[action_idx]; i < task.mutex_offsets[action_idx + 1]; i++) {
+        if (!no_mutex_fact(newstate_bitrep[task.mutex_words[i]], task.mutex_masks[i], task.mutex_vals[i],
+                           task.mutex_low_bits[i], task.mutex_high_bits[i])) {
+            return false;
+        }
+    }
+    return true;
+}
+
+void actions(uint64_t* state_bitrep, PlannerQueue& pq) {
+    for (int action_idx = 0; action_idx < ACTION_NUM; action_idx++) {
+        if (!is_applicable(state_bitrep, action_idx)) {
+            continue;
+        }
+        uint64_t* newstate_bitrep = allocate_state();
+        set_new_state(state_bitrep, newstate_bitrep, action_idx);
+        if (satisfies_mutexes(newstate_bitrep, action_idx)) {
+            add_to_queue(newstate_bitrep, state_bitrep, action_idx, pq);
+        } else {
+            remove_last();
+        }
+    }
+}
+
+bool is_goal(uint64_t* state_bitrep) {
+    for (int i = 0; i < STATE_LENGTH; i++) {
+        if ((state_bitrep[i] & task.goal_mask[i]) != task.goal_val[i]) {
+            return false;
+        }
+    }
+    return true;
+}
+
+bool is_ff_goal(uint64_t* ff_state) {
+    for (int i = 0; i < FF_STATE_LENGTH; i++) {
+        if ((ff_state[i] & task.ff_goal[i]) != task.ff_goal[i]) {
+            return false;
+        }
+    }
+    return true;
+}
+
+void build_next_layer(uint64_t* next_state, const uint64_t* state, std::vector<int>& fact_membership, std::vector<int>& action_membership, std::vector<int>& achieving_action, int layer, std::vector<int>& gi) {
+    for (int action_idx = 0; action_idx < ACTION_NUM; action_idx++) {
+        if (action_membership[action_idx] != -1) {
+            continue;
+        }
+        const uint64_t* pre = &task.ff_pre[(size_t) action_idx * FF_STATE_LENGTH];
+        bool applicable = true;
+        for (int i = task.ff_pre_word_begin[action_idx]; i < task.ff_pre_word_end[action_idx] && applicable; i++) {
+            applicable = (state[i] & pre[i]) == pre[i];
+        }
+        if (!applicable) {
+            continue;
+        }
+        const uint64_t* eff = &task.ff_eff[(size_t) action_idx * FF_STATE_LENGTH];
+        for (int i = 0; i < FF_STATE_LENGTH; i++) {
+            next_state[i] |= eff[i];
+        }
+        action_membership[action_idx] = layer;
+        for (int i = task.eff_offsets[action_idx]; i < task.eff_offsets[action_idx + 1]; i++) {
+            int fact = task.eff_facts[i];
+            if (fact_membership[fact] == -1) {
+                fact_membership[fact] = layer + 1;
+                achieving_action[fact] = action_idx;
+                if (task.is_goal_fact[fact]) {
+                    gi.push_back(fact);
+                }
+            }
+        }
+    }
+}
+
+void get_applicable_actions(uint64_t* state_bitrep, vector<int>& applicable_actions) {
+    applicable_actions.clear();
+    for (int action_idx = 0; action_idx < ACTION_NUM; action_idx++) {
+        if (is_applicable(state_bitrep, action_idx)) {
+            applicable_actions.push_back(action_idx);
+        }
+    }
+}
+
+void apply_action_effects(uint64_t* state_bitrep, int action_idx) {
+    uint64_t* newstate_bitrep = allocate_state();
+    set_new_state(state_bitrep, newstate_bitrep, action_idx);
+}
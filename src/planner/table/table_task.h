@@ -0,0 +1,8 @@
+#ifndef TABLE_TASK_H
+#define TABLE_TASK_H
+
+// Loads a task file written by `generate.app --mode table`. Sets the sizes in config.h and ff_config.h,
+// INITIAL_STATE and the tables used by the generated-code interface (actions, build_next_layer, ...).
+bool load_task(const char* filename);
+
+#endif
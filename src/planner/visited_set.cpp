@@ -1,13 +1,92 @@
 #include "visited_set.h"
 
-std::unordered_set<uint64_t> visited;
+#include <string.h>
+#include <vector>
 
-void insert_visited(const uint64_t* state_bitrep) {
-    XXH64_hash_t hash = XXH3_64bits(state_bitrep, STATE_LENGTH * sizeof(uint64_t));
-    visited.insert(hash);
+#include "./xxHash/xxhash.h"
+#include "storage.h"
+
+const int EMPTY_BUCKET = -1;
+const size_t INITIAL_BUCKET_NUM = 1 << 16;
+
+typedef struct {
+    uint64_t hash;
+    int state_id;
+} Bucket;
+
+typedef struct {
+    // linear probing, the number of buckets is a power of two and at least twice the number of states
+    std::vector<Bucket> buckets;
+    size_t size;
+} StateRegistry;
+
+// per thread like the storage whose ids it holds
+thread_local StateRegistry visited;
+// hash of the generated states by id, computed by contain_visited
+thread_local std::vector<uint64_t> state_hashes;
+
+// Index of the bucket of the state, or of the empty bucket where it would be inserted.
+static size_t find_bucket(const uint64_t* state_bitrep, uint64_t hash) {
+    size_t mask = visited.buckets.size() - 1;
+    for (size_t i = hash & mask;; i = (i + 1) & mask) {
+        const Bucket& bucket = visited.buckets[i];
+        if (bucket.state_id == EMPTY_BUCKET) {
+            return i;
+        }
+        if (bucket.hash == hash &&
+            memcmp(get_state_by_id(bucket.state_id), state_bitrep, STATE_LENGTH * sizeof(uint64_t)) == 0) {
+            return i;
+        }
+    }
+}
+
+static void resize_buckets(size_t bucket_num) {
+    std::vector<Bucket> old_buckets;
+    old_buckets.swap(visited.buckets);
+    visited.buckets.assign(bucket_num, Bucket{0, EMPTY_BUCKET});
+    size_t mask = bucket_num - 1;
+    // the states in the table are all different, so they are inserted without comparing them
+    for (const Bucket& bucket : old_buckets) {
+        if (bucket.state_id == EMPTY_BUCKET) {
+            continue;
+        }
+        size_t i = bucket.hash & mask;
+        while (visited.buckets[i].state_id != EMPTY_BUCKET) {
+            i = (i + 1) & mask;
+        }
+        visited.buckets[i] = bucket;
+    }
+}
+
+bool contain_visited(int state_id) {
+    const uint64_t* state_bitrep = get_state_by_id(state_id);
+    uint64_t hash = XXH3_64bits(state_bitrep, STATE_LENGTH * sizeof(uint64_t));
+    if ((size_t) state_id >= state_hashes.size()) {
+        state_hashes.resize(state_id + 1);
+    }
+    state_hashes[state_id] = hash;
+    if (visited.size == 0) {
+        return false;
+    }
+    return visited.buckets[find_bucket(state_bitrep, hash)].state_id != EMPTY_BUCKET;
 }
 
-bool contain_visited(const uint64_t* state_bitrep) {
-    XXH64_hash_t hash = XXH3_64bits(state_bitrep, STATE_LENGTH * sizeof(uint64_t));
-    return visited.count(hash) == 1;
-}
\ No newline at end of file
+bool contain_visited_hashed(int state_id) {
+    if (visited.size == 0) {
+        return false;
+    }
+    return visited.buckets[find_bucket(get_state_by_id(state_id), state_hashes[state_id])].state_id != EMPTY_BUCKET;
+}
+
+void insert_visited(int state_id) {
+    if (2 * (visited.size + 1) > visited.buckets.size()) {
+        resize_buckets(visited.buckets.empty() ? INITIAL_BUCKET_NUM : 2 * visited.buckets.size());
+    }
+    uint64_t hash = state_hashes[state_id];
+    Bucket& bucket = visited.buckets[find_bucket(get_state_by_id(state_id), hash)];
+    // a state can be in the queue more than once, it is expanded again but stored once
+    if (bucket.state_id == EMPTY_BUCKET) {
+        bucket = Bucket{hash, state_id};
+        visited.size++;
+    }
+}
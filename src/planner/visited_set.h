@@ -2,11 +2,18 @@
 #define VISITED_H
 
 #include <stdint.h>
-#include <unordered_set>
-#include "./xxHash/xxhash.h"
 #include "config.h"
 
-void insert_visited(const uint64_t* state_bitrep);
-bool contain_visited(const uint64_t* state_bitrep);
+// Registry of the expanded states: an open addressing hash table of the ids of the states in the storage.
+// States with equal hashes are compared in full, so a hash collision never prunes a state. Every thread has its
+// own registry, of the states of its storage.
 
-#endif
\ No newline at end of file
+// Returns whether a state equal to the state with this id was expanded. Hashes the state, the hash is kept
+// for insert_visited, so every generated state is hashed only once.
+bool contain_visited(int state_id);
+// contain_visited for a state that it was already called for, e.g. when the state is queued, with the kept hash.
+bool contain_visited_hashed(int state_id);
+// Marks the state as expanded, contain_visited must have been called for it.
+void insert_visited(int state_id);
+
+#endif
@@ -1,37 +1,266 @@
 #!/usr/bin/env python3
 
-import concurrent.futures
+import argparse
+import os
+import shutil
+import subprocess
 import sys
+import time
+from typing import Optional
 
-from generate import parse, helpers, generator, representations, ff_generator
+import numpy as np
 
+from generate import (
+    parse, bulk_parse, cache, columnar, constants, helpers, generator, layout, pipeline, pruning, representations,
+    ff_generator, task_table
+)
 
-def main():
-    if len(sys.argv) > 1:
-        FILE_NAME = sys.argv[1]
-    else:
-        print("Missing sas file argument.")
-        return
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Generate the planner sources for a sas file.")
+    parser.add_argument("sas_file", help="translator output file")
+    parser.add_argument(
+        "--parser",
+        choices=["bulk", "lines"],
+        default="bulk",
+        help="bulk: read and tokenize the file in one go (default), lines: line-by-line reference parser",
+    )
+    parser.add_argument(
+        "-j", "--jobs",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="number of worker processes for the code emission (default: number of cores)",
+    )
+    parser.add_argument(
+        "--shards",
+        type=int,
+        default=1,
+        help="split the per-operator code into this many source files, which compile in parallel with make -j",
+    )
+    parser.add_argument(
+        "--successor-generator",
+        choices=["tree", "bitset", "linear"],
+        default="tree",
+        help="tree: find the applicable operators with a decision tree over the variables (default), "
+             "bitset: test the operators in vectorizable loops over mask arrays grouped by state word, "
+             "linear: test the preconditions of every operator",
+    )
+    parser.add_argument(
+        "--ff-exploration",
+        choices=["layers", "counters"],
+        default="layers",
+        help="layers: build the relaxed planning graph by testing every operator in every layer (default), "
+             "counters: count the unsatisfied preconditions of the operators and apply them when they reach zero",
+    )
+    parser.add_argument(
+        "--heuristic",
+        choices=["ff", "add", "max", "goal-count"],
+        default="ff",
+        help="default heuristic of the compiled planner: ff (default), add (h^add), max (h^max) or goal-count, "
+             "the planner can select another with --h",
+    )
+    parser.add_argument(
+        "--pruning",
+        choices=["on", "off"],
+        default="on",
+        help="on: remove the operators that are unreachable from the initial state or irrelevant to the goal, and "
+             "the variables without relevant facts, before generating the code (default), off: keep the whole task",
+    )
+    parser.add_argument(
+        "--layout",
+        choices=["optimized", "sequential"],
+        default="optimized",
+        help="optimized: place the variables in as few state words as possible, the variables of the same operators "
+             "together (default), sequential: place them in file order",
+    )
+    parser.add_argument(
+        "--mode",
+        choices=["compiled", "table"],
+        default="compiled",
+        help="compiled: generate the planner sources for the task (default), "
+             "table: write a task file for the precompiled table-driven planner",
+    )
+    parser.add_argument(
+        "--task-file",
+        default="task.bin",
+        help="output file of --mode table (default: task.bin)",
+    )
+    parser.add_argument(
+        "--build",
+        metavar="BINARY",
+        help="also compile the planner to BINARY, or restore it from the cache (compiled mode only)",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        default=cache.DEFAULT_CACHE_DIR,
+        help=f"directory of the generation cache (default: {cache.DEFAULT_CACHE_DIR})",
+    )
+    parser.add_argument(
+        "--cache-size",
+        type=int,
+        default=cache.DEFAULT_MAX_SIZE_MB,
+        help="size limit of the cache in MB, least recently used entries are evicted "
+             f"(default: {cache.DEFAULT_MAX_SIZE_MB})",
+    )
+    parser.add_argument("--no-cache", action="store_true", help="always generate, without reading or filling the cache")
+    args = parser.parse_args()
+    if args.build and args.mode == "table":
+        parser.error("--build is only supported in compiled mode, the table-driven planner is built once")
+    return args
+
+
+def read_task(filename: str, backend: str):
+    if backend == "lines":
+        return parse.RootTask(helpers.get_lines(filename))
+    return bulk_parse.BulkRootTask(filename)
+
+
+def get_generator_options(args) -> pipeline.GeneratorOptions:
+    return pipeline.GeneratorOptions(
+        shards=args.shards, successor_generator=args.successor_generator, ff_exploration=args.ff_exploration,
+        heuristic=args.heuristic, pruning=args.pruning == "on", layout=args.layout,
+    )
+
+
+def print_layout_report(
+    task: columnar.ColumnarTask,
+    var_infos: list[representations.VarInfo],
+    ff_var_infos: list[representations.VarInfo],
+    layout_time: float,
+):
+    """
+    Prints the words per state and the words touched per operator of the sequential and optimized layouts, and the
+    time taken by the optimized layouts.
+    """
+    for name, widths, infos in (
+        ("Packed", layout.get_packed_widths(task), var_infos),
+        ("FF", task.domain_sizes, ff_var_infos),
+    ):
+        before = layout.get_layout_report(task, layout.get_layout(widths, task, False))
+        after = layout.get_layout_report(task, layout.Layout(
+            np.array([info.word_pos for info in infos]),
+            np.array([info.b_start for info in infos]),
+            representations.get_state_length(infos),
+        ))
+        print(f"{name} layout: {before} -> {after}")
+    print(f"Layout time: {layout_time:.3f}s")
+
+
+GENERATED_FILES = [generator.ACTION_FILE, ff_generator.ACTION_FILE, generator.SA_ACTION_FILE]
+
+
+def generate(args) -> Optional[list[str]]:
+    """
+    Writes the sources (or the task file of the table mode) and returns their paths, None if the task is invalid.
+    The parse and generation times are printed for generate.benchmark_suite.
+    """
+    start = time.perf_counter()
     try:
-        lines = helpers.get_lines(FILE_NAME)
-        root_task = parse.RootTask(lines)
+        # the generators only need the columnar tables, not the parser's object graph
+        root_task = read_task(args.sas_file, args.parser)
+        task = root_task.get_columnar_task()
     except Exception:
         print("Error reading sas file")
-        return
+        return None
+    parse_end = time.perf_counter()
+    print(f"Parse time: {parse_end - start:.3f}s")
+    options = get_generator_options(args)
+    if options.pruning:
+        # the plans still print the operator ids of the sas file, see ORIGINAL_OPERATOR_ID in planner/action.h
+        task, report = pruning.prune_task(task, root_task.get_num_axioms() > 0)
+        print(report)
+
+    optimized_layout = options.layout == "optimized"
+    layout_start = time.perf_counter()
+    var_infos = representations.get_var_infos(task, optimized_layout)
+    assert (len(var_infos) == task.num_variables)
+    ff_var_infos = ff_generator.get_ff_var_infos(task, optimized_layout)
+    assert (len(ff_var_infos) == task.num_variables)
+    if optimized_layout:
+        print_layout_report(task, var_infos, ff_var_infos, time.perf_counter() - layout_start)
 
-    var_infos = representations.get_var_infos(root_task)
-    assert (len(var_infos) == root_task.get_num_variables())
-    ff_var_infos = ff_generator.get_ff_var_infos(root_task)
-    assert (len(ff_var_infos) == root_task.get_num_variables())
+    # every writer uses the same packed masks, so the operators are encoded only once
+    context = pipeline.GenerationContext.build(task, var_infos, ff_var_infos, options)
 
+    if args.mode == "table":
+        task_table.write_task_table(context, args.task_file)
+        print(f"Generation time: {time.perf_counter() - parse_end:.3f}s")
+        return [args.task_file]
+
+    os.makedirs(constants.C_GENERATED_CODE_DIR, exist_ok=True)
     generator.write_configs(var_infos)
-    ff_generator.write_ff_configs(root_task, ff_var_infos)
-    generator.write_sa_header()
+    ff_generator.write_ff_configs(task, ff_var_infos, context.options)
+
+    pipeline.remove_stale_shards(constants.C_GENERATED_CODE_DIR, GENERATED_FILES)
+    output_files = [
+        *generator.get_action_files(context),
+        *ff_generator.get_ff_graph_files(context),
+        *generator.get_sa_action_files(context),
+    ]
+    pipeline.write_files(context, output_files, constants.C_GENERATED_CODE_DIR, args.jobs)
+    file_names = [generator.CONFIG_FILE, ff_generator.CONFIG_FILE] + [file.name for file in output_files]
+    print(f"Generation time: {time.perf_counter() - parse_end:.3f}s")
+    return [os.path.join(constants.C_GENERATED_CODE_DIR, name) for name in file_names]
+
+
+def restore(args, entry_files: list[str]):
+    """
+    Restores the cached output. Files whose content did not change are not touched, so make does not rebuild them.
+    """
+    if args.mode == "table":
+        cache.copy_if_changed(entry_files[0], args.task_file)
+        return
+    os.makedirs(constants.C_GENERATED_CODE_DIR, exist_ok=True)
+    names = {os.path.basename(path) for path in entry_files}
+    pipeline.remove_stale_shards(constants.C_GENERATED_CODE_DIR, GENERATED_FILES, keep=names)
+    for path in entry_files:
+        cache.copy_if_changed(path, os.path.join(constants.C_GENERATED_CODE_DIR, os.path.basename(path)))
+
+
+def build_planner(
+    binary: str, jobs: int, generation_cache: Optional[cache.GenerationCache], entry: Optional[str]
+) -> bool:
+    build_key = cache.get_build_key()
+    cached_binary = cache.GenerationCache.get_binary(entry, build_key) if entry else None
+    if cached_binary:
+        shutil.copy2(cached_binary, binary)
+        print("Restored the planner binary from the cache")
+        return True
+    result = subprocess.run(["make", "-C", constants.C_SRC_CODE_DIR, f"-j{jobs}", f"BIN={os.path.abspath(binary)}"])
+    if result.returncode != 0:
+        print("Error compiling the planner")
+        return False
+    if generation_cache and entry:
+        generation_cache.store_binary(entry, build_key, binary)
+    return True
+
+
+def main():
+    if len(sys.argv) == 1:
+        print("Missing sas file argument.")
+        return 0
+    args = parse_args()
+
+    generation_cache = None
+    if not args.no_cache:
+        generation_cache = cache.GenerationCache(args.cache_dir, args.cache_size * 1024 * 1024)
+    entry = None
+    if generation_cache:
+        key = generation_cache.make_key(args.sas_file, {"mode": args.mode, **vars(get_generator_options(args))})
+        entry = generation_cache.lookup(key)
+    if entry:
+        restore(args, cache.GenerationCache.get_files(entry))
+        print("Restored the generated code from the cache")
+    else:
+        paths = generate(args)
+        if paths is None:
+            return 1
+        if generation_cache:
+            entry = generation_cache.store(key, paths)
 
-    with concurrent.futures.ProcessPoolExecutor(max_workers=4) as executor:
-        executor.submit(generator.write_actions, root_task, var_infos)
-        executor.submit(ff_generator.write_ff_graph, root_task, var_infos, ff_var_infos)
-        executor.submit(generator.write_sa_actions, root_task, var_infos)
+    if args.build and not build_planner(args.build, args.jobs, generation_cache, entry):
+        return 1
+    return 0
 
 
 if __name__ == "__main__":
@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""
+Bulk applicability test of the operators.
+
+The operators are grouped by the variables of their preconditions, i.e. by the state words that their
+preconditions touch and the masks in these words. Each group gets a contiguous array of precondition values per
+run of bits of the masks, shifted to the lowest bits and stored in the smallest integer type that holds them.
+The preconditions of all operators of a group are tested against the same bits of the state in a loop without
+branches that the compiler can vectorize. The results are stored as one byte per operator, which are packed into
+a bitset of the applicable operators eight at a time, and the set bits are then visited in operator order.
+"""
+from collections import defaultdict
+from dataclasses import dataclass
+
+import numpy as np
+
+from generate import helpers, representations
+
+# smaller groups are tested one operator at a time, the loop and its arrays are not worth it
+MIN_BULK_GROUP_SIZE = 8
+# loops are only vectorized at -O2 if their trip count is a multiple of the number of values in a vector register,
+# so the groups are padded to a multiple of the number of bytes in an AVX2 register
+VECTOR_PADDING = 32
+# moves bit 0 of byte i of a word to bit 56 + i, so that eight bytes that are 0 or 1 are packed into one byte
+PACK_BYTES_MAGIC = "0x0102040810204080ULL"
+
+
+@dataclass
+class PreconditionGroup:
+    # state words with a precondition of the operators of the group, in increasing order
+    words: list[int]
+    # the masks of the preconditions in these words, the same for all operators of the group
+    masks: list[int]
+    operators: list[int]
+
+    @property
+    def is_contiguous(self) -> bool:
+        return self.operators[-1] - self.operators[0] == len(self.operators) - 1
+
+
+def _split_runs(ops: list[int]) -> tuple[list[list[int]], list[int]]:
+    """
+    Splits sorted operators into the runs of consecutive operators that are long enough to be tested in bulk,
+    and the remaining operators.
+    """
+    runs = []
+    rest = []
+    for run in np.split(np.array(ops), np.flatnonzero(np.diff(ops) != 1) + 1):
+        if len(run) >= MIN_BULK_GROUP_SIZE:
+            runs.append(run.tolist())
+        else:
+            rest += run.tolist()
+    return runs, rest
+
+
+def group_operators(encoding: representations.OperatorEncoding, start: int, stop: int) -> list[PreconditionGroup]:
+    """
+    Groups the operators start, ..., stop - 1 with at least one precondition by the words of their preconditions
+    and the masks in these words, ordered by their first operator. Each run of consecutive operators of a group
+    that can be tested in bulk is a group of its own, so that its flags are written without indirection.
+    """
+    by_masks: dict[tuple[tuple[int, int], ...], list[int]] = defaultdict(list)
+    for op in range(start, stop):
+        masks = encoding.pre_mask[op]
+        words = np.flatnonzero(masks).tolist()
+        if words:
+            by_masks[tuple(zip(words, masks[words].tolist()))].append(op)
+    groups = []
+    for key, ops in by_masks.items():
+        runs, rest = _split_runs(ops)
+        for group_ops in runs + ([rest] if rest else []):
+            groups.append(PreconditionGroup([word for word, _ in key], [mask for _, mask in key], group_ops))
+    return sorted(groups, key=lambda group: group.operators[0])
+
+
+def get_bitset_length(start: int, stop: int) -> int:
+    return (stop - start + 63) // 64
+
+
+def _round_up(n: int, multiple: int) -> int:
+    return -(-n // multiple) * multiple
+
+
+def _split_mask(mask: int) -> list[tuple[int, int]]:
+    """
+    Splits a mask into its runs of set bits, as (shift, mask of the run shifted to the lowest bits).
+    """
+    runs = []
+    while mask:
+        shift = (mask & -mask).bit_length() - 1
+        run = mask >> shift
+        run &= ~(run + 1)
+        runs.append((shift, run))
+        mask &= ~(run << shift)
+    return runs
+
+
+def _get_columns(group: PreconditionGroup) -> list[tuple[int, int, int]]:
+    """
+    The tested parts of the state as (word, shift, mask): a column per run of bits, i.e. per set of
+    precondition variables that are next to each other in a word.
+    """
+    return [(word, shift, run) for word, mask in zip(group.words, group.masks) for shift, run in _split_mask(mask)]
+
+
+def _get_value_type(columns: list[tuple[int, int, int]]) -> str:
+    """
+    Smallest unsigned type that holds the values of all columns. The narrower the type, the more operators are
+    tested per vector instruction, and comparisons of 64 bit values are not vectorized without SSE4.1.
+    """
+    n_bits = max(run.bit_length() for _, _, run in columns)
+    return next(f"uint{size}_t" for size in (8, 16, 32, 64) if n_bits <= size)
+
+
+def _make_array_str(c_type: str, name: str, values: list[int]) -> str:
+    to_str = bin if c_type == "uint64_t" else str
+    return f"static const {c_type} {name}[{len(values)}] = {{" + ",".join(map(to_str, values)) + "};\n"
+
+
+def make_flags_declaration(start: int, stop: int, flags_name: str) -> str:
+    """
+    Declares the flags of the operators start, ..., stop - 1, padded to whole words of the bitset and with room
+    for the padding of the last group.
+    """
+    return f"uint8_t {flags_name}[{get_bitset_length(start, stop) * 64 + VECTOR_PADDING}];\n"
+
+
+def _write_bulk_group(
+    writer: helpers.CodeWriter,
+    encoding: representations.OperatorEncoding,
+    group: PreconditionGroup,
+    start: int,
+    flags_name: str,
+):
+    n = len(group.operators)
+    n_padded = _round_up(n, VECTOR_PADDING)
+    columns = _get_columns(group)
+    value_type = _get_value_type(columns)
+    ops = np.array(group.operators)
+    writer.write("{\n")
+    for k, (word, shift, run) in enumerate(columns):
+        vals = ((encoding.pre_val[ops, word] >> np.uint64(shift)) & np.uint64(run)).tolist() + [0] * (n_padded - n)
+        writer.write(_make_array_str(value_type, f"pre_val_{k}", vals))
+        writer.write(f"const {value_type} state_{k} = (state_bitrep[{word}] >> {shift}) & {bin(run)};\n")
+    # the differences to the preconditions are or-ed, an operator is applicable if there is none
+    test_str = "(" + " | ".join(f"(state_{k} ^ pre_val_{k}[i])" for k in range(len(columns))) + ") == 0"
+    if group.is_contiguous:
+        # the padding overwrites the flags after the group, which are written later
+        writer.write_lines([
+            f"for (int i = 0; i < {n_padded}; i++) {{",
+            f"{flags_name}[{ops[0] - start} + i] = {test_str};",
+            "}",
+            "}",
+        ])
+        return
+    writer.write(_make_array_str("int", "ops", (ops - start).tolist()))
+    writer.write_lines([
+        f"uint8_t group_flags[{n_padded}];",
+        f"for (int i = 0; i < {n_padded}; i++) {{",
+        f"group_flags[i] = {test_str};",
+        "}",
+        f"for (int i = 0; i < {n}; i++) {{",
+        f"{flags_name}[ops[i]] = group_flags[i];",
+        "}",
+        "}",
+    ])
+
+
+def _write_single_tests(
+    writer: helpers.CodeWriter,
+    encoding: representations.OperatorEncoding,
+    group: PreconditionGroup,
+    start: int,
+    flags_name: str,
+):
+    for op in group.operators:
+        tests = " & ".join(
+            f"((state_bitrep[{word}] & {bin(mask)}) == {bin(encoding.pre_val[op, word])})"
+            for word, mask in zip(group.words, group.masks)
+        )
+        writer.write(f"{flags_name}[{op - start}] = {tests};\n")
+
+
+def write_applicability_flags(
+    writer: helpers.CodeWriter,
+    encoding: representations.OperatorEncoding,
+    start: int,
+    stop: int,
+    flags_name: str,
+):
+    """
+    Writes code that sets the flags declared by make_flags_declaration.
+    """
+    groups = group_operators(encoding, start, stop)
+    # the contiguous groups are written in operator order first, so that the flags overwritten by their padding
+    # are all written again afterwards
+    for group in groups:
+        if len(group.operators) >= MIN_BULK_GROUP_SIZE and group.is_contiguous:
+            _write_bulk_group(writer, encoding, group, start, flags_name)
+    for group in groups:
+        if len(group.operators) >= MIN_BULK_GROUP_SIZE and not group.is_contiguous:
+            _write_bulk_group(writer, encoding, group, start, flags_name)
+    for group in groups:
+        if len(group.operators) < MIN_BULK_GROUP_SIZE:
+            _write_single_tests(writer, encoding, group, start, flags_name)
+    # the operators without preconditions are always applicable, the flags after the last operator are never set
+    for op in np.flatnonzero(~encoding.pre_mask[start:stop].any(axis=1)).tolist():
+        writer.write(f"{flags_name}[{op}] = 1;\n")
+    n_flags = get_bitset_length(start, stop) * 64
+    if stop - start < n_flags:
+        writer.write(f"for (int i = {stop - start}; i < {n_flags}; i++) {{ {flags_name}[i] = 0; }}\n")
+
+
+def make_bitset_loop_header(start: int, stop: int, flags_name: str, index_name: str) -> str:
+    """
+    Packs the flags into the words of the bitset and opens a loop over the set bits in increasing order,
+    index_name is the operator of the current bit.
+    """
+    return (
+        f"for (int word = 0; word < {get_bitset_length(start, stop)}; word++) {{\n"
+        "uint64_t bits = 0;\n"
+        "for (int byte = 0; byte < 8; byte++) {\n"
+        "uint64_t flags;\n"
+        f"memcpy(&flags, {flags_name} + word * 64 + byte * 8, sizeof(flags));\n"
+        f"bits |= ((flags * {PACK_BYTES_MAGIC}) >> 56) << (byte * 8);\n"
+        "}\n"
+        "for (; bits != 0; bits &= bits - 1) {\n"
+        f"int {index_name} = {start} + word * 64 + __builtin_ctzll(bits);\n"
+    )
+
+
+BITSET_LOOP_FOOTER = "}\n}\n"
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+Compares the end-to-end time per task of the two planner modes:
+
+- compiled: generate the sources, compile them and search,
+- table: write the task file and search with the precompiled table-driven planner.
+
+The table-driven planner is built once before the tasks and its build time is reported separately. Both modes
+run greedy best-first search and must find the same plan.
+
+Usage: python -m generate.benchmark sas-files/*.sas
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import dataclass, field
+from typing import Optional
+
+from generate import constants
+
+
+@dataclass
+class SearchResult:
+    solved: bool
+    plan: list[int]
+    # the statistics printed by the planner, e.g. "time elapsed", not part of the comparison of the plans
+    stats: dict[str, float] = field(default_factory=dict, compare=False)
+
+
+@dataclass
+class ModeResult:
+    generate_time: float
+    compile_time: float
+    search_time: float
+    search: Optional[SearchResult]
+
+    @property
+    def total_time(self) -> float:
+        return self.generate_time + self.compile_time + self.search_time
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Compare compile+search time of the compiled and table modes.")
+    parser.add_argument("sas_files", nargs="+")
+    parser.add_argument("--make-jobs", type=int, default=os.cpu_count() or 1, help="parallel jobs of make")
+    parser.add_argument("--shards", type=int, default=1, help="shards of the generated sources")
+    parser.add_argument("--timeout", type=float, default=1200, help="timeout of each search in seconds")
+    parser.add_argument(
+        "--open-list",
+        choices=["heap", "bucket-fifo", "bucket-lifo"],
+        default="heap",
+        help="open list of the search in both modes (default: heap)",
+    )
+    parser.add_argument(
+        "--h",
+        choices=["ff", "add", "max", "goal-count"],
+        default="ff",
+        help="heuristic of the search in both modes (default: ff)",
+    )
+    return parser.parse_args()
+
+
+def timed_run(command: list[str], timeout: Optional[float] = None) -> tuple[float, subprocess.CompletedProcess]:
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [os.path.dirname(constants.FILE_DIR), env.get("PYTHONPATH")]))
+    start = time.perf_counter()
+    result = subprocess.run(command, capture_output=True, text=True, env=env, timeout=timeout, check=False)
+    return time.perf_counter() - start, result
+
+
+def checked_run(command: list[str]) -> float:
+    elapsed, result = timed_run(command)
+    if result.returncode != 0:
+        raise RuntimeError(f"{' '.join(command)} failed:\n{result.stdout}{result.stderr}")
+    return elapsed
+
+
+def parse_planner_output(output: str) -> SearchResult:
+    lines = output.splitlines()
+    solved = len(lines) > 0 and lines[0] == "Success."
+    # the benchmark lines all contain a colon, the plan is printed as one operator id per line
+    plan = [int(line) for line in lines if line.strip().isdigit()] if solved else []
+    stats = {}
+    for line in lines:
+        name, _, value = line.partition(": ")
+        try:
+            stats[name] = float(value)
+        except ValueError:
+            continue
+    return SearchResult(solved, plan, stats)
+
+
+def _search(command: list[str], timeout: float) -> tuple[float, Optional[SearchResult]]:
+    try:
+        elapsed, result = timed_run(command, timeout)
+    except subprocess.TimeoutExpired:
+        return timeout, None
+    return elapsed, parse_planner_output(result.stdout) if result.returncode == 0 else None
+
+
+def make_planner(work_dir: str, mode: str, jobs: int) -> tuple[float, str]:
+    binary = os.path.join(work_dir, f"planner-{mode}")
+    build_dir = os.path.join(work_dir, "build", mode)
+    elapsed = checked_run([
+        "make", "-s", "-C", constants.C_SRC_CODE_DIR, f"-j{jobs}",
+        f"MODE={mode}", f"BIN={binary}", f"BUILD_DIR={build_dir}",
+    ])
+    return elapsed, binary
+
+
+def run_compiled(sas_file: str, work_dir: str, args) -> ModeResult:
+    # config.h differs between tasks, so the core sources are recompiled for every task as well
+    generate_time = checked_run(
+        [sys.executable, "-m", "generate.app", sas_file, "--shards", str(args.shards), "--no-cache"]
+    )
+    compile_time, binary = make_planner(work_dir, "generated", args.make_jobs)
+    search_time, search = _search([binary, "gbfs", "--open-list", args.open_list, "--h", args.h], args.timeout)
+    return ModeResult(generate_time, compile_time, search_time, search)
+
+
+def run_table(sas_file: str, table_binary: str, work_dir: str, args) -> ModeResult:
+    task_file = os.path.join(work_dir, "task.bin")
+    generate_time = checked_run(
+        [sys.executable, "-m", "generate.app", sas_file, "--mode", "table", "--task-file", task_file, "--no-cache"]
+    )
+    search_time, search = _search(
+        [table_binary, "gbfs", "--task", task_file, "--open-list", args.open_list, "--h", args.h], args.timeout
+    )
+    return ModeResult(generate_time, 0.0, search_time, search)
+
+
+def _describe(result: ModeResult) -> str:
+    if result.search is None:
+        status = "failed"
+    else:
+        status = f"plan {len(result.search.plan)}" if result.search.solved else "unsolved"
+    return (f"gen {result.generate_time:7.2f}s  compile {result.compile_time:7.2f}s  "
+            f"search {result.search_time:7.2f}s  total {result.total_time:7.2f}s  ({status})")
+
+
+def main():
+    args = parse_args()
+    n_mismatches = 0
+    with tempfile.TemporaryDirectory() as work_dir:
+        build_time, table_binary = make_planner(work_dir, "table", args.make_jobs)
+        print(f"table-driven planner built once in {build_time:.2f}s")
+        total_compiled = total_table = 0.0
+        for sas_file in args.sas_files:
+            compiled = run_compiled(sas_file, work_dir, args)
+            table = run_table(sas_file, table_binary, work_dir, args)
+            # a failed or timed out search counts as a mismatch only if the other mode succeeded
+            same_plan = compiled.search == table.search
+            n_mismatches += not same_plan
+            total_compiled += compiled.total_time
+            total_table += table.total_time
+            print(f"{os.path.basename(sas_file)}{'' if same_plan else '  PLAN MISMATCH'}")
+            print(f"    compiled: {_describe(compiled)}")
+            print(f"    table:    {_describe(table)}")
+        print(f"total compiled: {total_compiled:.2f}s, table: {total_table:.2f}s (+ {build_time:.2f}s build)")
+    return 1 if n_mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
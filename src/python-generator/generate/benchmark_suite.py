@@ -0,0 +1,305 @@
+#!/usr/bin/env python3
+"""
+End-to-end benchmark of a set of tasks, with a comparison against a baseline.
+
+For every task, the suite generates the code (or the task file with --mode table), builds the planner and runs the
+search, and records:
+
+- parse_time, generation_time: the times printed by generate.app,
+- code_size: bytes of the generated sources, or of the task file,
+- compile_time: the time of make, 0 in table mode where the planner is built once before the tasks,
+- search_time, expansions_per_second: the time elapsed and the states expanded per second printed by the planner,
+- peak_rss_mb: the peak resident memory of the planner process.
+
+The results are written with --json and --csv. With --baseline, every metric is compared with the result of the
+same task in a JSON file written before, e.g. on the previous commit, and a metric that is worse by more than
+--threshold (relative) is reported as a regression. A task that is not in the baseline, or that was solved there and
+is not solved now, can not be compared and is reported as a problem. The exit status is 1 if there is a regression or
+a problem, 0 otherwise. Times below --min-time are too noisy to compare, these metrics and the expansions per second
+of such searches are skipped.
+
+Usage:
+    python -m generate.benchmark_suite sas-files/gripper-p05.sas sas-files/depot-p01.sas --json base.json
+    python -m generate.benchmark_suite sas-files/gripper-p05.sas sas-files/depot-p01.sas --baseline base.json
+"""
+import argparse
+import csv
+import dataclasses
+import json
+import os
+import shlex
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+from generate import benchmark, constants
+
+# the metrics compared with the baseline, and whether a larger value is better
+METRICS = {
+    "parse_time": False,
+    "generation_time": False,
+    "code_size": False,
+    "compile_time": False,
+    "search_time": False,
+    "expansions_per_second": True,
+    "peak_rss_mb": False,
+}
+# the time each metric is measured over, a metric is not compared if the time is below --min-time
+MEASURED_TIMES = {
+    "parse_time": "parse_time",
+    "generation_time": "generation_time",
+    "compile_time": "compile_time",
+    "search_time": "search_time",
+    "expansions_per_second": "search_time",
+}
+
+
+@dataclass
+class TaskMetrics:
+    task: str
+    solved: bool
+    plan_length: int
+    parse_time: float
+    generation_time: float
+    code_size: int
+    compile_time: float
+    search_time: float
+    expansions_per_second: float
+    peak_rss_mb: float
+
+
+@dataclass
+class Regression:
+    task: str
+    metric: str
+    baseline: float
+    value: float
+
+    @property
+    def change(self) -> float:
+        return self.value / self.baseline - 1 if self.baseline else float("inf")
+
+    def __str__(self) -> str:
+        return f"{self.task}: {self.metric} {self.baseline:.4g} -> {self.value:.4g} ({self.change:+.1%})"
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark the generator and planner on a set of tasks.")
+    parser.add_argument("sas_files", nargs="+")
+    parser.add_argument(
+        "--mode",
+        choices=["compiled", "table"],
+        default="compiled",
+        help="compiled: generate, compile and search every task (default), table: write the task file and search "
+             "with the table-driven planner",
+    )
+    parser.add_argument("--repeats", type=int, default=1, help="searches per task, the median is kept (default: 1)")
+    parser.add_argument("--timeout", type=float, default=1200, help="timeout of each search in seconds")
+    parser.add_argument("--make-jobs", type=int, default=os.cpu_count() or 1, help="parallel jobs of make")
+    parser.add_argument("--json", help="write the results to this JSON file, which can be used as a baseline")
+    parser.add_argument("--csv", help="write the results to this CSV file")
+    parser.add_argument("--baseline", help="JSON file of a previous run to compare with")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.1,
+        help="relative change of a metric that counts as a regression (default: 0.1)",
+    )
+    parser.add_argument(
+        "--min-time",
+        type=float,
+        default=0.05,
+        help="times in seconds below which a metric is not compared (default: 0.05)",
+    )
+    parser.add_argument(
+        "--generator-args",
+        type=shlex.split,
+        default=[],
+        help='arguments of generate.app, e.g. --generator-args="--layout sequential"',
+    )
+    return parser.parse_args()
+
+
+def run_with_rusage(command: list[str], timeout: float) -> tuple[Optional[str], float]:
+    """
+    Runs the command and returns its output, None if it failed or timed out, and its peak resident memory in MB.
+    """
+    with tempfile.TemporaryFile("w+") as output:
+        process = subprocess.Popen(command, stdout=output, stderr=subprocess.DEVNULL)
+        timer = threading.Timer(timeout, process.kill)
+        timer.start()
+        try:
+            # wait4 reports the resources of this child alone, unlike getrusage(RUSAGE_CHILDREN)
+            _, status, rusage = os.wait4(process.pid, 0)
+        finally:
+            timer.cancel()
+        process.returncode = os.waitstatus_to_exitcode(status)
+        output.seek(0)
+        # ru_maxrss is in kilobytes on Linux
+        return (output.read() if process.returncode == 0 else None), rusage.ru_maxrss / 1024
+
+
+def parse_generator_times(output: str) -> tuple[float, float]:
+    times = {}
+    for line in output.splitlines():
+        name, _, value = line.partition(": ")
+        if name in ("Parse time", "Generation time"):
+            times[name] = float(value.rstrip("s"))
+    return times.get("Parse time", 0.0), times.get("Generation time", 0.0)
+
+
+def get_code_size(paths: list[str]) -> int:
+    return sum(os.path.getsize(path) for path in paths if os.path.isfile(path))
+
+
+def generate(sas_file: str, work_dir: str, args) -> tuple[float, float, int]:
+    """
+    Parse time, generation time and size of the generated code of the task.
+    """
+    command = [sys.executable, "-m", "generate.app", sas_file, "--no-cache", "--mode", args.mode]
+    task_file = os.path.join(work_dir, "task.bin")
+    if args.mode == "table":
+        command += ["--task-file", task_file]
+    _, result = benchmark.timed_run(command + args.generator_args)
+    if result.returncode != 0:
+        raise RuntimeError(f"{' '.join(command)} failed:\n{result.stdout}{result.stderr}")
+    parse_time, generation_time = parse_generator_times(result.stdout)
+    if args.mode == "table":
+        return parse_time, generation_time, get_code_size([task_file])
+    generated_dir = constants.C_GENERATED_CODE_DIR
+    paths = [os.path.join(generated_dir, name) for name in os.listdir(generated_dir)]
+    return parse_time, generation_time, get_code_size(paths)
+
+
+def run_task(sas_file: str, work_dir: str, table_binary: Optional[str], args) -> TaskMetrics:
+    parse_time, generation_time, code_size = generate(sas_file, work_dir, args)
+    if args.mode == "table":
+        compile_time = 0.0
+        command = [table_binary, "gbfs", "--task", os.path.join(work_dir, "task.bin")]
+    else:
+        compile_time, binary = benchmark.make_planner(work_dir, "generated", args.make_jobs)
+        command = [binary, "gbfs"]
+
+    searches = []
+    for _ in range(args.repeats):
+        output, peak_rss_mb = run_with_rusage(command, args.timeout)
+        search = benchmark.parse_planner_output(output) if output is not None else None
+        searches.append((search, peak_rss_mb))
+    solved = all(search is not None and search.solved for search, _ in searches)
+    search = searches[0][0]
+
+    def median_stat(name: str) -> float:
+        values = [result.stats.get(name, 0.0) for result, _ in searches if result is not None]
+        return statistics.median(values) if values else 0.0
+
+    return TaskMetrics(
+        task=os.path.basename(sas_file),
+        solved=solved,
+        plan_length=len(search.plan) if solved else 0,
+        parse_time=parse_time,
+        generation_time=generation_time,
+        code_size=code_size,
+        compile_time=compile_time,
+        search_time=median_stat("time elapsed"),
+        expansions_per_second=median_stat("number of states expanded per second"),
+        peak_rss_mb=statistics.median(peak_rss_mb for _, peak_rss_mb in searches),
+    )
+
+
+def write_json(filename: str, results: list[TaskMetrics], args):
+    data = {
+        "mode": args.mode,
+        "generator_args": args.generator_args,
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "results": [dataclasses.asdict(result) for result in results],
+    }
+    with open(filename, "w") as file:
+        json.dump(data, file, indent=2)
+
+
+def write_csv(filename: str, results: list[TaskMetrics]):
+    with open(filename, "w", newline="") as file:
+        writer = csv.DictWriter(file, fieldnames=[f.name for f in dataclasses.fields(TaskMetrics)])
+        writer.writeheader()
+        for result in results:
+            writer.writerow(dataclasses.asdict(result))
+
+
+def read_baseline(filename: str) -> dict[str, dict]:
+    with open(filename) as file:
+        return {result["task"]: result for result in json.load(file)["results"]}
+
+
+def compare(
+    results: list[TaskMetrics], baseline: dict[str, dict], threshold: float, min_time: float
+) -> tuple[list[Regression], list[str]]:
+    """
+    The metrics that are worse than in the baseline by more than the threshold, and the problems that prevent a
+    comparison: tasks missing from the baseline, or solved there and not here.
+    """
+    regressions = []
+    problems = []
+    for result in results:
+        base = baseline.get(result.task)
+        if base is None:
+            problems.append(f"{result.task}: not in the baseline")
+            continue
+        if base["solved"] and not result.solved:
+            problems.append(f"{result.task}: solved in the baseline, not solved now")
+            continue
+        for metric, larger_is_better in METRICS.items():
+            time_metric = MEASURED_TIMES.get(metric)
+            if time_metric and max(float(base[time_metric]), getattr(result, time_metric)) < min_time:
+                continue
+            old, new = float(base[metric]), float(getattr(result, metric))
+            worse = old > new * (1 + threshold) if larger_is_better else new > old * (1 + threshold)
+            if worse:
+                regressions.append(Regression(result.task, metric, old, new))
+    return regressions, problems
+
+
+def _describe(result: TaskMetrics) -> str:
+    status = f"plan {result.plan_length}" if result.solved else "unsolved"
+    return (f"parse {result.parse_time:6.2f}s  gen {result.generation_time:6.2f}s"
+            f"  code {result.code_size / 1024:8.0f}KB  compile {result.compile_time:6.2f}s"
+            f"  search {result.search_time:7.3f}s  {result.expansions_per_second:10.0f} exp/s"
+            f"  {result.peak_rss_mb:7.1f}MB  ({status})")
+
+
+def main():
+    args = parse_args()
+    baseline = read_baseline(args.baseline) if args.baseline else None
+    results = []
+    with tempfile.TemporaryDirectory() as work_dir:
+        table_binary = None
+        if args.mode == "table":
+            build_time, table_binary = benchmark.make_planner(work_dir, "table", args.make_jobs)
+            print(f"table-driven planner built once in {build_time:.2f}s")
+        for sas_file in args.sas_files:
+            result = run_task(sas_file, work_dir, table_binary, args)
+            results.append(result)
+            print(f"{result.task}\n    {_describe(result)}")
+
+    if args.json:
+        write_json(args.json, results, args)
+    if args.csv:
+        write_csv(args.csv, results)
+    if baseline is None:
+        return 0
+    regressions, problems = compare(results, baseline, args.threshold, args.min_time)
+    for problem in problems:
+        print(f"PROBLEM {problem}")
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    print(f"{len(regressions)} regressions over {args.threshold:.0%} and {len(problems)} problems"
+          f" against {args.baseline}")
+    return 1 if regressions or problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
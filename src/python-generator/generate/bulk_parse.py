@@ -0,0 +1,394 @@
+#!/usr/bin/env python3
+import logging
+import re
+import sys
+import warnings
+
+import numpy as np
+
+from generate import columnar, helpers, parse
+from generate.columnar import csr_positions, lengths_to_offsets
+
+# operator names and the magic words around operators and axioms are the only
+# non-numeric tokens after the goal section, so they are cut out before the bulk tokenization
+_OPERATOR_NAME_RE = re.compile(r"^begin_operator[ \t\r]*\n([^\n]*)\n", re.MULTILINE)
+_GOAL_END_RE = re.compile(r"^end_goal[ \t\r]*$", re.MULTILINE)
+_NON_NUMERIC_RE = re.compile(r"^begin_operator[ \t\r]*\n[^\n]*\n|end_operator|begin_rule|end_rule", re.MULTILINE)
+
+
+class _LineCursor:
+    """
+    Iterates over the stripped lines of the file like helpers.get_lines, but keeps track of
+    the position so that sections can be sliced out and tokenized in bulk.
+    """
+
+    def __init__(self, lines: list[str]):
+        self.lines = lines
+        self.pos = 0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> str:
+        if self.pos >= len(self.lines):
+            raise StopIteration
+        line = self.lines[self.pos].strip()
+        self.pos += 1
+        return line
+
+    def take_numbers(self, n_lines: int) -> np.ndarray:
+        numbers = to_int_array(" ".join(self.lines[self.pos:self.pos + n_lines]))
+        self.pos += n_lines
+        return numbers
+
+
+def to_int_array(text: str) -> np.ndarray:
+    try:
+        # older NumPy versions only warn about unparsable tokens instead of raising
+        with warnings.catch_warnings():
+            warnings.simplefilter("error", DeprecationWarning)
+            return np.fromstring(text, dtype=np.int64, sep=" ")
+    except (ValueError, DeprecationWarning):
+        logging.error("Expected only numbers in section, got: %s", text[:80])
+        sys.exit("Search input error")
+
+
+def check_fact_arrays(fact_vars: np.ndarray, fact_vals: np.ndarray, domain_sizes: np.ndarray):
+    """
+    Vectorized version of parse.check_facts.
+    """
+    bad_var = (fact_vars < 0) | (fact_vars >= len(domain_sizes))
+    if bad_var.any():
+        logging.error("Invalid variable id: %s", fact_vars[bad_var][0])
+        sys.exit("Search input error")
+    bad_val = (fact_vals < 0) | (fact_vals >= domain_sizes[fact_vars])
+    if bad_val.any():
+        logging.error("Invalid value of variable: %s: %s", fact_vars[bad_val][0], fact_vals[bad_val][0])
+        sys.exit("Search input error")
+
+
+class _ActionTables:
+    """
+    Operators or axioms read from the number stream, with the same fact order as parse.ExplicitOperator:
+    the prevail conditions come first in the preconditions, followed by the effect preconditions != -1.
+    """
+    names: list[str]
+    costs: np.ndarray
+    pre_offsets: np.ndarray
+    pre_vars: np.ndarray
+    pre_vals: np.ndarray
+    eff_offsets: np.ndarray
+    eff_vars: np.ndarray
+    eff_vals: np.ndarray
+    eff_cond_offsets: np.ndarray
+    eff_cond_vars: np.ndarray
+    eff_cond_vals: np.ndarray
+
+    def __init__(self, numbers: np.ndarray, stream: list[int], pos: int, count: int, is_axiom: bool, use_metric: bool):
+        prevail_pos = np.zeros(count, dtype=np.int64)
+        prevail_len = np.zeros(count, dtype=np.int64)
+        effect_len = np.zeros(count, dtype=np.int64)
+        costs = np.zeros(count, dtype=np.int64)
+        # position of the condition count of every effect in the stream
+        effect_pos: list[int] = []
+        for op_id in range(count):
+            if not is_axiom:
+                n_prevail = stream[pos]
+                prevail_pos[op_id] = pos + 1
+                prevail_len[op_id] = n_prevail
+                pos += 1 + 2 * n_prevail
+                n_effects = stream[pos]
+                pos += 1
+            else:
+                n_effects = 1
+            effect_len[op_id] = n_effects
+            if not any(stream[pos:pos + 4 * n_effects:4]):
+                # fast path: no effect conditions, every effect is "0 var pre post"
+                effect_pos.extend(range(pos, pos + 4 * n_effects, 4))
+                pos += 4 * n_effects
+            else:
+                for _ in range(n_effects):
+                    effect_pos.append(pos)
+                    pos += 1 + 2 * stream[pos] + 3
+            if not is_axiom:
+                costs[op_id] = stream[pos] if use_metric else 1
+                pos += 1
+        self.end_pos = pos
+        if (costs < 0).any():
+            logging.error("Negative operator cost")
+            sys.exit("Search input error")
+        self.costs = costs
+
+        eff_pos = np.array(effect_pos, dtype=np.int64)
+        n_conds = numbers[eff_pos]
+        fact_pos = eff_pos + 1 + 2 * n_conds
+        self.eff_offsets = lengths_to_offsets(effect_len)
+        self.eff_vars = numbers[fact_pos]
+        self.eff_vals = numbers[fact_pos + 2]
+        eff_pres = numbers[fact_pos + 1]
+
+        cond_pos = csr_positions(eff_pos + 1, 2 * n_conds)
+        self.eff_cond_offsets = lengths_to_offsets(n_conds)
+        self.eff_cond_vars = numbers[cond_pos[0::2]]
+        self.eff_cond_vals = numbers[cond_pos[1::2]]
+
+        prevail_fact_pos = csr_positions(prevail_pos, 2 * prevail_len)
+        eff_op_ids = np.repeat(np.arange(count), effect_len)
+        has_pre = eff_pres != -1
+        pre_op_ids = np.concatenate([np.repeat(np.arange(count), prevail_len), eff_op_ids[has_pre]])
+        pre_vars = np.concatenate([numbers[prevail_fact_pos[0::2]], self.eff_vars[has_pre]])
+        pre_vals = np.concatenate([numbers[prevail_fact_pos[1::2]], eff_pres[has_pre]])
+        # stable sort keeps the prevail conditions in front of the effect preconditions
+        order = np.argsort(pre_op_ids, kind="stable")
+        self.pre_offsets = lengths_to_offsets(np.bincount(pre_op_ids, minlength=count))
+        self.pre_vars = pre_vars[order]
+        self.pre_vals = pre_vals[order]
+
+    def check(self, domain_sizes: np.ndarray):
+        check_fact_arrays(self.pre_vars, self.pre_vals, domain_sizes)
+        check_fact_arrays(self.eff_vars, self.eff_vals, domain_sizes)
+        check_fact_arrays(self.eff_cond_vars, self.eff_cond_vals, domain_sizes)
+
+
+class BulkRootTask:
+    """
+    Drop-in replacement for parse.RootTask that reads the file in one go and keeps the mutex groups,
+    operators and axioms in NumPy tables instead of FactPair objects.
+    """
+    variables: list[parse.ExplicitVariable]
+    use_metrics: bool
+    domain_sizes: np.ndarray
+    fact_offsets: np.ndarray
+    initial_state: np.ndarray
+    goal_vars: np.ndarray
+    goal_vals: np.ndarray
+    mutex_offsets: np.ndarray
+    mutex_vars: np.ndarray
+    mutex_vals: np.ndarray
+    operators: _ActionTables
+    axioms: _ActionTables
+
+    def __init__(self, filename: str):
+        with open(filename) as file:
+            text = file.read()
+        # only the sections up to the goal are split into lines, the rest is tokenized in bulk
+        goal_end = _GOAL_END_RE.search(text)
+        if goal_end is None:
+            logging.error("Missing end_goal")
+            sys.exit("Search input error")
+        cursor = _LineCursor(text[:goal_end.end()].split("\n"))
+        parse.read_and_verify_version(cursor)
+        self.use_metrics = parse.read_metric(cursor)
+        self.variables = parse.read_variables(cursor)
+        self.domain_sizes = np.array([var.domain_size for var in self.variables], dtype=np.int64)
+        self.fact_offsets = lengths_to_offsets(self.domain_sizes)
+        self._read_mutexes(cursor)
+
+        num_variables = len(self.variables)
+        helpers.check_magic(next(cursor), "begin_state")
+        self.initial_state = cursor.take_numbers(num_variables)
+        helpers.check_magic(next(cursor), "end_state")
+        for i in range(num_variables):
+            self.variables[i].axiom_default_value = int(self.initial_state[i])
+
+        helpers.check_magic(next(cursor), "begin_goal")
+        num_goals = int(next(cursor))
+        goals = cursor.take_numbers(num_goals)
+        helpers.check_magic(next(cursor), "end_goal")
+        if num_goals == 0:
+            logging.error("No goal")
+            sys.exit("Search input error")
+        self.goal_vars = goals[0::2]
+        self.goal_vals = goals[1::2]
+        check_fact_arrays(self.goal_vars, self.goal_vals, self.domain_sizes)
+
+        self._read_actions(text[goal_end.end():])
+
+    def _read_mutexes(self, cursor: _LineCursor):
+        num_groups = int(next(cursor))
+        group_sizes = np.zeros(num_groups, dtype=np.int64)
+        facts = []
+        for group_id in range(num_groups):
+            helpers.check_magic(next(cursor), "begin_mutex_group")
+            group_sizes[group_id] = int(next(cursor))
+            facts.append(cursor.take_numbers(group_sizes[group_id]))
+            helpers.check_magic(next(cursor), "end_mutex_group")
+        facts_arr = np.concatenate(facts) if facts else np.zeros(0, dtype=np.int64)
+        self.mutex_offsets = lengths_to_offsets(group_sizes)
+        self.mutex_vars = facts_arr[0::2]
+        self.mutex_vals = facts_arr[1::2]
+        check_fact_arrays(self.mutex_vars, self.mutex_vals, self.domain_sizes)
+
+        # index from fact id to the groups it belongs to
+        self._fact_group_offsets, self._fact_groups = columnar.group_by(
+            self.fact_offsets[self.mutex_vars] + self.mutex_vals,
+            np.repeat(np.arange(num_groups), group_sizes),
+            int(self.fact_offsets[-1]),
+        )
+
+    def _read_actions(self, text: str):
+        names = [name.strip() for name in _OPERATOR_NAME_RE.findall(text)]
+        numbers = to_int_array(_NON_NUMERIC_RE.sub(" ", text))
+        # the walk over the variable-length records is faster on a list than on the array
+        stream = numbers.tolist()
+        if not stream:
+            logging.error("Missing operator section")
+            sys.exit("Search input error")
+
+        num_operators = stream[0]
+        if len(names) != num_operators or text.count("end_operator") != num_operators:
+            logging.error("Expected %s operators, found %s", num_operators, len(names))
+            sys.exit("Search input error")
+        self.operators = _ActionTables(numbers, stream, 1, num_operators, False, self.use_metrics)
+        self.operators.names = names
+        self.operators.check(self.domain_sizes)
+
+        pos = self.operators.end_pos
+        num_axioms = stream[pos]
+        if text.count("begin_rule") != num_axioms:
+            logging.error("Expected %s axioms, found %s", num_axioms, text.count("begin_rule"))
+            sys.exit("Search input error")
+        self.axioms = _ActionTables(numbers, stream, pos + 1, num_axioms, True, self.use_metrics)
+        self.axioms.names = ["<axiom>"] * num_axioms
+        self.axioms.check(self.domain_sizes)
+        if self.axioms.end_pos != len(stream):
+            logging.error("Unexpected trailing content after the axioms")
+            sys.exit("Search input error")
+
+    def get_columnar_task(self) -> columnar.ColumnarTask:
+        ops = self.operators
+        return columnar.ColumnarTask(
+            domain_sizes=self.domain_sizes,
+            initial_state=self.initial_state,
+            goal_vars=self.goal_vars,
+            goal_vals=self.goal_vals,
+            costs=ops.costs,
+            pre_offsets=ops.pre_offsets,
+            pre_vars=ops.pre_vars,
+            pre_vals=ops.pre_vals,
+            eff_offsets=ops.eff_offsets,
+            eff_vars=ops.eff_vars,
+            eff_vals=ops.eff_vals,
+            eff_cond_offsets=ops.eff_cond_offsets,
+            eff_cond_vars=ops.eff_cond_vars,
+            eff_cond_vals=ops.eff_cond_vals,
+            mutex_offsets=self.mutex_offsets,
+            mutex_vars=self.mutex_vars,
+            mutex_vals=self.mutex_vals,
+        )
+
+    def _get_tables(self, index: int, is_axiom: bool) -> _ActionTables:
+        tables = self.axioms if is_axiom else self.operators
+        assert 0 <= index < len(tables.costs)
+        return tables
+
+    def _get_effect_index(self, op_index: int, eff_index: int, is_axiom: bool) -> int:
+        tables = self._get_tables(op_index, is_axiom)
+        start = tables.eff_offsets[op_index]
+        assert 0 <= eff_index < tables.eff_offsets[op_index + 1] - start
+        return int(start + eff_index)
+
+    def _get_groups_of_fact(self, fact: parse.FactPair) -> np.ndarray:
+        fact_id = self.fact_offsets[fact.var] + fact.value
+        return self._fact_groups[self._fact_group_offsets[fact_id]:self._fact_group_offsets[fact_id + 1]]
+
+    def get_num_variables(self) -> int:
+        return len(self.variables)
+
+    def get_variable_name(self, var: int) -> str:
+        assert helpers.in_bounds(var, self.variables)
+        return self.variables[var].name
+
+    def get_variable_domain_size(self, var: int) -> int:
+        assert helpers.in_bounds(var, self.variables)
+        return self.variables[var].domain_size
+
+    def get_variable_axiom_layer(self, var: int) -> int:
+        assert helpers.in_bounds(var, self.variables)
+        return self.variables[var].axiom_layer
+
+    def get_variable_default_axiom_value(self, var: int) -> int:
+        assert helpers.in_bounds(var, self.variables)
+        return self.variables[var].axiom_default_value
+
+    def get_fact_name(self, fact: parse.FactPair) -> str:
+        assert helpers.in_bounds(fact.var, self.variables)
+        assert helpers.in_bounds(fact.value, self.variables[fact.var].fact_names)
+        return self.variables[fact.var].fact_names[fact.value]
+
+    def are_facts_mutex(self, fact1: parse.FactPair, fact2: parse.FactPair) -> bool:
+        if fact1.var == fact2.var:
+            # Same variable: mutex iff different value.
+            return fact1.value != fact2.value
+        groups1 = self._get_groups_of_fact(fact1)
+        groups2 = self._get_groups_of_fact(fact2)
+        return bool(np.intersect1d(groups1, groups2).size)
+
+    def get_operator_mutexes(self, op_index: int) -> list[parse.FactPair]:
+        """
+        Facts of other variables that share a mutex group with one of the effects of the operator.
+        """
+        mutexes: dict[tuple[int, int], parse.FactPair] = {}
+        for eff_index in range(self.get_num_operator_effects(op_index, False)):
+            effect = self.get_operator_effect(op_index, eff_index, False)
+            for group in self._get_groups_of_fact(effect):
+                start, end = self.mutex_offsets[group], self.mutex_offsets[group + 1]
+                for var, value in zip(self.mutex_vars[start:end].tolist(), self.mutex_vals[start:end].tolist()):
+                    if var != effect.var and (var, value) not in mutexes:
+                        mutexes[(var, value)] = parse.FactPair(var, value)
+        return list(mutexes.values())
+
+    def get_operator_cost(self, index: int, is_axiom: bool) -> int:
+        return int(self._get_tables(index, is_axiom).costs[index])
+
+    def get_operator_name(self, index: int, is_axiom: bool) -> str:
+        return self._get_tables(index, is_axiom).names[index]
+
+    def get_num_operators(self) -> int:
+        return len(self.operators.costs)
+
+    def get_num_operator_preconditions(self, index: int, is_axiom: bool) -> int:
+        tables = self._get_tables(index, is_axiom)
+        return int(tables.pre_offsets[index + 1] - tables.pre_offsets[index])
+
+    def get_operator_precondition(self, op_index: int, fact_index: int, is_axiom: bool) -> parse.FactPair:
+        tables = self._get_tables(op_index, is_axiom)
+        assert 0 <= fact_index < tables.pre_offsets[op_index + 1] - tables.pre_offsets[op_index]
+        i = tables.pre_offsets[op_index] + fact_index
+        return parse.FactPair(int(tables.pre_vars[i]), int(tables.pre_vals[i]))
+
+    def get_num_operator_effects(self, op_index: int, is_axiom: bool) -> int:
+        tables = self._get_tables(op_index, is_axiom)
+        return int(tables.eff_offsets[op_index + 1] - tables.eff_offsets[op_index])
+
+    def get_num_operator_effect_conditions(self, op_index: int, eff_index: int, is_axiom: bool) -> int:
+        tables = self._get_tables(op_index, is_axiom)
+        i = self._get_effect_index(op_index, eff_index, is_axiom)
+        return int(tables.eff_cond_offsets[i + 1] - tables.eff_cond_offsets[i])
+
+    def get_operator_effect_condition(
+        self, op_index: int, eff_index: int, cond_index: int, is_axiom: bool
+    ) -> parse.FactPair:
+        tables = self._get_tables(op_index, is_axiom)
+        i = self._get_effect_index(op_index, eff_index, is_axiom)
+        assert 0 <= cond_index < tables.eff_cond_offsets[i + 1] - tables.eff_cond_offsets[i]
+        j = tables.eff_cond_offsets[i] + cond_index
+        return parse.FactPair(int(tables.eff_cond_vars[j]), int(tables.eff_cond_vals[j]))
+
+    def get_operator_effect(self, op_index: int, eff_index: int, is_axiom: bool) -> parse.FactPair:
+        tables = self._get_tables(op_index, is_axiom)
+        i = self._get_effect_index(op_index, eff_index, is_axiom)
+        return parse.FactPair(int(tables.eff_vars[i]), int(tables.eff_vals[i]))
+
+    def get_num_axioms(self) -> int:
+        return len(self.axioms.costs)
+
+    def get_num_goals(self) -> int:
+        return len(self.goal_vars)
+
+    def get_goal_fact(self, index: int) -> parse.FactPair:
+        assert 0 <= index < len(self.goal_vars)
+        return parse.FactPair(int(self.goal_vars[index]), int(self.goal_vals[index]))
+
+    def get_initial_state_values(self) -> list[int]:
+        return self.initial_state.tolist()
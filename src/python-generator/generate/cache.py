@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Content-addressed cache of the generator output.
+
+An entry is keyed on the hash of the sas file, the generator version and the options that change the output.
+It holds the generated sources (or the task file of the table mode) and optionally the planner binary compiled
+from them, which is additionally keyed on the planner's own sources and the compiler settings. Entries are
+evicted in least recently used order once the cache is larger than its size limit.
+"""
+import filecmp
+import glob
+import hashlib
+import os
+import shutil
+import tempfile
+from typing import Optional
+
+from generate import constants
+
+# bump when the generated output changes in a way that the hash of the generator sources does not capture
+GENERATOR_VERSION = 1
+
+DEFAULT_CACHE_DIR = os.path.join(
+    os.environ.get("XDG_CACHE_HOME", os.path.join(os.path.expanduser("~"), ".cache")), "planner-generate"
+)
+DEFAULT_MAX_SIZE_MB = 2048
+
+_BINARY_PREFIX = "planner-"
+
+
+def _hash_files(hasher, paths: list[str]):
+    for path in sorted(paths):
+        hasher.update(os.path.relpath(path, constants.C_SRC_CODE_DIR).encode())
+        with open(path, "rb") as file:
+            for block in iter(lambda: file.read(1 << 20), b""):
+                hasher.update(block)
+
+
+def get_generator_hash() -> str:
+    hasher = hashlib.sha256(f"generator {GENERATOR_VERSION}".encode())
+    _hash_files(hasher, glob.glob(os.path.join(constants.FILE_DIR, "*.py")))
+    return hasher.hexdigest()
+
+
+def get_build_key() -> str:
+    """
+    Identifies the planner sources that are not generated and the compiler settings.
+    """
+    hasher = hashlib.sha256()
+    planner_dir = constants.C_SRC_CODE_DIR
+    paths = [os.path.join(planner_dir, "Makefile")]
+    for pattern in ("*.cpp", "*.h", os.path.join("xxHash", "*.[ch]")):
+        paths += glob.glob(os.path.join(planner_dir, pattern))
+    _hash_files(hasher, paths)
+    for variable in ("CXX", "CC", "CXXFLAGS", "CFLAGS", "CPPFLAGS"):
+        hasher.update(f"{variable}={os.environ.get(variable, '')}".encode())
+    return hasher.hexdigest()[:32]
+
+
+def copy_if_changed(src: str, dst: str) -> bool:
+    """
+    Copies src to dst unless dst already has the same content, so that make does not rebuild it.
+    The copy gets a new modification time: a restored source must look newer than objects built from other files.
+    """
+    if os.path.exists(dst) and filecmp.cmp(src, dst, shallow=False):
+        return False
+    shutil.copyfile(src, dst)
+    return True
+
+
+class GenerationCache:
+    def __init__(self, cache_dir: str, max_size: int):
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def make_key(self, sas_file: str, options: dict[str, object]) -> str:
+        hasher = hashlib.sha256()
+        with open(sas_file, "rb") as file:
+            for block in iter(lambda: file.read(1 << 20), b""):
+                hasher.update(block)
+        hasher.update(get_generator_hash().encode())
+        for name, value in sorted(options.items()):
+            hasher.update(f"{name}={value}".encode())
+        return hasher.hexdigest()
+
+    def _entry_dir(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key)
+
+    def lookup(self, key: str) -> Optional[str]:
+        entry_dir = self._entry_dir(key)
+        if not os.path.isdir(entry_dir):
+            return None
+        # the modification time of the entry is its last use
+        os.utime(entry_dir)
+        return entry_dir
+
+    def store(self, key: str, paths: list[str]) -> str:
+        """
+        Stores copies of the files under their base names. If another process stored the entry first, that entry
+        is kept.
+        """
+        entry_dir = self._entry_dir(key)
+        tmp_dir = tempfile.mkdtemp(dir=self.cache_dir, prefix=".tmp-")
+        try:
+            for path in paths:
+                shutil.copyfile(path, os.path.join(tmp_dir, os.path.basename(path)))
+            os.rename(tmp_dir, entry_dir)
+        except OSError:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            if not os.path.isdir(entry_dir):
+                raise
+        self.evict(keep=entry_dir)
+        return entry_dir
+
+    @staticmethod
+    def get_files(entry_dir: str) -> list[str]:
+        return sorted(
+            path for path in glob.glob(os.path.join(entry_dir, "*"))
+            if not os.path.basename(path).startswith(_BINARY_PREFIX)
+        )
+
+    @staticmethod
+    def get_binary(entry_dir: str, build_key: str) -> Optional[str]:
+        path = os.path.join(entry_dir, _BINARY_PREFIX + build_key)
+        return path if os.path.isfile(path) else None
+
+    def store_binary(self, entry_dir: str, build_key: str, binary: str):
+        # binaries of older planner sources are never used again
+        for path in glob.glob(os.path.join(entry_dir, _BINARY_PREFIX + "*")):
+            os.remove(path)
+        tmp_path = os.path.join(entry_dir, f".{_BINARY_PREFIX}{build_key}.tmp")
+        shutil.copy2(binary, tmp_path)
+        os.replace(tmp_path, os.path.join(entry_dir, _BINARY_PREFIX + build_key))
+        self.evict(keep=entry_dir)
+
+    def evict(self, keep: Optional[str] = None):
+        """
+        Removes the least recently used entries until the cache fits into max_size.
+        """
+        entries = []
+        total_size = 0
+        for entry_dir in glob.glob(os.path.join(self.cache_dir, "*")):
+            if not os.path.isdir(entry_dir):
+                continue
+            size = sum(os.path.getsize(path) for path in glob.glob(os.path.join(entry_dir, "*")))
+            entries.append((os.path.getmtime(entry_dir), entry_dir, size))
+            total_size += size
+        for _, entry_dir, size in sorted(entries):
+            if total_size <= self.max_size:
+                break
+            if entry_dir == keep:
+                continue
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            total_size -= size
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+from dataclasses import dataclass, field
+from typing import Optional
+
+import numpy as np
+
+
+def lengths_to_offsets(lengths: np.ndarray) -> np.ndarray:
+    offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    return offsets
+
+
+def csr_positions(starts: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+    """
+    Expands (start, length) ranges into the flat list of positions they cover.
+    """
+    total = int(lengths.sum())
+    if total == 0:
+        return np.zeros(0, dtype=np.int64)
+    offsets = lengths_to_offsets(lengths)
+    range_ids = np.repeat(np.arange(len(lengths)), lengths)
+    return starts[range_ids] + (np.arange(total) - offsets[range_ids])
+
+
+def group_by(keys: np.ndarray, values: np.ndarray, n_keys: int) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Builds a CSR index from keys to values, keeping the values of each key in their original order.
+    """
+    order = np.argsort(keys, kind="stable")
+    return lengths_to_offsets(np.bincount(keys, minlength=n_keys)), values[order]
+
+
+@dataclass
+class ColumnarTask:
+    """
+    Array-backed task. Per-operator facts are stored CSR-style, e.g. the preconditions of operator i are
+    pre_vars[pre_offsets[i]:pre_offsets[i + 1]] with the values in pre_vals at the same positions.
+    Effect conditions are indexed by effect id, i.e. the position of the effect in eff_vars.
+    """
+    domain_sizes: np.ndarray
+    initial_state: np.ndarray
+    goal_vars: np.ndarray
+    goal_vals: np.ndarray
+    costs: np.ndarray
+    pre_offsets: np.ndarray
+    pre_vars: np.ndarray
+    pre_vals: np.ndarray
+    eff_offsets: np.ndarray
+    eff_vars: np.ndarray
+    eff_vals: np.ndarray
+    eff_cond_offsets: np.ndarray
+    eff_cond_vars: np.ndarray
+    eff_cond_vals: np.ndarray
+    mutex_offsets: np.ndarray
+    mutex_vars: np.ndarray
+    mutex_vals: np.ndarray
+    # id of every operator in the sas file, which differs once operators were pruned (generate/pruning.py)
+    original_operator_ids: Optional[np.ndarray] = None
+    # index of the facts, fact id = fact_offsets[var] + value
+    fact_offsets: np.ndarray = field(init=False)
+
+    def __post_init__(self):
+        self.fact_offsets = lengths_to_offsets(self.domain_sizes)
+        if self.original_operator_ids is None:
+            self.original_operator_ids = np.arange(self.num_operators)
+
+    @property
+    def num_variables(self) -> int:
+        return len(self.domain_sizes)
+
+    @property
+    def num_operators(self) -> int:
+        return len(self.costs)
+
+    @property
+    def num_facts(self) -> int:
+        return int(self.fact_offsets[-1])
+
+    def fact_ids(self, fact_vars: np.ndarray, fact_vals: np.ndarray) -> np.ndarray:
+        return self.fact_offsets[fact_vars] + fact_vals
+
+    def pre_op_ids(self) -> np.ndarray:
+        """
+        Operator of every entry of pre_vars/pre_vals.
+        """
+        return np.repeat(np.arange(self.num_operators), np.diff(self.pre_offsets))
+
+    def eff_op_ids(self) -> np.ndarray:
+        return np.repeat(np.arange(self.num_operators), np.diff(self.eff_offsets))
+
+    def get_preconditions(self, op_index: int) -> tuple[np.ndarray, np.ndarray]:
+        start, end = self.pre_offsets[op_index], self.pre_offsets[op_index + 1]
+        return self.pre_vars[start:end], self.pre_vals[start:end]
+
+    def get_effects(self, op_index: int) -> tuple[np.ndarray, np.ndarray]:
+        start, end = self.eff_offsets[op_index], self.eff_offsets[op_index + 1]
+        return self.eff_vars[start:end], self.eff_vals[start:end]
+
+    def get_operator_mutexes(self) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        For every operator, the facts of other variables that share a mutex group with one of its effects.
+        Returns CSR offsets, variables and values; duplicates are removed, otherwise the facts are in order
+        of first appearance.
+        """
+        n_groups = len(self.mutex_offsets) - 1
+        group_sizes = np.diff(self.mutex_offsets)
+        member_ids = self.fact_ids(self.mutex_vars, self.mutex_vals)
+        fact_group_offsets, fact_groups = group_by(
+            member_ids, np.repeat(np.arange(n_groups), group_sizes), self.num_facts)
+
+        # (effect, group) pairs for all groups containing the effect fact
+        eff_ids = self.fact_ids(self.eff_vars, self.eff_vals)
+        n_eff_groups = fact_group_offsets[eff_ids + 1] - fact_group_offsets[eff_ids]
+        pair_groups = fact_groups[csr_positions(fact_group_offsets[eff_ids], n_eff_groups)]
+        pair_effects = np.repeat(np.arange(len(eff_ids)), n_eff_groups)
+
+        # (effect, member) pairs for all members of those groups
+        member_pos = csr_positions(self.mutex_offsets[pair_groups], group_sizes[pair_groups])
+        member_effects = np.repeat(pair_effects, group_sizes[pair_groups])
+        other_var = self.mutex_vars[member_pos] != self.eff_vars[member_effects]
+        member_pos = member_pos[other_var]
+        member_ops = self.eff_op_ids()[member_effects[other_var]]
+
+        # unique (operator, fact) keys in order of first appearance
+        keys = member_ops * max(self.num_facts, 1) + member_ids[member_pos]
+        _, first = np.unique(keys, return_index=True)
+        first.sort()
+        offsets = lengths_to_offsets(np.bincount(member_ops[first], minlength=self.num_operators))
+        return offsets, self.mutex_vars[member_pos[first]], self.mutex_vals[member_pos[first]]
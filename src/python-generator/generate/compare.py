@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Checks that the bulk parser backend reads the same task as the line-based parser.
+
+Usage: python -m generate.compare sas-files/*.sas
+"""
+import sys
+import time
+
+from generate import bulk_parse, helpers, parse
+
+
+def _facts(facts: list[parse.FactPair]) -> list[tuple[int, int]]:
+    return [(fact.var, fact.value) for fact in facts]
+
+
+def _operator_signature(task, op_index: int, is_axiom: bool) -> tuple:
+    preconds = [task.get_operator_precondition(op_index, i, is_axiom)
+                for i in range(task.get_num_operator_preconditions(op_index, is_axiom))]
+    effects = []
+    for eff_index in range(task.get_num_operator_effects(op_index, is_axiom)):
+        conditions = [task.get_operator_effect_condition(op_index, eff_index, i, is_axiom)
+                      for i in range(task.get_num_operator_effect_conditions(op_index, eff_index, is_axiom))]
+        effect = task.get_operator_effect(op_index, eff_index, is_axiom)
+        effects.append(((effect.var, effect.value), _facts(conditions)))
+    return (
+        task.get_operator_name(op_index, is_axiom),
+        task.get_operator_cost(op_index, is_axiom),
+        _facts(preconds),
+        effects,
+    )
+
+
+def compare_tasks(expected, actual) -> list[str]:
+    """
+    Compares two tasks through the RootTask accessor API and returns a description of every difference.
+    """
+    diffs = []
+    if expected.get_num_variables() != actual.get_num_variables():
+        return [f"number of variables: {expected.get_num_variables()} != {actual.get_num_variables()}"]
+    for var in range(expected.get_num_variables()):
+        for getter in ("get_variable_name", "get_variable_domain_size", "get_variable_axiom_layer",
+                       "get_variable_default_axiom_value"):
+            if getattr(expected, getter)(var) != getattr(actual, getter)(var):
+                diffs.append(f"{getter}({var})")
+        for value in range(expected.get_variable_domain_size(var)):
+            fact = parse.FactPair(var, value)
+            if expected.get_fact_name(fact) != actual.get_fact_name(fact):
+                diffs.append(f"get_fact_name({fact})")
+
+    if expected.get_initial_state_values() != actual.get_initial_state_values():
+        diffs.append("initial state")
+    expected_goals = [expected.get_goal_fact(i) for i in range(expected.get_num_goals())]
+    actual_goals = [actual.get_goal_fact(i) for i in range(actual.get_num_goals())]
+    if _facts(expected_goals) != _facts(actual_goals):
+        diffs.append("goals")
+
+    if expected.get_num_operators() != actual.get_num_operators():
+        diffs.append(f"number of operators: {expected.get_num_operators()} != {actual.get_num_operators()}")
+    else:
+        for op_index in range(expected.get_num_operators()):
+            if _operator_signature(expected, op_index, False) != _operator_signature(actual, op_index, False):
+                diffs.append(f"operator {op_index}")
+            if _facts(expected.get_operator_mutexes(op_index)) != _facts(actual.get_operator_mutexes(op_index)):
+                diffs.append(f"mutexes of operator {op_index}")
+
+    if expected.get_num_axioms() != actual.get_num_axioms():
+        diffs.append(f"number of axioms: {expected.get_num_axioms()} != {actual.get_num_axioms()}")
+    else:
+        for ax_index in range(expected.get_num_axioms()):
+            if _operator_signature(expected, ax_index, True) != _operator_signature(actual, ax_index, True):
+                diffs.append(f"axiom {ax_index}")
+    return diffs
+
+
+def main():
+    if len(sys.argv) < 2:
+        print("Usage: python -m generate.compare <sas files>")
+        return 1
+    n_failed = 0
+    for filename in sys.argv[1:]:
+        start = time.perf_counter()
+        expected = parse.RootTask(helpers.get_lines(filename))
+        lines_time = time.perf_counter() - start
+        start = time.perf_counter()
+        actual = bulk_parse.BulkRootTask(filename)
+        bulk_time = time.perf_counter() - start
+        diffs = compare_tasks(expected, actual)
+        status = "OK" if not diffs else "MISMATCH"
+        print(f"{status} {filename} (lines: {lines_time:.3f}s, bulk: {bulk_time:.3f}s)")
+        for diff in diffs[:10]:
+            print(f"    {diff}")
+        n_failed += bool(diffs)
+    return 1 if n_failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -5,5 +5,5 @@ PRE_FILE_VERSION = 3
 
 FILE_DIR = os.path.dirname(__file__)
 C_SRC_CODE_DIR = os.path.abspath(os.path.join(FILE_DIR, '..', '..', "planner/"))
-
-STORAGE_LENGTH = 1000000000
+# the task-specific sources, see the Makefile in C_SRC_CODE_DIR
+C_GENERATED_CODE_DIR = os.path.join(C_SRC_CODE_DIR, "generated")
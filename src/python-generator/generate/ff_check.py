@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Checks that the counter-based relaxed exploration of the FF heuristic gives the same values as the layered one.
+
+The table-driven planner has both explorations: for every task, `planner-table ff-check` computes the heuristic of
+the states of random walks from the initial state with both and counts the states where they differ.
+
+Usage: python -m generate.ff_check sas-files/*.sas
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+
+from generate import constants
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Compare the FF values of the layered and counter-based explorations.")
+    parser.add_argument("sas_files", nargs="+")
+    parser.add_argument("--states", type=int, default=10000, help="number of states per task (default: 10000)")
+    parser.add_argument("--make-jobs", type=int, default=os.cpu_count() or 1, help="parallel jobs of make")
+    return parser.parse_args()
+
+
+def check_task(sas_file: str, binary: str, work_dir: str, n_states: int) -> str:
+    """
+    Returns the status of the task: the last line of the output of ff-check, or the error.
+    """
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [os.path.dirname(constants.FILE_DIR), env.get("PYTHONPATH")]))
+    task_file = os.path.join(work_dir, "task.bin")
+    result = subprocess.run(
+        [sys.executable, "-m", "generate.app", sas_file, "--mode", "table", "--task-file", task_file, "--no-cache"],
+        capture_output=True, text=True, env=env, check=False,
+    )
+    if result.returncode != 0:
+        return "generation failed"
+    result = subprocess.run(
+        [binary, "ff-check", "--states", str(n_states), "--task", task_file], capture_output=True, text=True, check=False
+    )
+    lines = result.stdout.splitlines()
+    status = lines[-1] if lines else "no output"
+    return status if result.returncode == 0 else f"MISMATCH {result.stdout.strip()}"
+
+
+def main():
+    args = parse_args()
+    n_mismatches = 0
+    with tempfile.TemporaryDirectory() as work_dir:
+        binary = os.path.join(work_dir, "planner-table")
+        subprocess.run([
+            "make", "-s", "-C", constants.C_SRC_CODE_DIR, f"-j{args.make_jobs}", "MODE=table", f"BIN={binary}",
+            f"BUILD_DIR={os.path.join(work_dir, 'build')}",
+        ], check=True)
+        for sas_file in args.sas_files:
+            status = check_task(sas_file, binary, work_dir, args.states)
+            n_mismatches += status.startswith("MISMATCH")
+            print(f"{os.path.basename(sas_file)}: {status}")
+    print(f"{n_mismatches} of {len(args.sas_files)} tasks with different values")
+    return 1 if n_mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,7 +4,7 @@ from typing import Optional
 
 import numpy as np
 
-from generate import constants, parse, representations, helpers
+from generate import columnar, constants, pipeline, representations, helpers, successor_generator, applicability
 
 
 ACTION_FILE = "action.cpp"
@@ -16,68 +16,184 @@ SA_ACTION_HEADER = "sa_action.h"
 
 
 def write_configs(var_infos: list[representations.VarInfo]):
-    filepath = os.path.join(constants.C_SRC_CODE_DIR, CONFIG_FILE)
+    filepath = os.path.join(constants.C_GENERATED_CODE_DIR, CONFIG_FILE)
     with open(filepath, "w") as file:
         file.write("#ifndef CONFIG_H\n#define CONFIG_H\n")
-        state_length = var_infos[-1].word_pos + 1
+        state_length = representations.get_state_length(var_infos)
         # file.write(f"#define STATE_LENGTH {state_length}\n")
         # file.write("#define STATE_LENGTH_HEU STATE_LENGTH + 1\n")
-        # file.write(f"#define STORAGE_LENGTH {constants.STORAGE_LENGTH}\n")
         file.write(f"const int STATE_LENGTH = {state_length};\n")
         file.write("const int STATE_LENGTH_HEU = STATE_LENGTH + 1;\n")
-        file.write(f"const int STORAGE_LENGTH = {constants.STORAGE_LENGTH};\n")
         file.write("#endif")
 
 
-def write_actions(root_task: parse.RootTask, var_infos: list[representations.VarInfo]):
-    filepath = os.path.join(constants.C_SRC_CODE_DIR, ACTION_FILE)
-    op_reps = representations.get_all_op_reps(root_task, var_infos)
-    initial_state_str = make_initial_state_str(root_task, var_infos)
-    goal_str = make_goal_str(root_task, var_infos)
-    state_length = var_infos[-1].word_pos + 1
-    with open(filepath, "w") as file:
-        file.write(f'#include "{ACTION_HEADER}"\n\n')
-        file.write(("void actions(uint64_t* state_bitrep, PlannerQueue& pq, PathInfoMap& path_info) {\n"))
-        for action_idx, op_rep in enumerate(op_reps):
-            precond_str = make_precond_str(op_rep.preconds)
-            mutex_str = make_mutex_str_for_action(root_task, var_infos, action_idx)
-            effect_str = make_effect_str(action_idx, op_rep.effects, state_length, mutex_str)
-            if precond_str:
-                file.write(f"if ({precond_str})\n")
-            file.write("{\n" + f"{effect_str}" + "}\n")
-        file.write("}\n\n")
-
-        file.write(goal_str)
-
-        file.write(initial_state_str)
+ACTIONS_FUNCTION = helpers.FunctionStr(
+    "void",
+    "actions",
+    ["uint64_t* state_bitrep", "PlannerQueue& pq"]
+)
+
+
+def uses_successor_tree(context: pipeline.GenerationContext) -> bool:
+    return context.options.successor_generator == "tree"
+
+
+def get_include_str(context: pipeline.GenerationContext, header: str) -> str:
+    include_str = f'#include "{header}"\n'
+    if uses_successor_tree(context):
+        include_str += "#include <algorithm>\n#include <vector>\n"
+    elif context.options.successor_generator == "bitset":
+        include_str += "#include <cstring>\n"
+    return include_str
+
+
+def write_successor_tree_part(context: pipeline.GenerationContext, start: int, stop: int, vector_name: str):
+    """
+    Part writing the decision tree of the operators start, ..., stop - 1, built when the file is written.
+    """
+    def write(writer: helpers.CodeWriter):
+        tree = successor_generator.build_successor_tree(context.task, start, stop)
+        successor_generator.write_successor_tree(writer, tree, context.var_infos, vector_name)
+    return write
+
+
+def write_applicability_flags_part(context: pipeline.GenerationContext, start: int, stop: int, flags_name: str):
+    """
+    Part writing the bulk applicability test of the operators start, ..., stop - 1.
+    """
+    def write(writer: helpers.CodeWriter):
+        applicability.write_applicability_flags(writer, context.encoding, start, stop, flags_name)
+    return write
+
+
+def make_applicability_bitset_parts(
+    context: pipeline.GenerationContext, start: int, stop: int, loop_body: list[pipeline.Part]
+) -> list[pipeline.Part]:
+    """
+    Tests the operators start, ..., stop - 1 in bulk and runs loop_body for each applicable action_idx in order.
+    """
+    return [
+        applicability.make_flags_declaration(start, stop, "is_applicable"),
+        write_applicability_flags_part(context, start, stop, "is_applicable"),
+        applicability.make_bitset_loop_header(start, stop, "is_applicable", "action_idx"),
+        *loop_body,
+        applicability.BITSET_LOOP_FOOTER,
+    ]
+
+
+def make_actions_body(context: pipeline.GenerationContext, start: int, stop: int) -> list[pipeline.Part]:
+    if context.options.successor_generator == "linear":
+        return [pipeline.OperatorChunks(write_actions_chunk, start, stop)]
+    if context.options.successor_generator == "bitset":
+        return make_applicability_bitset_parts(context, start, stop, [
+            "switch (action_idx) {\n",
+            pipeline.OperatorChunks(write_actions_case_chunk, start, stop),
+            "}\n",
+        ])
+    # the successors are generated in operator order like with the linear scan, so that the queue order and
+    # thus the search is the same; the buffer is per thread for the portfolio
+    return [
+        "static thread_local std::vector<int> applicable_actions;\n",
+        "applicable_actions.clear();\n",
+        write_successor_tree_part(context, start, stop, "applicable_actions"),
+        "std::sort(applicable_actions.begin(), applicable_actions.end());\n",
+        "for (int action_idx : applicable_actions) {\n",
+        "switch (action_idx) {\n",
+        pipeline.OperatorChunks(write_actions_case_chunk, start, stop),
+        "}\n",
+        "}\n",
+    ]
+
+
+def get_action_files(context: pipeline.GenerationContext) -> list[pipeline.OutputFile]:
+    include_str = get_include_str(context, ACTION_HEADER) + "\n"
+    goal_and_initial_state = [
+        make_goal_str(context.task, context.var_infos),
+        make_initial_state_str(context.task, context.var_infos),
+        make_original_operator_ids_str(context.task),
+    ]
+    actions = pipeline.ShardedFunction(
+        ACTIONS_FUNCTION, make_body=lambda start, stop: make_actions_body(context, start, stop)
+    )
+    if not context.is_sharded:
+        return [pipeline.OutputFile(ACTION_FILE, [
+            include_str,
+            ACTIONS_FUNCTION.make_header(),
+            *actions.get_body(0, context.num_operators),
+            ACTIONS_FUNCTION.make_footer() + "\n",
+            *goal_and_initial_state,
+        ])]
+
+    # the shards successively add the successors of their operators, so the queue order is unchanged
+    dispatcher = pipeline.OutputFile(ACTION_FILE, [
+        include_str,
+        actions.make_declarations(context) + "\n",
+        ACTIONS_FUNCTION.make_header(),
+        actions.make_sequence_str(context),
+        ACTIONS_FUNCTION.make_footer() + "\n",
+        *goal_and_initial_state,
+    ])
+    return [dispatcher] + pipeline.get_shard_files(context, ACTION_FILE, include_str, [actions])
+
+
+def write_actions_chunk(context: pipeline.GenerationContext, writer: helpers.CodeWriter, start: int, stop: int):
+    encoding = context.encoding
+    for action_idx in range(start, stop):
+        precond_str = make_precond_str(encoding.pre_mask[action_idx], encoding.pre_val[action_idx])
+        mutex_str = make_mutex_str_for_action(context.mutex_checks, action_idx)
+        effect_str = make_effect_str(
+            action_idx, encoding.eff_mask[action_idx], encoding.eff_val[action_idx], mutex_str
+        )
+        if precond_str:
+            writer.write(f"if ({precond_str})\n")
+        writer.write("{\n" + f"{effect_str}" + "}\n")
+
+
+def write_actions_case_chunk(
+    context: pipeline.GenerationContext, writer: helpers.CodeWriter, start: int, stop: int
+):
+    """
+    Effects of the operators found applicable by the successor tree or the applicability bitset.
+    """
+    encoding = context.encoding
+    for action_idx in range(start, stop):
+        mutex_str = make_mutex_str_for_action(context.mutex_checks, action_idx)
+        effect_str = make_effect_str(
+            action_idx, encoding.eff_mask[action_idx], encoding.eff_val[action_idx], mutex_str
+        )
+        writer.write(f"case {action_idx}: {{\n{effect_str}break;\n}}\n")
 
 
-def make_precond_str(preconds: dict[int, representations.OperatorPair]) -> Optional[str]:
+def make_precond_str(masks: np.ndarray, vals: np.ndarray) -> Optional[str]:
     preconds_str_list = []
-    for state_ind in preconds:
+    for state_ind in np.flatnonzero(masks).tolist():
         preconds_str_list.append(
-            f"((state_bitrep[{state_ind}] & {bin(preconds[state_ind].mask)}) == {bin(preconds[state_ind].val)})"
+            f"((state_bitrep[{state_ind}] & {bin(masks[state_ind])}) == {bin(vals[state_ind])})"
         )
     res = " && ".join(preconds_str_list) if len(preconds_str_list) > 0 else None
     return res
 
 
-def make_effect_str(action_idx: int, effects: dict[int, representations.OperatorPair], state_length: int, mutex_str: Optional[str]) -> str:
+def make_new_state_words_str(masks: np.ndarray, vals: np.ndarray) -> str:
     effect_str_list = []
-    for state_ind in range(state_length):
-        if state_ind in effects:
+    for state_ind, (mask, val) in enumerate(zip(masks.tolist(), vals.tolist())):
+        if mask != representations.ALL_ONES:
             effect_str_list.append(
                 (
                     f"newstate_bitrep[{state_ind}] "
-                    f"= (state_bitrep[{state_ind}] & {bin(effects[state_ind].mask)})"
-                    f" | {bin(effects[state_ind].val)};"
+                    f"= (state_bitrep[{state_ind}] & {bin(mask)})"
+                    f" | {bin(val)};"
                 )
             )
         else:
             effect_str_list.append(f"newstate_bitrep[{state_ind}] = state_bitrep[{state_ind}];")
-    effect_str = "\n".join(effect_str_list)
+    return "\n".join(effect_str_list)
+
+
+def make_effect_str(action_idx: int, masks: np.ndarray, vals: np.ndarray, mutex_str: Optional[str]) -> str:
+    effect_str = make_new_state_words_str(masks, vals)
     newstate_bitrep_str = "uint64_t* newstate_bitrep = allocate_state();\n"
-    add_newstate_to_queue = f"{{add_to_queue(newstate_bitrep, state_bitrep, {action_idx}, pq, path_info);}}\n"
+    add_newstate_to_queue = f"{{add_to_queue(newstate_bitrep, state_bitrep, {action_idx}, pq);}}\n"
     if mutex_str:
         mutex_test_str = f"if ({mutex_str})\n"
         mutex_fail_str = "else {remove_last();}\n"
@@ -86,36 +202,27 @@ def make_effect_str(action_idx: int, effects: dict[int, representations.Operator
     return res
 
 
-def make_initial_state_str(root_task: parse.RootTask, var_infos: list[representations.VarInfo]) -> str:
-    res = "uint64_t INITIAL_STATE[STATE_LENGTH_HEU] = "
-    state_length = var_infos[-1].word_pos + 1
-    state_values = root_task.get_initial_state_values()
-    state_nums = [np.uint64(0) for _ in range(state_length)]
-    for var, val in enumerate(state_values):
-        var_info = var_infos[var]
-        state_nums[var_info.word_pos] |= (((1 << var_info.b_length) - 1) & val) << var_info.b_start
-    num_str = ",\n".join([bin(n) for n in state_nums])
+def make_initial_state_str(task: columnar.ColumnarTask, var_infos: list[representations.VarInfo]) -> str:
+    # INITIAL_STATE is a pointer so that the table-driven planner can set it when loading the task
+    res = "uint64_t INITIAL_STATE_DATA[STATE_LENGTH_HEU] = "
+    _, state_nums = representations.encode_facts(np.arange(task.num_variables), task.initial_state, var_infos)
+    num_str = ",\n".join([bin(n) for n in state_nums.tolist()])
     res += "{\n" + num_str + ", 0\n};\n"
+    res += "uint64_t* INITIAL_STATE = INITIAL_STATE_DATA;\n"
     return res
 
 
-def make_goal_str(root_task: parse.RootTask, var_infos: list[representations.VarInfo]) -> str:
-    goals = [root_task.get_goal_fact(i) for i in range(root_task.get_num_goals())]
-    goal_nums: dict[int, representations.OperatorPair] = {}
-    for goal_fact in goals:
-        mask = np.uint64(0)
-        val = np.uint64(0)
-        var_info = var_infos[goal_fact.var]
-        state_ind = var_info.word_pos
+def make_original_operator_ids_str(task: columnar.ColumnarTask) -> str:
+    # a pointer like INITIAL_STATE, the table-driven planner reads the ids from the task file
+    ids_str = ",".join(map(str, task.original_operator_ids.tolist())) if task.num_operators else "0"
+    res = f"static const int ORIGINAL_OPERATOR_ID_DATA[{max(task.num_operators, 1)}] = {{{ids_str}}};\n"
+    res += "const int* ORIGINAL_OPERATOR_ID = ORIGINAL_OPERATOR_ID_DATA;\n"
+    return res
 
-        if state_ind in goal_nums:
-            mask = goal_nums[state_ind].mask
-            val = goal_nums[state_ind].val
 
-        mask = mask | (((1 << var_info.b_length) - 1) << var_info.b_start)
-        val = val | ((((1 << var_info.b_length) - 1) & goal_fact.value) << var_info.b_start)
-        goal_nums[state_ind] = representations.OperatorPair(mask, val)
-    cond_str = make_precond_str(goal_nums)
+def make_goal_str(task: columnar.ColumnarTask, var_infos: list[representations.VarInfo]) -> str:
+    goal_mask, goal_val = representations.encode_facts(task.goal_vars, task.goal_vals, var_infos)
+    cond_str = make_precond_str(goal_mask, goal_val)
     assert cond_str is not None
     cond_str = "{ return (" + cond_str + "); }"
 
@@ -123,89 +230,125 @@ def make_goal_str(root_task: parse.RootTask, var_infos: list[representations.Var
     return res
 
 
-def make_mutex_str_for_action(
-    root_task: parse.RootTask, var_infos: list[representations.VarInfo], action_idx: int
-) -> Optional[str]:
+def make_mutex_str_for_action(mutex_checks: representations.MutexChecks, action_idx: int) -> Optional[str]:
+    """
+    Condition that the successor of the operator violates none of the mutexes, one term per checked word.
+    """
+    if mutex_checks.always_violated[action_idx]:
+        return "false"
     res = []
-    mutexes = root_task.get_operator_mutexes(action_idx)
-    # print(f"mutex for action {action_idx}")
-    for fact in mutexes:
-        # print(fact.var, fact.value)
-        var_info = var_infos[fact.var]
-        val = np.uint64(0) | (fact.value << var_info.b_start)
-        res.append(f"((newstate_bitrep[{var_info.word_pos}] & {bin(var_info.mask_get)}) != {bin(val)})")
+    for word, mask, values, low_bits, high_bits in mutex_checks.get_checks(action_idx):
+        if low_bits & (low_bits - 1) == 0:
+            res.append(f"((newstate_bitrep[{word}] & {bin(mask)}) != {bin(values)})")
+        else:
+            res.append(
+                f"no_mutex_fact(newstate_bitrep[{word}], {bin(mask)}, {bin(values)}, {bin(low_bits)}, {bin(high_bits)})"
+            )
     return ' && '.join(res) if len(res) > 0 else None
 
 
-def write_sa_actions(root_task: parse.RootTask, var_infos: list[representations.VarInfo]):
-    filepath = os.path.join(constants.C_SRC_CODE_DIR, SA_ACTION_FILE)
-    get_applicable_actions_str = make_get_applicable_actions_str(root_task, var_infos)
-    apply_action_effects_str = make_apply_action_effects_str(root_task, var_infos)
-    with open(filepath, "w") as file:
-        file.write("#include \"sa_action.h\"\n")
-        file.write(get_applicable_actions_str)
-        file.write(apply_action_effects_str)
+# the applicable actions are written to a vector of the caller, which is reused for every step of SA
+GET_APPLICABLE_ACTIONS_FUNCTION = helpers.FunctionStr(
+    "void",
+    "get_applicable_actions",
+    ["uint64_t* state_bitrep", "vector<int>& applicable_actions"]
+)
+APPLY_ACTION_EFFECTS_FUNCTION = helpers.FunctionStr(
+    "void",
+    "apply_action_effects",
+    ["uint64_t* state_bitrep", "int action_idx"]
+)
+# the shards of apply_action_effects get the new state from the dispatcher
+APPLY_ACTION_EFFECTS_SHARD = helpers.FunctionStr(
+    "void",
+    "apply_action_effects",
+    ["uint64_t* state_bitrep", "uint64_t* newstate_bitrep", "int action_idx"]
+)
+
+
+def make_get_applicable_actions_body(
+    context: pipeline.GenerationContext, start: int, stop: int
+) -> list[pipeline.Part]:
+    if context.options.successor_generator == "linear":
+        return [pipeline.OperatorChunks(write_get_applicable_actions_chunk, start, stop)]
+    if context.options.successor_generator == "bitset":
+        return make_applicability_bitset_parts(context, start, stop, ["applicable_actions.push_back(action_idx);\n"])
+    # the vector can already hold the operators of previous shards
+    return [
+        "size_t first_action = applicable_actions.size();\n",
+        write_successor_tree_part(context, start, stop, "applicable_actions"),
+        "std::sort(applicable_actions.begin() + first_action, applicable_actions.end());\n",
+    ]
+
+
+def make_apply_action_effects_body(
+    context: pipeline.GenerationContext, start: int, stop: int
+) -> list[pipeline.Part]:
+    # the cases are the consecutive operators of the shard, so the compiler turns the switch into a jump table and
+    # an SA step does not depend on the number of operators, whatever the successor generator
+    return [
+        "switch (action_idx) {\n",
+        pipeline.OperatorChunks(write_apply_action_effects_case_chunk, start, stop),
+        "}\n",
+    ]
+
+
+def get_sa_action_files(context: pipeline.GenerationContext) -> list[pipeline.OutputFile]:
+    include_str = get_include_str(context, SA_ACTION_HEADER)
+    get_applicable_actions = pipeline.ShardedFunction(
+        GET_APPLICABLE_ACTIONS_FUNCTION,
+        make_body=lambda start, stop: make_get_applicable_actions_body(context, start, stop),
+    )
+    apply_action_effects = pipeline.ShardedFunction(
+        APPLY_ACTION_EFFECTS_SHARD,
+        make_body=lambda start, stop: make_apply_action_effects_body(context, start, stop),
+    )
+    if not context.is_sharded:
+        return [pipeline.OutputFile(SA_ACTION_FILE, [
+            include_str,
+            GET_APPLICABLE_ACTIONS_FUNCTION.make_header(),
+            "applicable_actions.clear();\n",
+            *get_applicable_actions.get_body(0, context.num_operators),
+            GET_APPLICABLE_ACTIONS_FUNCTION.make_footer(),
+            APPLY_ACTION_EFFECTS_FUNCTION.make_header(),
+            "uint64_t* newstate_bitrep = allocate_state();\n",
+            *apply_action_effects.get_body(0, context.num_operators),
+            APPLY_ACTION_EFFECTS_FUNCTION.make_footer(),
+        ])]
+
+    dispatcher = pipeline.OutputFile(SA_ACTION_FILE, [
+        include_str,
+        get_applicable_actions.make_declarations(context),
+        apply_action_effects.make_declarations(context),
+        GET_APPLICABLE_ACTIONS_FUNCTION.make_header(),
+        "applicable_actions.clear();\n",
+        get_applicable_actions.make_sequence_str(context),
+        GET_APPLICABLE_ACTIONS_FUNCTION.make_footer(),
+        APPLY_ACTION_EFFECTS_FUNCTION.make_header(),
+        "uint64_t* newstate_bitrep = allocate_state();\n",
+        apply_action_effects.make_range_dispatch_str(context, "action_idx"),
+        APPLY_ACTION_EFFECTS_FUNCTION.make_footer(),
+    ])
+    return [dispatcher] + pipeline.get_shard_files(
+        context, SA_ACTION_FILE, include_str, [get_applicable_actions, apply_action_effects]
+    )
 
 
-def make_get_applicable_actions_str(root_task: parse.RootTask, var_infos: list[representations.VarInfo]) -> str:
-    op_reps = representations.get_all_op_reps(root_task, var_infos)
-    f_str = helpers.FunctionStr(
-        "vector<int>",
-        "get_applicable_actions",
-        ["uint64_t* state_bitrep"]
-    )
-    f_str.add_body("vector<int> applicable_actions;")
-    for action_idx, op_rep in enumerate(op_reps):
-        precond_str = make_precond_str(op_rep.preconds)
+def write_get_applicable_actions_chunk(
+    context: pipeline.GenerationContext, writer: helpers.CodeWriter, start: int, stop: int
+):
+    encoding = context.encoding
+    for action_idx in range(start, stop):
+        precond_str = make_precond_str(encoding.pre_mask[action_idx], encoding.pre_val[action_idx])
         if precond_str:
-            f_str.add_body(f"if ({precond_str})")
-        f_str.add_body("{ " + f"applicable_actions.push_back({action_idx});" + " }")
-    f_str.add_body("return applicable_actions;")
-    return f_str.make_str()
-
-
-def make_apply_action_effects_str(root_task: parse.RootTask, var_infos: list[representations.VarInfo]) -> str:
-    op_reps = representations.get_all_op_reps(root_task, var_infos)
-    state_length = var_infos[-1].word_pos + 1
-    f_str = helpers.FunctionStr(
-        "void",
-        "apply_action_effects",
-        ["uint64_t* state_bitrep", "int action_idx"]
-    )
-    f_str.add_body("uint64_t* newstate_bitrep = allocate_state();")
-    for action_idx, op_rep in enumerate(op_reps):
-        effect_str = make_new_state_str(action_idx, op_rep.effects, state_length)
-        f_str.add_body(effect_str)
-    return f_str.make_str()
+            writer.write(f"if ({precond_str})\n")
+        writer.write("{ " + f"applicable_actions.push_back({action_idx});" + " }\n")
 
 
-def write_sa_header():
-    filepath = os.path.join(constants.C_SRC_CODE_DIR, SA_ACTION_HEADER)
-    with open(filepath, "w") as file:
-        file.write("#ifndef SA_ACTION_H\n")
-        file.write("#define SA_ACTION_H\n")
-        file.write("#include <stdint.h>\n")
-        file.write("#include <vector>\n")
-        file.write("#include \"storage.h\"\n")
-        file.write("using namespace std;\n")
-        file.write("vector<int> get_applicable_actions(uint64_t* state_bitrep);\n")
-        file.write("void apply_action_effects(uint64_t* state_bitrep, int action_idx);\n")
-        file.write("#endif\n")
-
-
-def make_new_state_str(action_idx: int, effects: dict[int, representations.OperatorPair], state_length: int) -> str:
-    effect_str_list = []
-    for state_ind in range(state_length):
-        if state_ind in effects:
-            effect_str_list.append(
-                (
-                    f"newstate_bitrep[{state_ind}] "
-                    f"= (state_bitrep[{state_ind}] & {bin(effects[state_ind].mask)})"
-                    f" | {bin(effects[state_ind].val)};"
-                )
-            )
-        else:
-            effect_str_list.append(f"newstate_bitrep[{state_ind}] = state_bitrep[{state_ind}];")
-    effect_str = "\n".join(effect_str_list)
-    res =  f"if (action_idx == {action_idx}) " + "{\n" + effect_str + "\nreturn;\n}"
-    return res
+def write_apply_action_effects_case_chunk(
+    context: pipeline.GenerationContext, writer: helpers.CodeWriter, start: int, stop: int
+):
+    encoding = context.encoding
+    for action_idx in range(start, stop):
+        effect_str = make_new_state_words_str(encoding.eff_mask[action_idx], encoding.eff_val[action_idx])
+        writer.write(f"case {action_idx}: {{\n{effect_str}\nreturn;\n}}\n")
@@ -1,7 +1,9 @@
 #!/usr/bin/env python3
 
+import contextlib
 import logging
 import sys
+from typing import Iterable, Iterator, TextIO
 
 
 def get_lines(filename):
@@ -24,23 +26,70 @@ def in_bounds(index: int, container: list) -> bool:
 
 
 class FunctionStr:
+    """
+    Signature of a generated function, the body is written between make_header() and make_footer().
+    """
     def __init__(self, ret_type: str, name: str, params: list[str]):
         self.ret_type = ret_type
         self.name = name
         self.params = params
-        self.body = ""
-
-    def add_body(self, to_add: str):
-        self.body += to_add + "\n"
 
     def _make_param_str(self):
         res = ', '.join(self.params)
         return res
 
-    def make_str(self):
+    def make_header(self) -> str:
         param_str = self._make_param_str()
-        res = f"{self.ret_type} {self.name}({param_str}) " + "{\n"
-        res += self.body
-        res += "}\n"
+        return f"{self.ret_type} {self.name}({param_str}) " + "{\n"
 
-        return res
+    def make_footer(self) -> str:
+        return "}\n"
+
+    def make_declaration(self) -> str:
+        param_str = self._make_param_str()
+        return f"{self.ret_type} {self.name}({param_str});\n"
+
+    def make_call(self) -> str:
+        """
+        Call forwarding the parameters under their own names, e.g. from a dispatcher with the same parameters.
+        """
+        arg_str = ', '.join(param.split()[-1].lstrip("*&") for param in self.params)
+        return f"{self.name}({arg_str})"
+
+    def make_shard(self, shard_idx: int) -> "FunctionStr":
+        return FunctionStr(self.ret_type, f"{self.name}_{shard_idx}", self.params)
+
+
+# buffer size of the generated files, the code is written in many small pieces
+WRITE_BUFFER_SIZE = 1 << 20
+
+
+class CodeWriter:
+    """
+    Streams generated code to a buffered file, so that function bodies are never held in memory as a whole.
+    """
+    def __init__(self, file: TextIO):
+        self.file = file
+
+    @classmethod
+    @contextlib.contextmanager
+    def open(cls, path: str) -> Iterator["CodeWriter"]:
+        with open(path, "w", buffering=WRITE_BUFFER_SIZE) as file:
+            yield cls(file)
+
+    def write(self, code: str):
+        self.file.write(code)
+
+    def write_lines(self, lines: Iterable[str]):
+        for line in lines:
+            self.file.write(line)
+            self.file.write("\n")
+
+    @contextlib.contextmanager
+    def function(self, function: FunctionStr) -> Iterator["CodeWriter"]:
+        """
+        Writes the header of the function, then the body written inside the with block, then the footer.
+        """
+        self.file.write(function.make_header())
+        yield self
+        self.file.write(function.make_footer())
@@ -0,0 +1,335 @@
+#!/usr/bin/env python3
+"""
+Placement of the variables in the 64-bit words of the packed state and of the one-hot state of FF.
+
+The sequential layout places the variables in file order and starts a new word when the next one does not fit.
+The optimized layout first keeps the number of words as small as possible, then places the variables that the
+same operators test or change in the same words, since an operator tests and writes every word that holds one of
+its variables:
+
+- the pairs of variables of the operators are weighted by the number of operators they share, and are merged into
+  clusters that fit in a word, heaviest pair first,
+- the clusters are packed into words with first fit decreasing; the variables alone packed with first fit
+  decreasing and the sequential layout are the other candidates,
+- in every candidate, variables are moved to another word with enough free bits, or swapped with a variable of
+  another word, as long as this lowers the number of words touched by the operators,
+- of the candidates with the fewest words, the one with the fewest touched words is kept.
+
+Usage: python -m generate.layout sas-files/*.sas prints the words per state and the words touched per operator of
+both layouts, and the time of the optimized one.
+"""
+import sys
+import time
+from dataclasses import dataclass
+
+import numpy as np
+
+from generate import bulk_parse, columnar
+
+WORD_BITS = 64
+# passes of moves and swaps over all variables, the passes stop earlier once nothing improves
+MAX_REFINE_PASSES = 10
+
+
+@dataclass
+class Layout:
+    """
+    Word and first bit of every variable.
+    """
+    word_pos: np.ndarray
+    b_start: np.ndarray
+    num_words: int
+
+
+def get_operator_vars(task: columnar.ColumnarTask) -> tuple[np.ndarray, np.ndarray]:
+    """
+    The variables of the preconditions and effects of every operator, without duplicates, in CSR by operator.
+    """
+    ops = np.concatenate((task.pre_op_ids(), task.eff_op_ids()))
+    op_vars = np.concatenate((task.pre_vars, task.eff_vars))
+    keys = np.unique(ops * max(task.num_variables, 1) + op_vars)
+    ops, op_vars = keys // max(task.num_variables, 1), keys % max(task.num_variables, 1)
+    return columnar.lengths_to_offsets(np.bincount(ops, minlength=task.num_operators)), op_vars
+
+
+def count_touched_words(op_offsets: np.ndarray, op_vars: np.ndarray, word_pos: np.ndarray) -> np.ndarray:
+    """
+    Number of words holding a variable of every operator.
+    """
+    num_ops = len(op_offsets) - 1
+    ops = np.repeat(np.arange(num_ops), np.diff(op_offsets))
+    num_words = int(word_pos.max()) + 1 if len(word_pos) else 1
+    keys = np.unique(ops * num_words + word_pos[op_vars])
+    return np.bincount(keys // num_words, minlength=num_ops)
+
+
+def place_in_words(widths: np.ndarray, word_pos: np.ndarray) -> Layout:
+    """
+    The layout with the given words, the variables of a word are placed in increasing order.
+    """
+    b_start = np.zeros(len(widths), dtype=np.int64)
+    used = np.zeros(int(word_pos.max()) + 1 if len(word_pos) else 1, dtype=np.int64)
+    for var, word in enumerate(word_pos.tolist()):
+        b_start[var] = used[word]
+        used[word] += widths[var]
+    assert (used <= WORD_BITS).all()
+    return Layout(word_pos.astype(np.int64), b_start, len(used))
+
+
+def sequential_layout(widths: np.ndarray) -> Layout:
+    word_pos = np.zeros(len(widths), dtype=np.int64)
+    index = 0
+    word = 0
+    for var, width in enumerate(widths.tolist()):
+        if index + width > WORD_BITS:
+            index = 0
+            word += 1
+        word_pos[var] = word
+        index += width
+    return place_in_words(widths, word_pos)
+
+
+def first_fit_decreasing(item_widths: np.ndarray) -> np.ndarray:
+    """
+    Word of every item, the widest items are placed first, each in the first word with enough free bits.
+    """
+    item_words = np.zeros(len(item_widths), dtype=np.int64)
+    free: list[int] = []
+    for item in np.argsort(-item_widths, kind="stable").tolist():
+        width = int(item_widths[item])
+        word = next((w for w, bits in enumerate(free) if bits >= width), len(free))
+        if word == len(free):
+            free.append(WORD_BITS)
+        free[word] -= width
+        item_words[item] = word
+    return item_words
+
+
+def cluster_variables(widths: np.ndarray, op_offsets: np.ndarray, op_vars: np.ndarray) -> np.ndarray:
+    """
+    Cluster of every variable: the pairs of variables of the operators are merged heaviest first, as long as the
+    clusters fit in a word.
+    """
+    num_vars = len(widths)
+    op_lengths = np.diff(op_offsets)
+    # every (variable, variable) pair of every operator, expanded from the CSR rows
+    first_pos = np.repeat(np.arange(len(op_vars)), np.repeat(op_lengths, op_lengths))
+    second_pos = columnar.csr_positions(np.repeat(op_offsets[:-1], op_lengths), np.repeat(op_lengths, op_lengths))
+    first, second = op_vars[first_pos], op_vars[second_pos]
+    is_pair = first < second
+    pairs, weights = np.unique(first[is_pair] * num_vars + second[is_pair], return_counts=True)
+
+    parents = list(range(num_vars))
+    cluster_widths = widths.tolist()
+
+    def find(var: int) -> int:
+        while parents[var] != var:
+            parents[var] = parents[parents[var]]
+            var = parents[var]
+        return var
+
+    for pair in pairs[np.argsort(-weights, kind="stable")].tolist():
+        root1, root2 = find(pair // num_vars), find(pair % num_vars)
+        if root1 != root2 and cluster_widths[root1] + cluster_widths[root2] <= WORD_BITS:
+            parents[root2] = root1
+            cluster_widths[root1] += cluster_widths[root2]
+    return np.array([find(var) for var in range(num_vars)], dtype=np.int64)
+
+
+def refine_words(
+    widths: np.ndarray, word_pos: np.ndarray, op_offsets: np.ndarray, op_vars: np.ndarray
+) -> np.ndarray:
+    """
+    Moves and swaps the variables between the words while the number of words touched by the operators decreases.
+
+    The change of the number of touched words of every move of a variable to a word is kept in arrays, which a move
+    only updates for the operators of the moved variable, so a pass reads the changes instead of computing them
+    from the operators of every variable, and a swap is evaluated for all variables of the target word at once.
+    """
+    num_words = int(word_pos.max()) + 1 if len(word_pos) else 1
+    if num_words == 1:
+        return word_pos
+    word_pos = word_pos.copy()
+    num_vars = len(widths)
+    op_lengths = np.diff(op_offsets)
+    ops = np.repeat(np.arange(len(op_lengths)), op_lengths)
+    var_op_offsets, var_ops = columnar.group_by(op_vars, ops, num_vars)
+    var_of_ops = np.repeat(np.arange(num_vars), np.diff(var_op_offsets))
+    # counts[op, w]: number of variables of the operator in word w
+    counts = np.zeros((len(op_lengths), num_words), dtype=np.int32)
+    np.add.at(counts, (ops, word_pos[op_vars]), 1)
+    free = WORD_BITS - np.bincount(word_pos, weights=widths, minlength=num_words).astype(np.int64)
+    # a move of variable v to word w touches added[v, w] more words and no longer touches left[v] words, those of
+    # the operators of which v is the only variable in its word
+    added = np.stack([
+        np.bincount(var_of_ops, weights=counts[var_ops, word] == 0, minlength=num_vars) for word in range(num_words)
+    ], axis=1).astype(np.int64)
+    left = np.bincount(
+        var_of_ops, weights=counts[var_ops, word_pos[var_of_ops]] == 1, minlength=num_vars
+    ).astype(np.int64)
+
+    def get_op_vars(var: int) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        The operators of the variable, the variables of these operators and the index of their operator in the first.
+        """
+        var_ops_list = var_ops[var_op_offsets[var]:var_op_offsets[var + 1]]
+        lengths = op_lengths[var_ops_list]
+        other_vars = op_vars[columnar.csr_positions(op_offsets[var_ops_list], lengths)]
+        return var_ops_list, other_vars, np.repeat(np.arange(len(var_ops_list)), lengths)
+
+    def move(var: int, word: int):
+        var_ops_list, other_vars, op_idx = get_op_vars(var)
+        old_word = word_pos[var]
+        old_counts = counts[var_ops_list][:, [old_word, word]]
+        counts[var_ops_list, old_word] -= 1
+        counts[var_ops_list, word] += 1
+        new_counts = counts[var_ops_list][:, [old_word, word]]
+        # only the operators of var have new counts, in the two words
+        added_change = (new_counts == 0).astype(np.int64) - (old_counts == 0)
+        np.add.at(added, (other_vars[:, None], [old_word, word]), added_change[op_idx])
+        left_change = (new_counts == 1).astype(np.int64) - (old_counts == 1)
+        other_words = word_pos[other_vars]
+        for k, changed_word in enumerate((old_word, word)):
+            in_word = other_words == changed_word
+            np.add.at(left, other_vars[in_word], left_change[op_idx[in_word], k])
+        free[old_word] += widths[var]
+        free[word] -= widths[var]
+        word_pos[var] = word
+        left[var] = int((counts[var_ops_list, word] == 1).sum())
+
+    def get_swap_deltas(var: int, word: int, others: np.ndarray) -> np.ndarray:
+        """
+        Change of the number of touched words if var moved to the word and each of the others, in the word, to the
+        word of var. The two moves add up, except for the operators of both variables, which touch both words
+        before and after, so the swaps are never better than the sum of the moves.
+        """
+        old_word = word_pos[var]
+        move_deltas = added[var, word] - left[var] + added[others, old_word] - left[others]
+        if move_deltas.min() >= 0:
+            return move_deltas
+        var_ops_list, other_vars, op_idx = get_op_vars(var)
+        shared = (counts[var_ops_list, old_word] == 1).astype(np.int64) + (counts[var_ops_list, word] == 1)
+        in_word = word_pos[other_vars] == word
+        shared_deltas = np.bincount(other_vars[in_word], weights=shared[op_idx[in_word]], minlength=num_vars)
+        return move_deltas + shared_deltas[others]
+
+    for _ in range(MAX_REFINE_PASSES):
+        improved = False
+        for var in range(num_vars):
+            if var_op_offsets[var] == var_op_offsets[var + 1]:
+                continue
+            old_word = int(word_pos[var])
+            deltas = added[var] - left[var]
+            deltas[old_word] = 0
+            word = int(np.argmin(deltas))
+            if deltas[word] >= 0:
+                continue
+            if free[word] >= widths[var]:
+                move(var, word)
+                improved = True
+                continue
+            # the target word is full: swap with the variable of it that lowers the total most, if one fits
+            others = np.flatnonzero(
+                (word_pos == word) & (widths <= free[old_word] + widths[var]) & (widths >= widths[var] - free[word])
+            )
+            if len(others) == 0:
+                continue
+            swap_deltas = get_swap_deltas(var, word, others)
+            if swap_deltas.min() < 0:
+                other = int(others[np.argmin(swap_deltas)])
+                move(var, word)
+                move(other, old_word)
+                improved = True
+        if not improved:
+            break
+    return word_pos
+
+
+def optimized_layout(widths: np.ndarray, op_offsets: np.ndarray, op_vars: np.ndarray) -> Layout:
+    clusters = cluster_variables(widths, op_offsets, op_vars)
+    cluster_ids, cluster_of_var = np.unique(clusters, return_inverse=True)
+    cluster_widths = np.bincount(cluster_of_var, weights=widths, minlength=len(cluster_ids)).astype(np.int64)
+    candidates = [
+        first_fit_decreasing(cluster_widths)[cluster_of_var],
+        first_fit_decreasing(widths),
+        sequential_layout(widths).word_pos,
+    ]
+    # the refinement keeps the number of words, so only the candidates with the fewest are refined
+    min_words = min(int(word_pos.max()) for word_pos in candidates)
+    best = None
+    for word_pos in candidates:
+        if int(word_pos.max()) > min_words:
+            continue
+        word_pos = refine_words(widths, word_pos, op_offsets, op_vars)
+        touched = int(count_touched_words(op_offsets, op_vars, word_pos).sum())
+        if best is None or touched < best[0]:
+            best = (touched, word_pos)
+    return place_in_words(widths, best[1])
+
+
+def spread_wide_variables(widths: np.ndarray, var_layout: Layout) -> Layout:
+    """
+    The variables wider than a word were placed as a full word, they take the following words as well, and the later
+    words are shifted.
+    """
+    wide = widths > WORD_BITS
+    if not wide.any():
+        return var_layout
+    extra_words = np.zeros(var_layout.num_words, dtype=np.int64)
+    extra_words[var_layout.word_pos[wide]] = (widths[wide] - 1) // WORD_BITS
+    shifts = np.cumsum(extra_words) - extra_words
+    return Layout(
+        var_layout.word_pos + shifts[var_layout.word_pos],
+        var_layout.b_start,
+        var_layout.num_words + int(extra_words.sum()),
+    )
+
+
+def get_layout(widths: np.ndarray, task: columnar.ColumnarTask, optimized: bool) -> Layout:
+    """
+    The layout of variables of the given widths in bits, the sequential one if not optimized. A variable wider than
+    a word, e.g. a domain of more than 64 values in the one-hot state, starts a word and takes as many as it needs.
+    """
+    word_widths = np.minimum(widths, WORD_BITS)
+    if optimized:
+        var_layout = optimized_layout(word_widths, *get_operator_vars(task))
+    else:
+        var_layout = sequential_layout(word_widths)
+    return spread_wide_variables(widths, var_layout)
+
+
+@dataclass
+class LayoutReport:
+    num_words: int
+    touched_words: float
+
+    def __str__(self) -> str:
+        return f"{self.num_words} words per state, {self.touched_words:.2f} words per operator"
+
+
+def get_layout_report(task: columnar.ColumnarTask, layout: Layout) -> LayoutReport:
+    op_offsets, op_vars = get_operator_vars(task)
+    touched = count_touched_words(op_offsets, op_vars, layout.word_pos)
+    return LayoutReport(layout.num_words, float(touched.mean()) if len(touched) else 0.0)
+
+
+def get_packed_widths(task: columnar.ColumnarTask) -> np.ndarray:
+    """
+    Bits of every variable in the packed state, at least one.
+    """
+    return np.array([max((size - 1).bit_length(), 1) for size in task.domain_sizes.tolist()], dtype=np.int64)
+
+
+def main():
+    for sas_file in sys.argv[1:]:
+        task = bulk_parse.BulkRootTask(sas_file).get_columnar_task()
+        for name, widths in (("packed", get_packed_widths(task)), ("ff", task.domain_sizes.astype(np.int64))):
+            before = get_layout_report(task, get_layout(widths, task, False))
+            start = time.perf_counter()
+            after = get_layout_report(task, get_layout(widths, task, True))
+            print(f"{sas_file} {name}: {before} -> {after} in {time.perf_counter() - start:.3f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,10 +2,13 @@
 import logging
 import sys
 
-from generate import constants, helpers
+import numpy as np
+
+from generate import columnar, constants, helpers
 
 
 class FactPair:
+    __slots__ = ("var", "value")
     var: int
     value: int
 
@@ -16,7 +19,13 @@ class FactPair:
     def __repr__(self):
         return f"(var: {self.var}, value: {self.value})"
 
-    # TODO: see if needed to add the remaining methods of FactPair and no_fact
+    def __eq__(self, other):
+        if not isinstance(other, FactPair):
+            return NotImplemented
+        return self.var == other.var and self.value == other.value
+
+    def __hash__(self):
+        return hash((self.var, self.value))
 
 
 class ExplicitVariable:
@@ -39,6 +48,7 @@ class ExplicitVariable:
 
 
 class ExplicitEffect:
+    __slots__ = ("fact", "conditions")
     fact: FactPair
     conditions: list[FactPair]
 
@@ -58,6 +68,7 @@ def read_facts(lines) -> list[FactPair]:
 
 
 class ExplicitOperator:
+    __slots__ = ("preconditions", "effects", "effect_preconditions", "cost", "name", "is_an_axiom")
     preconditions: list[FactPair]
     effects: list[ExplicitEffect]
     effect_preconditions: list[FactPair]
@@ -157,20 +168,21 @@ def read_mutexes_raw(lines, n_groups) -> list[list[FactPair]]:
     return mutexes_raw
 
 
-def read_mutexes(lines, variables: list[ExplicitVariable]) -> tuple[list[list[set[FactPair]]], list[list[FactPair]]]:
-    mutexes = []
-    for i, var in enumerate(variables):
-        mutexes.append([])
-        for _ in range(var.domain_size):
-            mutexes[i].append(set())
+def read_mutexes(lines, variables: list[ExplicitVariable]) -> tuple[list[list[list[int]]], list[list[FactPair]]]:
+    """
+    Reads the mutex groups, and for every fact the indices of the groups that contain it, in increasing order.
+    Two facts of different variables are mutex iff they share a group, so the pairs of a group are never built.
+    """
+    mutex_groups = [[[] for _ in range(var.domain_size)] for var in variables]
     num_mutex_groups = int(next(lines))
     mutexes_raw = read_mutexes_raw(lines, num_mutex_groups)
-    for invariant_group in mutexes_raw:
-        for fact1 in invariant_group:
-            for fact2 in invariant_group:
-                if fact1.var != fact2.var:
-                    mutexes[fact1.var][fact1.value].add(fact2)
-    return (mutexes, mutexes_raw)
+    for group_idx, invariant_group in enumerate(mutexes_raw):
+        for fact in invariant_group:
+            groups = mutex_groups[fact.var][fact.value]
+            # a fact listed twice in a group is indexed once
+            if not groups or groups[-1] != group_idx:
+                groups.append(group_idx)
+    return (mutex_groups, mutexes_raw)
 
 
 def read_goal(lines) -> list[FactPair]:
@@ -216,7 +228,7 @@ def read_action(lines, is_axiom: bool, use_metric: bool, variables: list[Explici
 
 class RootTask:
     variables: list[ExplicitVariable]
-    mutexes: list[list[set[FactPair]]]
+    mutex_groups: list[list[list[int]]]
     mutexes_raw: list[list[FactPair]]
     operators: list[ExplicitOperator]
     axioms: list[ExplicitOperator]
@@ -228,7 +240,7 @@ class RootTask:
         read_and_verify_version(lines)
         self.use_metrics = read_metric(lines)
         self.variables = read_variables(lines)
-        self.mutexes, self.mutexes_raw = read_mutexes(lines, self.variables)
+        self.mutex_groups, self.mutexes_raw = read_mutexes(lines, self.variables)
         num_variables = len(self.variables)
         self.initial_state_values = []
         helpers.check_magic(next(lines), "begin_state")
@@ -244,6 +256,40 @@ class RootTask:
 
         # TODO: axiom eval
 
+    def get_columnar_task(self) -> columnar.ColumnarTask:
+        def to_csr(fact_lists: list[list[FactPair]]) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+            offsets = columnar.lengths_to_offsets(np.array([len(facts) for facts in fact_lists], dtype=np.int64))
+            fact_vars = np.array([fact.var for facts in fact_lists for fact in facts], dtype=np.int64)
+            fact_vals = np.array([fact.value for facts in fact_lists for fact in facts], dtype=np.int64)
+            return offsets, fact_vars, fact_vals
+
+        effects = [op.effects for op in self.operators]
+        pre_offsets, pre_vars, pre_vals = to_csr([op.preconditions for op in self.operators])
+        eff_offsets, eff_vars, eff_vals = to_csr([[effect.fact for effect in op_effects] for op_effects in effects])
+        eff_cond_offsets, eff_cond_vars, eff_cond_vals = to_csr(
+            [effect.conditions for op_effects in effects for effect in op_effects])
+        mutex_offsets, mutex_vars, mutex_vals = to_csr(self.mutexes_raw)
+        _, goal_vars, goal_vals = to_csr([self.goals])
+        return columnar.ColumnarTask(
+            domain_sizes=np.array([var.domain_size for var in self.variables], dtype=np.int64),
+            initial_state=np.array(self.initial_state_values, dtype=np.int64),
+            goal_vars=goal_vars,
+            goal_vals=goal_vals,
+            costs=np.array([op.cost for op in self.operators], dtype=np.int64),
+            pre_offsets=pre_offsets,
+            pre_vars=pre_vars,
+            pre_vals=pre_vals,
+            eff_offsets=eff_offsets,
+            eff_vars=eff_vars,
+            eff_vals=eff_vals,
+            eff_cond_offsets=eff_cond_offsets,
+            eff_cond_vars=eff_cond_vars,
+            eff_cond_vals=eff_cond_vals,
+            mutex_offsets=mutex_offsets,
+            mutex_vars=mutex_vars,
+            mutex_vals=mutex_vals,
+        )
+
     def _get_variable(self, var: int) -> ExplicitVariable:
         assert helpers.in_bounds(var, self.variables)
         return self.variables[var]
@@ -284,21 +330,24 @@ class RootTask:
         if fact1.var == fact2.var:
             # Same variable: mutex iff different value.
             return fact1.value != fact2.value
-        assert helpers.in_bounds(fact1.var, self.mutexes)
-        assert helpers.in_bounds(fact1.value, self.mutexes[fact1.var])
-        return fact2 in self.mutexes[fact1.var][fact1.value]
+        assert helpers.in_bounds(fact1.var, self.mutex_groups)
+        assert helpers.in_bounds(fact1.value, self.mutex_groups[fact1.var])
+        return not set(self.mutex_groups[fact1.var][fact1.value]).isdisjoint(
+            self.mutex_groups[fact2.var][fact2.value])
 
     def get_operator_mutexes(self, op_index: int) -> list[FactPair]:
-        mutexes = set()
+        """
+        Facts of other variables that share a mutex group with one of the effects of the operator, in order of
+        first appearance.
+        """
+        mutexes: dict[FactPair, None] = {}
         n_effects = self.get_num_operator_effects(op_index, False)
-        # print(f"mutexes for action {op_index}")
         for fact_idx in range(n_effects):
-            fact = self.get_operator_effect(op_index, fact_idx, False)
-            # print("effect:", fact.var, fact.value)
-            fact_mutexes = self.mutexes[fact.var][fact.value]
-            # print(fact_mutexes)
-            mutexes.update(fact_mutexes)
-        # print("---------")
+            effect = self.get_operator_effect(op_index, fact_idx, False)
+            for group_idx in self.mutex_groups[effect.var][effect.value]:
+                for fact in self.mutexes_raw[group_idx]:
+                    if fact.var != effect.var:
+                        mutexes.setdefault(fact)
         return list(mutexes)
 
     def get_operator_cost(self, index: int, is_axiom: bool) -> int:
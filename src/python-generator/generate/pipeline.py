@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+"""
+Parallel code emission.
+
+The generated files are described as a list of parts: fixed strings, functions writing code that does not
+depend on the operators, and per-operator code. The per-operator code is split into chunks of operators that are
+written by a pool of worker processes into temporary part files, which are then concatenated in order. All code
+is streamed to the files through helpers.CodeWriter. The task and its encoding are stored in a module global before the
+pool is created, so forked workers inherit them instead of receiving a pickled copy with every job.
+"""
+import concurrent.futures
+import glob
+import multiprocessing
+import os
+import shutil
+import tempfile
+from dataclasses import dataclass, field
+from typing import Callable, Collection, Optional, Union
+
+import numpy as np
+
+from generate import columnar, helpers, representations
+
+# the smallest number of operators worth sending to a worker
+MIN_CHUNK_SIZE = 64
+# chunks per worker and chunked part, so that workers that finish early can pick up more work
+CHUNKS_PER_JOB = 4
+
+
+@dataclass
+class GeneratorOptions:
+    # number of functions/files the per-operator code is split into, 1 keeps everything in a single function
+    shards: int = 1
+    # tree: find the applicable operators with a decision tree over the state variables, bitset: test the
+    # operators in bulk with mask arrays grouped by state word, linear: test the preconditions of every operator
+    successor_generator: str = "tree"
+    # relaxed exploration of the FF heuristic, layers: test every operator in every layer (build_next_layer),
+    # counters: count the unsatisfied preconditions of the operators, see planner/ff_heuristic.cpp
+    ff_exploration: str = "layers"
+    # default heuristic of the planner, ff, add, max or goal-count, see planner/heuristics.h; all of them are
+    # compiled, so the planner can still select another with --h
+    heuristic: str = "ff"
+    # remove the unreachable and irrelevant operators and the variables without relevant facts, see pruning.py
+    pruning: bool = True
+    # placement of the variables in the words of the packed and FF states, optimized or sequential (file order),
+    # see layout.py
+    layout: str = "optimized"
+
+
+@dataclass
+class GenerationContext:
+    """
+    Everything the emitters need, built once in the parent process.
+    """
+    task: columnar.ColumnarTask
+    var_infos: list[representations.VarInfo]
+    ff_var_infos: list[representations.VarInfo]
+    encoding: representations.OperatorEncoding
+    mutex_checks: representations.MutexChecks
+    options: GeneratorOptions = field(default_factory=GeneratorOptions)
+
+    @classmethod
+    def build(
+        cls,
+        task: columnar.ColumnarTask,
+        var_infos: list[representations.VarInfo],
+        ff_var_infos: list[representations.VarInfo],
+        options: Optional[GeneratorOptions] = None,
+    ) -> "GenerationContext":
+        encoding = representations.encode_operators(task, var_infos, ff_var_infos)
+        mutex_checks = representations.encode_operator_mutexes(*task.get_operator_mutexes(), encoding, var_infos)
+        return cls(task, var_infos, ff_var_infos, encoding, mutex_checks, options or GeneratorOptions())
+
+    @property
+    def num_operators(self) -> int:
+        return self.task.num_operators
+
+    @property
+    def state_length(self) -> int:
+        return self.encoding.state_length
+
+    def get_shards(self) -> list[tuple[int, int]]:
+        """
+        Operator ranges of the shards, at least one operator per shard.
+        """
+        n_shards = max(1, min(self.options.shards, self.num_operators))
+        bounds = np.linspace(0, self.num_operators, n_shards + 1).astype(int).tolist()
+        return list(zip(bounds[:-1], bounds[1:]))
+
+    @property
+    def is_sharded(self) -> bool:
+        return len(self.get_shards()) > 1
+
+
+# writes the code of the operators start, ..., stop - 1
+OperatorEmitter = Callable[[GenerationContext, helpers.CodeWriter, int, int], None]
+# writes code that does not depend on the operators, e.g. the goal test
+CodeEmitter = Callable[[helpers.CodeWriter], None]
+
+
+@dataclass
+class OperatorChunks:
+    """
+    Per-operator code of a file for the operators start, ..., stop - 1, by default all operators.
+    The emitter must be a module level function so that it can be sent to workers.
+    """
+    emitter: OperatorEmitter
+    start: int = 0
+    stop: Optional[int] = None
+
+    def get_range(self, context: GenerationContext) -> tuple[int, int]:
+        return self.start, context.num_operators if self.stop is None else self.stop
+
+
+Part = Union[str, CodeEmitter, OperatorChunks]
+
+
+@dataclass
+class OutputFile:
+    name: str
+    parts: list[Part]
+
+
+@dataclass
+class ShardedFunction:
+    """
+    A function whose per-operator code is split over the shards. Shard k defines function.name + "_k" with the
+    code of its operators, or with the parts returned by make_body(start, stop) for bodies that are more than a
+    sequence of per-operator code. The dispatcher calling the shards is written by the generator.
+    """
+    function: helpers.FunctionStr
+    emitter: Optional[OperatorEmitter] = None
+    make_body: Optional[Callable[[int, int], list[Part]]] = None
+
+    def get_body(self, start: int, stop: int) -> list[Part]:
+        if self.make_body is not None:
+            return self.make_body(start, stop)
+        assert self.emitter is not None
+        return [OperatorChunks(self.emitter, start, stop)]
+
+    def make_declarations(self, context: GenerationContext) -> str:
+        return "".join(self.function.make_shard(k).make_declaration() for k in range(len(context.get_shards())))
+
+    def make_sequence_str(self, context: GenerationContext) -> str:
+        """
+        Calls all shards in order.
+        """
+        return "".join(
+            self.function.make_shard(k).make_call() + ";\n" for k in range(len(context.get_shards()))
+        )
+
+    def make_range_dispatch_str(self, context: GenerationContext, index_name: str) -> str:
+        """
+        Calls the shard containing the operator index_name, the function returns nothing.
+        """
+        res = []
+        shards = context.get_shards()
+        for shard_idx, (_, stop) in enumerate(shards):
+            call = f"{self.function.make_shard(shard_idx).make_call()};\nreturn;"
+            if shard_idx < len(shards) - 1:
+                res.append(f"if ({index_name} < {stop}) {{\n{call}\n}}\n")
+            else:
+                res.append(call + "\n")
+        return "".join(res)
+
+
+def get_shard_files(
+    context: GenerationContext, file_name: str, prelude: str, functions: list[ShardedFunction]
+) -> list[OutputFile]:
+    """
+    One file per shard, e.g. action_0.cpp, action_1.cpp, ... for action.cpp.
+    """
+    base_name, extension = os.path.splitext(file_name)
+    files = []
+    for shard_idx, (start, stop) in enumerate(context.get_shards()):
+        parts: list[Part] = [prelude]
+        for sharded in functions:
+            shard_function = sharded.function.make_shard(shard_idx)
+            parts += [
+                shard_function.make_header(),
+                *sharded.get_body(start, stop),
+                shard_function.make_footer(),
+                "\n",
+            ]
+        files.append(OutputFile(f"{base_name}_{shard_idx}{extension}", parts))
+    return files
+
+
+_CONTEXT: Optional[GenerationContext] = None
+
+
+def _set_context(context: GenerationContext):
+    global _CONTEXT
+    _CONTEXT = context
+
+
+def _emit_chunk(emitter: OperatorEmitter, start: int, stop: int, part_path: str):
+    assert _CONTEXT is not None
+    with helpers.CodeWriter.open(part_path) as writer:
+        emitter(_CONTEXT, writer, start, stop)
+
+
+def split_range(start: int, stop: int, chunk_size: int) -> list[tuple[int, int]]:
+    return [(chunk_start, min(chunk_start + chunk_size, stop)) for chunk_start in range(start, stop, chunk_size)]
+
+
+def remove_stale_shards(output_dir: str, file_names: list[str], keep: Collection[str] = ()):
+    """
+    Removes the shard files of a previous run, which could have used more shards, except the files named in keep.
+    """
+    for file_name in file_names:
+        base_name, extension = os.path.splitext(file_name)
+        for path in glob.glob(os.path.join(output_dir, f"{base_name}_[0-9]*{extension}")):
+            if os.path.basename(path) not in keep:
+                os.remove(path)
+
+
+def _make_executor(context: GenerationContext, jobs: int) -> concurrent.futures.ProcessPoolExecutor:
+    if "fork" in multiprocessing.get_all_start_methods():
+        _set_context(context)
+        return concurrent.futures.ProcessPoolExecutor(max_workers=jobs, mp_context=multiprocessing.get_context("fork"))
+    # without fork, each worker gets one copy of the context when it starts
+    return concurrent.futures.ProcessPoolExecutor(max_workers=jobs, initializer=_set_context, initargs=(context,))
+
+
+def write_files(context: GenerationContext, files: list[OutputFile], output_dir: str, jobs: int):
+    """
+    Writes the files to output_dir, rendering the per-operator parts with jobs worker processes.
+    Exceptions raised by the workers are re-raised here.
+    """
+    if jobs <= 1 or context.num_operators < 2 * MIN_CHUNK_SIZE:
+        _write_files_sequential(context, files, output_dir)
+        return
+
+    chunk_size = max(MIN_CHUNK_SIZE, -(-context.num_operators // (jobs * CHUNKS_PER_JOB)))
+    with tempfile.TemporaryDirectory(dir=output_dir) as part_dir:
+        part_paths: dict[tuple[int, int], list[str]] = {}
+        executor = _make_executor(context, jobs)
+        try:
+            futures = []
+            for file_idx, output_file in enumerate(files):
+                for part_idx, part in enumerate(output_file.parts):
+                    if not isinstance(part, OperatorChunks):
+                        continue
+                    paths = part_paths.setdefault((file_idx, part_idx), [])
+                    for start, stop in split_range(*part.get_range(context), chunk_size):
+                        paths.append(os.path.join(part_dir, f"{file_idx}_{part_idx}_{len(paths)}"))
+                        futures.append(executor.submit(_emit_chunk, part.emitter, start, stop, paths[-1]))
+            for future in concurrent.futures.as_completed(futures):
+                # raises the worker's exception, if any
+                future.result()
+        except BaseException:
+            executor.shutdown(wait=True, cancel_futures=True)
+            raise
+        executor.shutdown(wait=True)
+
+        for file_idx, output_file in enumerate(files):
+            with helpers.CodeWriter.open(os.path.join(output_dir, output_file.name)) as writer:
+                for part_idx, part in enumerate(output_file.parts):
+                    if isinstance(part, OperatorChunks):
+                        for path in part_paths[(file_idx, part_idx)]:
+                            with open(path) as part_file:
+                                shutil.copyfileobj(part_file, writer.file)
+                    else:
+                        _write_part(writer, part)
+
+
+def _write_part(writer: helpers.CodeWriter, part: Union[str, CodeEmitter]):
+    if isinstance(part, str):
+        writer.write(part)
+    else:
+        part(writer)
+
+
+def _write_files_sequential(context: GenerationContext, files: list[OutputFile], output_dir: str):
+    for output_file in files:
+        with helpers.CodeWriter.open(os.path.join(output_dir, output_file.name)) as writer:
+            for part in output_file.parts:
+                if isinstance(part, OperatorChunks):
+                    part.emitter(context, writer, *part.get_range(context))
+                else:
+                    _write_part(writer, part)
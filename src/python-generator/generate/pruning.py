@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Static pruning of the task before the code is generated.
+
+Reachability: the relaxed exploration from the initial state, where an operator is applied once all its
+preconditions are reached, and its effects are reached without deleting anything. An operator that is not applied
+is never applicable in a reachable state, and neither in the relaxed exploration of one, so removing it changes
+neither the search nor the heuristics.
+
+Relevance: backward from the goal, a fact is relevant if it is a goal fact, or a precondition or effect condition
+of a relevant operator, and a reachable operator is relevant if one of its effects is relevant. An operator whose
+effects are all irrelevant only sets variables to values that nothing requires, so a plan is still a plan without
+it, and the relaxed plans and costs of the relevant facts do not depend on it. The variables without relevant facts
+are removed, with the effects on them.
+
+Both are fixpoints computed with whole-array operations on the operator tables, one iteration per layer.
+"""
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+
+from generate import columnar
+
+
+@dataclass
+class PruningReport:
+    num_operators: int
+    num_unreachable: int
+    num_irrelevant: int
+    num_variables: int
+    num_useless_variables: int
+    # why the task was not pruned
+    skipped_reason: Optional[str] = None
+
+    def __str__(self) -> str:
+        if self.skipped_reason:
+            return f"Pruning: {self.skipped_reason}, nothing pruned"
+        num_pruned = self.num_unreachable + self.num_irrelevant
+        return (
+            f"Pruning: removed {num_pruned} of {self.num_operators} operators "
+            f"({self.num_unreachable} unreachable, {self.num_irrelevant} irrelevant) "
+            f"and {self.num_useless_variables} of {self.num_variables} variables"
+        )
+
+
+def get_reachable_operators(task: columnar.ColumnarTask) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Operators applied and facts reached in the relaxed exploration from the initial state, as boolean arrays.
+    """
+    pre_ops = task.pre_op_ids()
+    pre_ids = task.fact_ids(task.pre_vars, task.pre_vals)
+    eff_ops = task.eff_op_ids()
+    eff_ids = task.fact_ids(task.eff_vars, task.eff_vals)
+    reached = np.zeros(task.num_facts, dtype=bool)
+    reached[task.fact_ids(np.arange(task.num_variables), task.initial_state)] = True
+    applied = np.zeros(task.num_operators, dtype=bool)
+    while True:
+        n_unreached = np.bincount(pre_ops[~reached[pre_ids]], minlength=task.num_operators)
+        new_ops = (n_unreached == 0) & ~applied
+        if not new_ops.any():
+            return applied, reached
+        applied |= new_ops
+        reached[eff_ids[new_ops[eff_ops]]] = True
+
+
+def get_relevant_operators(task: columnar.ColumnarTask, reachable: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Reachable operators with a relevant effect and the relevant facts, as boolean arrays.
+    """
+    pre_ops = task.pre_op_ids()
+    pre_ids = task.fact_ids(task.pre_vars, task.pre_vals)
+    eff_ops = task.eff_op_ids()
+    eff_ids = task.fact_ids(task.eff_vars, task.eff_vals)
+    cond_ops = eff_ops[np.repeat(np.arange(len(eff_ops)), np.diff(task.eff_cond_offsets))]
+    cond_ids = task.fact_ids(task.eff_cond_vars, task.eff_cond_vals)
+    relevant_facts = np.zeros(task.num_facts, dtype=bool)
+    relevant_facts[task.fact_ids(task.goal_vars, task.goal_vals)] = True
+    relevant = np.zeros(task.num_operators, dtype=bool)
+    while True:
+        n_relevant_effects = np.bincount(eff_ops[relevant_facts[eff_ids]], minlength=task.num_operators)
+        new_ops = (n_relevant_effects > 0) & reachable & ~relevant
+        if not new_ops.any():
+            return relevant, relevant_facts
+        relevant |= new_ops
+        relevant_facts[pre_ids[new_ops[pre_ops]]] = True
+        relevant_facts[cond_ids[new_ops[cond_ops]]] = True
+
+
+def _restrict_csr(
+    offsets: np.ndarray, row_mask: np.ndarray, entry_mask: np.ndarray
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Offsets of the CSR rows of row_mask with the entries of entry_mask, and the mask of the entries kept.
+    """
+    rows = np.repeat(np.arange(len(offsets) - 1), np.diff(offsets))
+    kept = row_mask[rows] & entry_mask
+    return columnar.lengths_to_offsets(np.bincount(rows[kept], minlength=len(offsets) - 1)[row_mask]), kept
+
+
+def restrict_task(
+    task: columnar.ColumnarTask, kept_ops: np.ndarray, kept_vars: np.ndarray
+) -> columnar.ColumnarTask:
+    """
+    The task with the operators and variables of the boolean masks, the other variables are renumbered in order.
+    The preconditions and effect conditions of the kept operators must be on kept variables.
+    """
+    var_ids = np.cumsum(kept_vars) - 1
+    pre_offsets, pre_kept = _restrict_csr(task.pre_offsets, kept_ops, np.ones(len(task.pre_vars), dtype=bool))
+    assert kept_vars[task.pre_vars[pre_kept]].all()
+    eff_offsets, eff_kept = _restrict_csr(task.eff_offsets, kept_ops, kept_vars[task.eff_vars])
+    eff_cond_offsets, cond_kept = _restrict_csr(
+        task.eff_cond_offsets, eff_kept, np.ones(len(task.eff_cond_vars), dtype=bool))
+    assert kept_vars[task.eff_cond_vars[cond_kept]].all()
+    mutex_offsets, mutex_kept = _restrict_csr(
+        task.mutex_offsets, np.ones(len(task.mutex_offsets) - 1, dtype=bool), kept_vars[task.mutex_vars])
+    return columnar.ColumnarTask(
+        domain_sizes=task.domain_sizes[kept_vars],
+        initial_state=task.initial_state[kept_vars],
+        goal_vars=var_ids[task.goal_vars],
+        goal_vals=task.goal_vals,
+        costs=task.costs[kept_ops],
+        pre_offsets=pre_offsets,
+        pre_vars=var_ids[task.pre_vars[pre_kept]],
+        pre_vals=task.pre_vals[pre_kept],
+        eff_offsets=eff_offsets,
+        eff_vars=var_ids[task.eff_vars[eff_kept]],
+        eff_vals=task.eff_vals[eff_kept],
+        eff_cond_offsets=eff_cond_offsets,
+        eff_cond_vars=var_ids[task.eff_cond_vars[cond_kept]],
+        eff_cond_vals=task.eff_cond_vals[cond_kept],
+        mutex_offsets=mutex_offsets,
+        mutex_vars=var_ids[task.mutex_vars[mutex_kept]],
+        mutex_vals=task.mutex_vals[mutex_kept],
+        original_operator_ids=task.original_operator_ids[kept_ops],
+    )
+
+
+def prune_task(task: columnar.ColumnarTask, has_axioms: bool) -> tuple[columnar.ColumnarTask, PruningReport]:
+    """
+    Removes the unreachable and irrelevant operators and the variables without relevant facts. The task is
+    returned unchanged if the goal is not reachable, the search then finds no plan anyway, or if the task has
+    axioms: the derived facts are not reached through operators, so neither analysis holds.
+    """
+    def skip(reason: str) -> tuple[columnar.ColumnarTask, PruningReport]:
+        return task, PruningReport(task.num_operators, 0, 0, task.num_variables, 0, reason)
+
+    if has_axioms:
+        return skip("the task has axioms")
+    reachable, reached = get_reachable_operators(task)
+    if not reached[task.fact_ids(task.goal_vars, task.goal_vals)].all():
+        return skip("the goal is not reachable in the relaxed task")
+    relevant, relevant_facts = get_relevant_operators(task, reachable)
+    fact_vars = np.repeat(np.arange(task.num_variables), task.domain_sizes)
+    kept_vars = np.bincount(fact_vars[relevant_facts], minlength=task.num_variables) > 0
+    report = PruningReport(
+        num_operators=task.num_operators,
+        num_unreachable=int((~reachable).sum()),
+        num_irrelevant=int((reachable & ~relevant).sum()),
+        num_variables=task.num_variables,
+        num_useless_variables=int((~kept_vars).sum()),
+    )
+    return restrict_task(task, relevant, kept_vars), report
@@ -1,9 +1,9 @@
 #!/usr/bin/env python3
-from dataclasses import dataclass, field
+from dataclasses import dataclass
 
 import numpy as np
 
-from generate import parse
+from generate import columnar, layout
 
 
 @dataclass
@@ -16,23 +16,15 @@ class VarInfo:
     mask_set: np.uint64
 
 
-def get_var_infos(root_task: parse.RootTask) -> list[VarInfo]:
+def make_var_infos(widths: np.ndarray, var_layout: layout.Layout) -> list[VarInfo]:
     """
-    Gets the information about the variables in the bit state.
+    Gets the information about the variables of the given widths in bits at their place in the layout.
     """
     var_infos: list[VarInfo] = []
-    index = 0
-    word_pos = 0
-
-    for i in range(root_task.get_num_variables()):
-        n = 1
-        while (1 << n) < root_task.get_variable_domain_size(i):
-            n += 1
-        if index + n > 64:
-            index = 0
-            word_pos += 1
-        # mask to get the values of the variable's bits
-        mask_get: np.uint64 = np.uint64(((1 << n) - 1) << index)
+    for n, index, word_pos in zip(widths.tolist(), var_layout.b_start.tolist(), var_layout.word_pos.tolist()):
+        # mask to get the values of the variable's bits, in its first word if it is wider than a word (a one-hot
+        # variable with more than 64 values)
+        mask_get: np.uint64 = np.uint64(((1 << min(n, layout.WORD_BITS - index)) - 1) << index)
         # mask to clear the values of the variable's bits
         mask_set: np.uint64 = ~mask_get
         var_info = VarInfo(
@@ -44,75 +36,351 @@ def get_var_infos(root_task: parse.RootTask) -> list[VarInfo]:
             mask_set=mask_set
         )
         var_infos.append(var_info)
-        index += n
-
     return var_infos
 
 
+def get_var_infos(task: columnar.ColumnarTask, optimized_layout: bool = True) -> list[VarInfo]:
+    """
+    Gets the information about the variables in the bit state, where a variable with n values takes the bits needed to
+    write n - 1. The variables are placed by generate/layout.py, in file order if not optimized_layout.
+    """
+    widths = layout.get_packed_widths(task)
+    return make_var_infos(widths, layout.get_layout(widths, task, optimized_layout))
+
+
+def get_state_length(var_infos: list[VarInfo]) -> int:
+    return max(var_info.word_pos + var_info.b_end // layout.WORD_BITS for var_info in var_infos) + 1
+
+
+@dataclass
+class VarInfoArrays:
+    """
+    The fields of a list of VarInfo as arrays indexed by variable, for vectorized encoding.
+    """
+    b_start: np.ndarray
+    b_length: np.ndarray
+    word_pos: np.ndarray
+    mask_get: np.ndarray
+
+    @classmethod
+    def from_var_infos(cls, var_infos: list[VarInfo]) -> "VarInfoArrays":
+        return cls(
+            b_start=np.array([v.b_start for v in var_infos], dtype=np.uint64),
+            b_length=np.array([v.b_length for v in var_infos], dtype=np.uint64),
+            word_pos=np.array([v.word_pos for v in var_infos], dtype=np.int64),
+            mask_get=np.array([v.mask_get for v in var_infos], dtype=np.uint64),
+        )
+
+    def packed_values(self, fact_vars: np.ndarray, fact_vals: np.ndarray) -> np.ndarray:
+        """
+        Values of the facts shifted to the position of their variable in the packed word.
+        """
+        value_mask = (np.uint64(1) << self.b_length[fact_vars]) - np.uint64(1)
+        return (fact_vals.astype(np.uint64) & value_mask) << self.b_start[fact_vars]
+
+    def one_hot_positions(self, fact_vars: np.ndarray, fact_vals: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Word and bit of the facts in the one-hot (FF) layout, where the variable has one bit per value. The values
+        of a variable wider than a word continue in the following words.
+        """
+        bit_index = fact_vals.astype(np.uint64) + self.b_start[fact_vars]
+        words = self.word_pos[fact_vars] + (bit_index // np.uint64(layout.WORD_BITS)).astype(np.int64)
+        return words, np.uint64(1) << (bit_index % np.uint64(layout.WORD_BITS))
+
+
+def encode_facts(
+    fact_vars: np.ndarray, fact_vals: np.ndarray, var_infos: list[VarInfo]
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Mask and value per state word of a conjunction of facts, e.g. the goal.
+    """
+    arrays = VarInfoArrays.from_var_infos(var_infos)
+    mask = np.zeros(get_state_length(var_infos), dtype=np.uint64)
+    val = np.zeros_like(mask)
+    words = arrays.word_pos[fact_vars]
+    np.bitwise_or.at(mask, words, arrays.mask_get[fact_vars])
+    np.bitwise_or.at(val, words, arrays.packed_values(fact_vars, fact_vals))
+    return mask, val
+
+
+def encode_one_hot_facts(fact_vars: np.ndarray, fact_vals: np.ndarray, ff_var_infos: list[VarInfo]) -> np.ndarray:
+    arrays = VarInfoArrays.from_var_infos(ff_var_infos)
+    mask = np.zeros(get_state_length(ff_var_infos), dtype=np.uint64)
+    np.bitwise_or.at(mask, *arrays.one_hot_positions(fact_vars, fact_vals))
+    return mask
+
+
+# the most packed bits that a lookup table of the state conversion is indexed by, so a table has at most 256 entries
+CONVERSION_CHUNK_BITS = 8
+
+
+@dataclass
+class StateConversion:
+    """
+    The tables of convert_state_to_multi_valued, which sets the one-hot (FF) state and the facts of the first layer
+    from a packed state, in the task file for the table-driven planner or in the generated ff_graph.cpp.
+
+    The variables of a one-hot word are grouped into chunks, runs of variables in at most CONVERSION_CHUNK_BITS bits
+    of the same packed word. The chunks of one-hot word w are the rows word_offsets[w], ...,
+    word_offsets[w + 1] - 1 of chunks, one row of (word, shift, mask, first entry) per chunk: the one-hot bits of the
+    chunk are bits[first entry + ((state[word] >> shift) & mask)], a lookup table with an entry per combination of
+    the values, so the bits of a word are collected with a lookup per chunk. The facts are then found from the bits
+    that are set, bit_facts has the fact of each one-hot bit.
+
+    The variables with more than 64 values take several one-hot words, they are the rows of the extra last word,
+    one row of (word, shift, mask, one-hot bit) per variable: the bit of the value is one-hot bit + value, counted
+    from bit 0 of word 0.
+    """
+    word_offsets: np.ndarray
+    chunks: np.ndarray
+    bits: np.ndarray
+    bit_facts: np.ndarray
+
+
+def get_conversion_bits(
+    task: columnar.ColumnarTask, arrays: VarInfoArrays, ff_arrays: VarInfoArrays, chunk_vars: list[int]
+) -> np.ndarray:
+    """
+    The lookup table of a chunk: the one-hot bits for each index (state[word] >> shift) & mask, where shift is the
+    first bit of the chunk. The entries with values that are out of the domain of a variable have no bit for it.
+    """
+    shift = arrays.b_start[chunk_vars[0]]
+    span = arrays.b_start[chunk_vars[-1]] + arrays.b_length[chunk_vars[-1]] - shift
+    index = np.arange(1 << int(span), dtype=np.uint64)
+    bits = np.zeros_like(index)
+    for var in chunk_vars:
+        value = (index >> (arrays.b_start[var] - shift)) & ((np.uint64(1) << arrays.b_length[var]) - np.uint64(1))
+        is_value = value < np.uint64(task.domain_sizes[var])
+        one_hot_bit = np.where(is_value, value + ff_arrays.b_start[var], np.uint64(0))
+        bits |= np.where(is_value, np.uint64(1) << one_hot_bit, np.uint64(0))
+    return bits
+
+
+def get_state_conversion(
+    task: columnar.ColumnarTask, var_infos: list[VarInfo], ff_var_infos: list[VarInfo]
+) -> StateConversion:
+    arrays = VarInfoArrays.from_var_infos(var_infos)
+    ff_arrays = VarInfoArrays.from_var_infos(ff_var_infos)
+    ff_state_length = get_state_length(ff_var_infos)
+    assert ff_state_length * layout.WORD_BITS < 2**31 and task.num_facts < 2**31
+    is_wide = task.domain_sizes > layout.WORD_BITS
+    row_words = np.where(is_wide, ff_state_length, ff_arrays.word_pos)
+
+    # the one-hot bit of every fact, counted from bit 0 of word 0, the facts are ordered by variable and value
+    fact_vars = np.repeat(np.arange(task.num_variables), task.domain_sizes)
+    fact_vals = np.arange(task.num_facts) - task.fact_offsets[fact_vars]
+    fact_bits = ff_arrays.word_pos[fact_vars] * layout.WORD_BITS + ff_arrays.b_start[fact_vars].astype(np.int64)
+    bit_facts = np.zeros(ff_state_length * layout.WORD_BITS, dtype=np.int64)
+    bit_facts[fact_bits + fact_vals] = np.arange(task.num_facts)
+
+    # the variables of each one-hot word by packed word and bit, so that the chunks are runs of variables
+    chunk_vars: list[list[int]] = []
+    for var in np.lexsort((arrays.b_start, arrays.word_pos, row_words)).tolist():
+        if is_wide[var]:
+            break
+        first = chunk_vars[-1][0] if chunk_vars else -1
+        if (
+            first != -1
+            and row_words[var] == row_words[first]
+            and arrays.word_pos[var] == arrays.word_pos[first]
+            and int(arrays.b_start[var] + arrays.b_length[var]) - int(arrays.b_start[first]) <= CONVERSION_CHUNK_BITS
+        ):
+            chunk_vars[-1].append(var)
+        else:
+            chunk_vars.append([var])
+
+    rows: list[tuple[int, int, int, int]] = []
+    bits: list[np.ndarray] = []
+    num_entries = 0
+    for vars_ in chunk_vars:
+        bits.append(get_conversion_bits(task, arrays, ff_arrays, vars_))
+        rows.append((
+            int(arrays.word_pos[vars_[0]]), int(arrays.b_start[vars_[0]]), len(bits[-1]) - 1, num_entries
+        ))
+        num_entries += len(bits[-1])
+    for var in np.flatnonzero(is_wide).tolist():
+        rows.append((
+            int(arrays.word_pos[var]),
+            int(arrays.b_start[var]),
+            (1 << int(arrays.b_length[var])) - 1,
+            int(fact_bits[task.fact_offsets[var]]),
+        ))
+    chunk_words = [int(row_words[vars_[0]]) for vars_ in chunk_vars] + [ff_state_length] * int(is_wide.sum())
+    word_sizes = np.bincount(np.array(chunk_words, dtype=np.int64), minlength=ff_state_length + 1)
+    return StateConversion(
+        columnar.lengths_to_offsets(word_sizes),
+        np.array(rows, dtype=np.int64).reshape(-1, 4),
+        np.concatenate(bits) if bits else np.zeros(0, dtype=np.uint64),
+        bit_facts,
+    )
+
+
 @dataclass
-class OperatorPair:
-    mask: np.uint64
-    val: np.uint64
+class OperatorEncoding:
+    """
+    Packed representation of all operators, one row per operator and one column per state word.
+
+    An operator is applicable if (state[w] & pre_mask[op, w]) == pre_val[op, w] for all words, words
+    without preconditions have pre_mask 0. The successor is (state[w] & eff_mask[op, w]) | eff_val[op, w],
+    words without effects have eff_mask ~0. ff_pre and ff_eff are the precondition and effect bits in the
+    one-hot layout of the FF heuristic.
+    """
+    pre_mask: np.ndarray
+    pre_val: np.ndarray
+    eff_mask: np.ndarray
+    eff_val: np.ndarray
+    ff_pre: np.ndarray
+    ff_eff: np.ndarray
+
+    @property
+    def num_operators(self) -> int:
+        return self.pre_mask.shape[0]
+
+    @property
+    def state_length(self) -> int:
+        return self.pre_mask.shape[1]
+
+    @property
+    def ff_state_length(self) -> int:
+        return self.ff_pre.shape[1]
+
+
+ALL_ONES = np.uint64(0xFFFFFFFFFFFFFFFF)
+
+
+def encode_operators(
+    task: columnar.ColumnarTask, var_infos: list[VarInfo], ff_var_infos: list[VarInfo]
+) -> OperatorEncoding:
+    """
+    Computes the packed and one-hot masks of all operators at once.
+    """
+    arrays = VarInfoArrays.from_var_infos(var_infos)
+    ff_arrays = VarInfoArrays.from_var_infos(ff_var_infos)
+    shape = (task.num_operators, get_state_length(var_infos))
+    ff_shape = (task.num_operators, get_state_length(ff_var_infos))
+
+    # we make the assumption that the same bit region in a word is only modified once i.e.
+    # a variable fact only appears once in the precond and in the effect, so the bits can be or-ed in
+    pre_ops = task.pre_op_ids()
+    pre_mask = np.zeros(shape, dtype=np.uint64)
+    pre_val = np.zeros(shape, dtype=np.uint64)
+    pre_words = arrays.word_pos[task.pre_vars]
+    np.bitwise_or.at(pre_mask, (pre_ops, pre_words), arrays.mask_get[task.pre_vars])
+    np.bitwise_or.at(pre_val, (pre_ops, pre_words), arrays.packed_values(task.pre_vars, task.pre_vals))
+
+    eff_ops = task.eff_op_ids()
+    eff_mask = np.full(shape, ALL_ONES, dtype=np.uint64)
+    eff_val = np.zeros(shape, dtype=np.uint64)
+    eff_words = arrays.word_pos[task.eff_vars]
+    np.bitwise_and.at(eff_mask, (eff_ops, eff_words), ~arrays.mask_get[task.eff_vars])
+    np.bitwise_or.at(eff_val, (eff_ops, eff_words), arrays.packed_values(task.eff_vars, task.eff_vals))
+
+    # for ff heuristic, since we use n bits to represent n values in the domain of the variable,
+    # we only need one bit per fact, and one uint64 for both the mask and the value
+    ff_pre = np.zeros(ff_shape, dtype=np.uint64)
+    ff_eff = np.zeros(ff_shape, dtype=np.uint64)
+    ff_pre_words, ff_pre_bits = ff_arrays.one_hot_positions(task.pre_vars, task.pre_vals)
+    np.bitwise_or.at(ff_pre, (pre_ops, ff_pre_words), ff_pre_bits)
+    ff_eff_words, ff_eff_bits = ff_arrays.one_hot_positions(task.eff_vars, task.eff_vals)
+    np.bitwise_or.at(ff_eff, (eff_ops, ff_eff_words), ff_eff_bits)
+
+    return OperatorEncoding(pre_mask, pre_val, eff_mask, eff_val, ff_pre, ff_eff)
 
 
 @dataclass
-class OperatorRepr:
-    preconds: dict[int, OperatorPair] = field(default_factory=dict)
-    effects: dict[int, OperatorPair] = field(default_factory=dict)
-
-
-def get_op_rep(root_task: parse.RootTask, var_infos: list[VarInfo], op_index: int) -> OperatorRepr:
-    op_rep = OperatorRepr()
-    preconds = [root_task.get_operator_precondition(op_index, precond_ind, False) for precond_ind in range(
-        root_task.get_num_operator_preconditions(op_index, False))]
-
-    for precond in preconds:
-        precond_mask = np.uint64(0)
-        precond_val = np.uint64(0)
-        var_info = var_infos[precond.var]
-        state_ind = var_info.word_pos
-
-        # if mask and val are defined then modify them rather than make new
-        if state_ind in op_rep.preconds:
-            precond_mask = op_rep.preconds[state_ind].mask
-            precond_val = op_rep.preconds[state_ind].val
-
-        # we make the assumption that the same bit region in a word is only modified once i.e.
-        # a variable fact only appears once in the precond and in the effect. Therefore, those
-        # bits are 0 until as init and only modified here
-
-        # set the bits of the variable we need to read
-        precond_mask = precond_mask | (((1 << var_info.b_length) - 1) << (var_info.b_start))
-
-        # create the value using the right number of bits, then shift left if needed to match the variable position
-        precond_val = precond_val | ((((1 << var_info.b_length) - 1) & precond.value) << (var_info.b_start))
-
-        # update precond with new values
-        op_rep.preconds[state_ind] = OperatorPair(precond_mask, precond_val)
-
-    # similar fashion to preconditions
-    effects = [root_task.get_operator_effect(op_index, eff_index, False)
-               for eff_index in range(root_task.get_num_operator_effects(op_index, False))]
-    for effect in effects:
-        eff_mask = ~(np.uint64(0))
-        eff_val = np.uint64(0)
-        var_info = var_infos[effect.var]
-        state_ind = var_info.word_pos
-
-        if state_ind in op_rep.effects:
-            eff_mask = op_rep.effects[state_ind].mask
-            eff_val = op_rep.effects[state_ind].val
-
-        eff_mask = eff_mask & (~np.uint64(((1 << var_info.b_length) - 1) << (var_info.b_start)))
-        eff_val = eff_val | ((((1 << var_info.b_length) - 1) & effect.value) << (var_info.b_start))
-
-        op_rep.effects[state_ind] = OperatorPair(eff_mask, eff_val)
-    return op_rep
-
-
-def get_all_op_reps(root_task: parse.RootTask, var_infos: list[VarInfo]) -> list[OperatorRepr]:
-    all_op_reps = []
-    for op_index in range(root_task.get_num_operators()):
-        op_reps = get_op_rep(root_task, var_infos, op_index)
-        all_op_reps.append(op_reps)
-    return all_op_reps
+class MutexChecks:
+    """
+    The mutex tests of the successors of all operators, CSR by operator: the checks of operator i are the
+    entries offsets[i], ..., offsets[i + 1] - 1.
+
+    A check covers variables of one state word, each with one value it must not take: the fields of masks hold
+    the variables, values their forbidden values, low_bits and high_bits the lowest and highest bit of every field.
+    A successor passes a check if no field of (state[word] ^ values) & masks is 0, which a single subtraction
+    tells for all fields at once, see no_mutex_fact in planner/action.h; a check with a single field is a
+    comparison. A variable with several forbidden values has one check per value.
+
+    The variables that the operator sets, or that it requires and leaves unchanged, have a known value in the
+    successor, so their facts are decided here: they are dropped, or the successors of the operator always
+    violate a mutex and always_violated is set.
+    """
+    offsets: np.ndarray
+    words: np.ndarray
+    masks: np.ndarray
+    values: np.ndarray
+    low_bits: np.ndarray
+    high_bits: np.ndarray
+    always_violated: np.ndarray
+
+    def get_checks(self, op_index: int) -> list[tuple[int, int, int, int, int]]:
+        """
+        (word, mask, values, low bits, high bits) of the checks of the operator.
+        """
+        start, end = self.offsets[op_index], self.offsets[op_index + 1]
+        return list(zip(
+            self.words[start:end].tolist(),
+            self.masks[start:end].tolist(),
+            self.values[start:end].tolist(),
+            self.low_bits[start:end].tolist(),
+            self.high_bits[start:end].tolist(),
+        ))
+
+
+def encode_operator_mutexes(
+    mutex_offsets: np.ndarray,
+    mutex_vars: np.ndarray,
+    mutex_vals: np.ndarray,
+    encoding: OperatorEncoding,
+    var_infos: list[VarInfo],
+) -> MutexChecks:
+    """
+    Packs the mutex facts of the operators (columnar.ColumnarTask.get_operator_mutexes) into word checks.
+    """
+    arrays = VarInfoArrays.from_var_infos(var_infos)
+    num_operators = encoding.num_operators
+    ops = np.repeat(np.arange(num_operators), np.diff(mutex_offsets))
+    words = arrays.word_pos[mutex_vars]
+    masks = arrays.mask_get[mutex_vars]
+    values = arrays.packed_values(mutex_vars, mutex_vals)
+
+    # the facts of the variables with a known value in the successor
+    is_set = (encoding.eff_mask[ops, words] & masks) == 0
+    is_kept = (encoding.pre_mask[ops, words] & masks) == masks
+    known_values = np.where(is_set, encoding.eff_val[ops, words], encoding.pre_val[ops, words]) & masks
+    is_known = is_set | is_kept
+    always_violated = np.zeros(num_operators, dtype=bool)
+    always_violated[ops[is_known & (known_values == values)]] = True
+    unknown = ~is_known
+    ops, fact_vars, words, masks, values = (
+        ops[unknown], mutex_vars[unknown], words[unknown], masks[unknown], values[unknown])
+
+    # the i-th forbidden value of a variable goes to the i-th check of its word
+    order = np.lexsort((fact_vars, ops))
+    var_keys = ops[order] * max(len(var_infos), 1) + fact_vars[order]
+    var_starts = np.flatnonzero(np.r_[True, var_keys[1:] != var_keys[:-1]]) if len(order) else order
+    ranks = np.empty_like(order)
+    ranks[order] = np.arange(len(order)) - np.repeat(var_starts, np.diff(np.r_[var_starts, len(order)]))
+
+    order = np.lexsort((ranks, words, ops))
+    check_keys = np.stack((ops[order], words[order], ranks[order]))
+    check_starts = (
+        np.flatnonzero(np.r_[True, np.any(check_keys[:, 1:] != check_keys[:, :-1], axis=0)]) if len(order) else order
+    )
+    b_start = arrays.b_start[fact_vars[order]]
+    low_bits = np.uint64(1) << b_start
+    high_bits = np.uint64(1) << (b_start + arrays.b_length[fact_vars[order]] - np.uint64(1))
+
+    def reduce_checks(bits: np.ndarray) -> np.ndarray:
+        if len(order) == 0:
+            return np.zeros(0, dtype=np.uint64)
+        return np.bitwise_or.reduceat(bits, check_starts)
+
+    check_ops = ops[order][check_starts]
+    return MutexChecks(
+        offsets=columnar.lengths_to_offsets(np.bincount(check_ops, minlength=num_operators)),
+        words=words[order][check_starts],
+        masks=reduce_checks(masks[order]),
+        values=reduce_checks(values[order]),
+        low_bits=reduce_checks(low_bits),
+        high_bits=reduce_checks(high_bits),
+        always_violated=always_violated,
+    )
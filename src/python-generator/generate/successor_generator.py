@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Successor generator decision tree, in the style of Fast Downward.
+
+Each node tests the value of a variable and only descends into the child of that value, so an expansion only
+visits the operators whose preconditions are compatible with the state instead of testing all of them.
+The operators without a precondition on the variable of a switch are handled by the next switch of the same
+node, which keeps the nesting of the generated code bounded by the number of preconditions of an operator.
+"""
+from collections import defaultdict
+from dataclasses import dataclass, field
+
+import numpy as np
+
+from generate import columnar, helpers, representations
+
+# leaves with more operators are added from a static array instead of one push_back per operator
+MAX_INLINE_LEAF_SIZE = 4
+
+
+@dataclass
+class SuccessorNode:
+    # operators whose preconditions were all tested on the path to this node
+    operators: list[int] = field(default_factory=list)
+    # (variable, children by value), each remaining operator is in the switch of its first untested precondition
+    switches: list[tuple[int, dict[int, "SuccessorNode"]]] = field(default_factory=list)
+
+
+def _build_node(items: list[tuple[int, list[tuple[int, int]]]]) -> SuccessorNode:
+    """
+    items are (operator, untested preconditions sorted by variable).
+    """
+    node = SuccessorNode()
+    by_var: dict[int, dict[int, list[tuple[int, list[tuple[int, int]]]]]] = defaultdict(lambda: defaultdict(list))
+    for op, preconds in items:
+        if not preconds:
+            node.operators.append(op)
+            continue
+        var, value = preconds[0]
+        by_var[var][value].append((op, preconds[1:]))
+    for var in sorted(by_var):
+        children = by_var[var]
+        node.switches.append((var, {value: _build_node(children[value]) for value in sorted(children)}))
+    return node
+
+
+def build_successor_tree(task: columnar.ColumnarTask, start: int, stop: int) -> SuccessorNode:
+    """
+    Decision tree of the operators start, ..., stop - 1.
+    """
+    items = []
+    for op in range(start, stop):
+        pre_vars, pre_vals = task.get_preconditions(op)
+        order = np.argsort(pre_vars, kind="stable")
+        items.append((op, list(zip(pre_vars[order].tolist(), pre_vals[order].tolist()))))
+    return _build_node(items)
+
+
+def write_successor_tree(
+    writer: helpers.CodeWriter,
+    node: SuccessorNode,
+    var_infos: list[representations.VarInfo],
+    vector_name: str,
+):
+    """
+    Writes code that appends the operators applicable in state_bitrep to vector_name, in no particular order.
+    """
+    operators = node.operators
+    if len(operators) > MAX_INLINE_LEAF_SIZE:
+        writer.write("{ static const int ops[] = {" + ",".join(map(str, operators)) + "};\n")
+        writer.write(f"{vector_name}.insert({vector_name}.end(), ops, ops + {len(operators)}); }}\n")
+    else:
+        for op in operators:
+            writer.write(f"{vector_name}.push_back({op});\n")
+
+    for var, children in node.switches:
+        var_info = var_infos[var]
+        word = f"(state_bitrep[{var_info.word_pos}] & {bin(var_info.mask_get)})"
+        if len(children) == 1:
+            ((value, child),) = children.items()
+            writer.write(f"if ({word} == {bin(value << var_info.b_start)}) {{\n")
+            write_successor_tree(writer, child, var_infos, vector_name)
+            writer.write("}\n")
+            continue
+        writer.write(f"switch ({word} >> {var_info.b_start}) {{\n")
+        for value, child in children.items():
+            writer.write(f"case {value}: {{\n")
+            write_successor_tree(writer, child, var_infos, vector_name)
+            writer.write("break;\n}\n")
+        writer.write("}\n")
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Task file of the table-driven planner (planner/table), written instead of the generated sources.
+
+The file starts with the magic bytes and a header of uint32 values, followed by the arrays in the order of
+write_task_table. The arrays are little-endian and are read by load_task in planner/table/table_task.cpp,
+so both have to be changed together.
+"""
+import numpy as np
+
+from generate import pipeline, representations
+
+MAGIC = b"PLNRTASK"
+VERSION = 6
+
+
+def get_word_ranges(masks: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    For every operator, the range [begin, end) of the words between its first and last nonzero mask, so that the
+    planner only tests these; an empty range if all masks are 0.
+    """
+    nonzero = masks != 0
+    has_words = nonzero.any(axis=1)
+    begin = np.where(has_words, np.argmax(nonzero, axis=1), 0)
+    end = np.where(has_words, masks.shape[1] - np.argmax(nonzero[:, ::-1], axis=1), 0)
+    return begin, end
+
+
+def write_task_table(context: pipeline.GenerationContext, filename: str):
+    task = context.task
+    encoding = context.encoding
+    mutex_checks = context.mutex_checks
+    conversion = representations.get_state_conversion(task, context.var_infos, context.ff_var_infos)
+
+    _, initial_state = representations.encode_facts(
+        np.arange(task.num_variables), task.initial_state, context.var_infos
+    )
+    goal_mask, goal_val = representations.encode_facts(task.goal_vars, task.goal_vals, context.var_infos)
+    ff_goal = representations.encode_one_hot_facts(task.goal_vars, task.goal_vals, context.ff_var_infos)
+    is_goal_fact = np.zeros(task.num_facts, dtype=np.uint8)
+    is_goal_fact[task.fact_ids(task.goal_vars, task.goal_vals)] = 1
+
+    header = [
+        VERSION,
+        task.num_variables,
+        encoding.state_length,
+        encoding.ff_state_length,
+        task.num_facts,
+        task.num_operators,
+        len(task.pre_vars),
+        len(task.eff_vars),
+        len(context.mutex_checks.words),
+        len(conversion.chunks),
+        len(conversion.bits),
+    ]
+    uint64_arrays = [
+        initial_state,
+        goal_mask,
+        goal_val,
+        ff_goal,
+        encoding.pre_mask,
+        encoding.pre_val,
+        encoding.eff_mask,
+        encoding.eff_val,
+        encoding.ff_pre,
+        encoding.ff_eff,
+    ]
+    # the tables of the conversion to the one-hot state, the chunks by one-hot word
+    conversion_arrays = [
+        (conversion.word_offsets, "<i4"),
+        (conversion.chunks, "<i4"),
+        (conversion.bits, "<u8"),
+        (conversion.bit_facts, "<i4"),
+    ]
+    pre_word_begin, pre_word_end = get_word_ranges(encoding.pre_mask)
+    ff_pre_word_begin, ff_pre_word_end = get_word_ranges(encoding.ff_pre)
+    operator_arrays = [
+        (task.pre_offsets, "<i4"),
+        (task.fact_ids(task.pre_vars, task.pre_vals), "<i4"),
+        (task.eff_offsets, "<i4"),
+        (task.fact_ids(task.eff_vars, task.eff_vals), "<i4"),
+        (is_goal_fact, "u1"),
+        (mutex_checks.offsets, "<i4"),
+        (mutex_checks.words, "<i4"),
+        (mutex_checks.masks, "<u8"),
+        (mutex_checks.values, "<u8"),
+        (mutex_checks.low_bits, "<u8"),
+        (mutex_checks.high_bits, "<u8"),
+        (mutex_checks.always_violated, "u1"),
+        (task.original_operator_ids, "<i4"),
+        (pre_word_begin, "<i4"),
+        (pre_word_end, "<i4"),
+        (ff_pre_word_begin, "<i4"),
+        (ff_pre_word_end, "<i4"),
+    ]
+
+    with open(filename, "wb") as file:
+        file.write(MAGIC)
+        file.write(np.array(header, dtype="<u4").tobytes())
+        for array in uint64_arrays:
+            file.write(np.ascontiguousarray(array, dtype="<u8").tobytes())
+        for array, dtype in conversion_arrays + operator_arrays:
+            file.write(np.ascontiguousarray(array, dtype=dtype).tobytes())